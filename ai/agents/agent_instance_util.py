@@ -9,6 +9,9 @@ from ai.agents.prompt import EXCEL_ECHART_TIPS_MESS, \
 from ai.agents.agentchat import (UserProxyAgent, GroupChat, AssistantAgent, GroupChatManager,
                                  PythonProxyAgent, BIProxyAgent, TaskPlannerAgent, TaskSelectorAgent, CheckAgent,
                                  ChartPresenterAgent)
+from ai.agents.oai.response_cache import schema_fingerprint
+from ai.backend.util.sql_result_cache import SqlResultCache
+from ai.backend.util.database_util import DbInfoCache
 from ai.backend.base_config import CONFIG
 
 max_retry_times = CONFIG.max_retry_times
@@ -35,6 +38,7 @@ class AgentInstanceUtil:
         outgoing: Optional = None,
         incoming: Optional = None,
         db_id: Optional = None,
+        message_router: Optional = None,
     ):
         self.base_message = base_message
         self.websocket = websocket
@@ -42,6 +46,7 @@ class AgentInstanceUtil:
         self.delay_messages = delay_messages
         self.outgoing = outgoing
         self.incoming = incoming
+        self.message_router = message_router
         # add by lu, Set the model name in use
         self.llm_in_use_name = None
 
@@ -59,6 +64,14 @@ class AgentInstanceUtil:
         self.api_key_use = False
         self.openai_proxy = None
         self.db_id = db_id
+        # Type of that data source ("mysql", "starrocks", ...), as sent with the current question
+        self.db_type = None
+        # Fingerprint of base_message, the schema the LLM answers about
+        self.schema_fingerprint = None
+        # Results of the SQL run by the BI proxies of this chat
+        self.sql_result_cache = SqlResultCache(CONFIG.sql_result_cache_size, CONFIG.sql_result_cache_ttl)
+        # Decoded connection info of the data sources used by the code turns of this chat
+        self.db_info_cache = DbInfoCache(CONFIG.db_info_cache_ttl)
 
     def set_api_key(self, api_key, ApiType="openai", api_host=None, ApiModel=None, LlmSetting=None):
         self.api_key = api_key
@@ -172,6 +185,7 @@ class AgentInstanceUtil:
             "config_list": self.config_list_gpt35_turbo,
             "request_timeout": request_timeout,
         }
+        self.tag_schema_fingerprint()
 
     def set_base_message(self, message):
         print('run function set_base_message ... ')
@@ -185,6 +199,16 @@ class AgentInstanceUtil:
         self.base_message = str(message)
         print('base_message : ', message)
 
+        self.schema_fingerprint = schema_fingerprint(self.base_message)
+        self.tag_schema_fingerprint()
+
+    def tag_schema_fingerprint(self):
+        """Key the shared LLM response cache of this chat's requests by its schema."""
+        for config_list in (getattr(self, 'config_list_gpt4', None), getattr(self, 'config_list_gpt4_turbo', None),
+                            getattr(self, 'config_list_gpt35_turbo', None)):
+            for config in config_list or []:
+                config['schema_fingerprint'] = self.schema_fingerprint
+
     def get_agent_mysql_engineer(self):
         """mysql engineer"""
         mysql_llm_config = {
@@ -664,7 +688,8 @@ class AgentInstanceUtil:
         )
         return base_postgresql_assistant
 
-    def get_agent_analyst(self):
+    def get_agent_analyst(self, stream=False):
+        """ With stream set, the analyst's replies are streamed to the user while they arrive """
         analyst = AssistantAgent(
             name="Analyst",
             system_message='''Analyst. You are a report analysis, you have the knowledge and skills to turn raw data into information and insight, which can be used to make business decisions.
@@ -675,6 +700,7 @@ class AgentInstanceUtil:
             websocket=self.websocket,
             user_name=self.user_name,
             openai_proxy=self.openai_proxy,
+            stream_outgoing=self.outgoing if stream else None,
         )
         return analyst
 
@@ -729,6 +755,11 @@ class AgentInstanceUtil:
             delay_messages=self.delay_messages,
             incoming=self.incoming,
             openai_proxy=self.openai_proxy,
+            db_id=self.db_id,
+            db_type=self.db_type,
+            sql_result_cache=self.sql_result_cache,
+            db_info_cache=self.db_info_cache,
+            message_router=self.message_router,
         )
         return bi_proxy
 
@@ -937,6 +968,7 @@ class AgentInstanceUtil:
             # outgoing=self.outgoing,
             # incoming=self.incoming,
             db_id=self.db_id,
+            db_info_cache=self.db_info_cache,
             report_file_name=report_file_name,
             is_auto_pilot=is_auto_pilot
         )
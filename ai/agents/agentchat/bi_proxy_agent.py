@@ -18,6 +18,11 @@ from ai.backend.util.write_log import logger
 from ai.backend.util.token_util import num_tokens_from_messages
 import traceback
 from ai.backend.util import base_util
+from ai.backend.util import database_util
+from ai.backend.util.message_router import MessageRouter
+from ai.backend.util.sql_result_cache import SqlResultCache, SOURCE_BROWSER, SOURCE_DIRECT, \
+    supports_direct_execution, execute_direct, is_read_only_sql
+from ai.backend.base_config import CONFIG
 
 
 try:
@@ -65,6 +70,11 @@ class BIProxyAgent(Agent):
         delay_messages: Optional = None,
         incoming: Optional = None,
         openai_proxy: Optional[str] = None,
+        db_id: Optional = None,
+        db_type: Optional[str] = None,
+        sql_result_cache: Optional[SqlResultCache] = None,
+        db_info_cache: Optional = None,
+        message_router: Optional[MessageRouter] = None,
 
     ):
         """
@@ -107,6 +117,11 @@ class BIProxyAgent(Agent):
                 for available options.
                 To disable llm-based auto reply, set to False.
             default_auto_reply (str or dict or None): default auto reply when no code execution or llm-based reply is generated.
+            db_id: id of the data source the SQL of `run_mysql_code` runs on.
+            db_type (str): type of that data source ("mysql", "starrocks", ...), only MySQL runs SQL directly.
+            sql_result_cache (SqlResultCache): results of the SQL run in this chat, shared by its BI proxies.
+            db_info_cache (DbInfoCache): decoded data source info of this chat, used by direct SQL execution.
+            message_router (MessageRouter): router of the browser connection, delivers the replies to our requests.
         -------------------------------------------------------------------------------------------
         """
         super().__init__(name)
@@ -145,6 +160,12 @@ class BIProxyAgent(Agent):
         self.delay_messages = delay_messages
         self.incoming = incoming
         self.openai_proxy = openai_proxy
+        self.db_id = db_id
+        self.db_type = db_type
+        self.sql_result_cache = sql_result_cache if sql_result_cache is not None else SqlResultCache(
+            CONFIG.sql_result_cache_size, CONFIG.sql_result_cache_ttl)
+        self.db_info_cache = db_info_cache
+        self.message_router = message_router
 
     def register_reply(
         self,
@@ -1089,85 +1110,135 @@ class BIProxyAgent(Agent):
         self._function_map.update(function_map)
 
     async def run_mysql_code(self, mysql_code_str, data_name="default_name"):
-        """
+        """ Run SQL through the browser (or directly, see CONFIG.sql_direct_execution), reusing the results of this chat
         """
         try:
-
-            current_timestamp = int(time.time())
             mysql_code_str = mysql_code_str.replace("\n", " ")
 
             data_name = str(data_name).replace("\n", "")
             if len(data_name) < 1:
                 data_name = "default_name"
 
-            websocket = self.websocket
-            # ss_websocket = ss_websocket
-            result_message = {
-                'state': 200,
-                'receiver': 'bi',
-                'data': {
-                    'data_type': 'mysql_code',
-                    'content': mysql_code_str,
-                    'name': data_name
-                },
-                'id': str(current_timestamp)
-            }
+            cache_key = self.sql_result_cache.key_for(self.db_id, mysql_code_str)
+            cached_reply = self.sql_result_cache.get(cache_key)
+            if cached_reply is not None:
+                logger.info(
+                    "from user:[{}".format(
+                        self.user_name) + "] , " + self.name + " reused the result of mysql code:{}".format(
+                        mysql_code_str))
+                return cached_reply
+
+            if_direct, if_suss, reply_content = await self.run_mysql_code_direct(mysql_code_str)
+            if if_direct:
+                source = SOURCE_DIRECT
+            else:
+                source = SOURCE_BROWSER
+                if_suss, reply_content = await self.run_mysql_code_in_browser(mysql_code_str, data_name, cache_key)
+            if reply_content is None:
+                return 'Failed to run mysql code. '
+
+            if reply_content == 'sql没有查询到数据':
+                reply_content = 'sql code 执行成功，但是没有查询到数据。'
+
+            message = [
+                {
+                    "role": "system",
+                    "content": str(reply_content),
+                }
+            ]
 
-            send_json_str = json.dumps(result_message)
-            await websocket.send(send_json_str)
-            print(str(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())) + ' ---- ' + " send a message:{}".format(
-                send_json_str))
+            num_tokens = num_tokens_from_messages(message, model='gpt-4')
+            if num_tokens > 5000:
+                reply_content = 'The MySQL code is not very suitable. You have queried too much data at once. Please adjust the MySQL code to solve the problem.'
 
-            logger.info(
+            if if_suss:
+                self.sql_result_cache.put(cache_key, reply_content, source)
+            return reply_content
+
+        except Exception as e:
+            traceback.print_exc()
+            logger.error(
                 "from user:[{}".format(
-                    self.user_name) + "] , " + self.name + " send a message:{}".format(
-                    send_json_str))
+                    self.user_name) + "] , " + self.name + ", error: " + str(e))
 
-            target_sender = 'bi'
-            target_data_type = 'mysql_code'
-            target_id = current_timestamp
+        return 'Failed to run mysql code. '
 
-            await self.receive_message(target_sender, target_data_type, target_id)
+    async def run_mysql_code_direct(self, mysql_code_str):
+        """ Run SQL on a MySQL data source from the AI server, return (if_direct, if_suss, reply_content)
+        if_direct is False when direct execution is off or not possible for the data source or the SQL,
+        which must be a single SELECT statement, or when it failed, so the browser runs the SQL instead.
+        This path skips the BI permission checks, see CONFIG.sql_direct_execution.
+        """
+        if not CONFIG.sql_direct_execution or self.db_id is None or int(self.db_id) <= 0:
+            return False, False, None
+        if not is_read_only_sql(mysql_code_str):
+            return False, False, None
 
-            # Traverse the pending message set delay_messages to see if the message has been received
-            mes_list = self.delay_messages['bi']['mysql_code']
-            print('mes_list : ', mes_list)
-            for mes in mes_list:
-                receive_json = json.loads(mes)
-                if receive_json.get('sender') == 'bi':
-                    reply_content = receive_json.get('data').get('content')
-                    print('reply_content : ', reply_content)
+        if_suss, db_info = await database_util.get_decoded_db_info(self.db_id, self.db_info_cache)
+        if not if_suss or not supports_direct_execution(self.db_type, db_info):
+            return False, False, None
 
-                    if reply_content == 'sql没有查询到数据':
-                        reply_content = 'sql code 执行成功，但是没有查询到数据。'
+        try:
+            data = await execute_direct(db_info, mysql_code_str, CONFIG.sql_direct_execution_timeout)
+        except Exception as e:
+            logger.error(
+                "from user:[{}".format(
+                    self.user_name) + "] , " + self.name + ", direct mysql code error, run it in the browser: " + str(e))
+            return False, False, None
+        if not data['rows']:
+            return True, False, 'sql没有查询到数据'
+        return True, True, data
+
+    async def run_mysql_code_in_browser(self, mysql_code_str, data_name, cache_key):
+        """ Send SQL to the browser and wait for the result it ran through the BI API, return (if_suss, reply_content)
+        reply_content is None when no reply came.
+        """
+        message_id = self.new_message_id()
+
+        websocket = self.websocket
+        # ss_websocket = ss_websocket
+        result_message = {
+            'state': 200,
+            'receiver': 'bi',
+            'data': {
+                'data_type': 'mysql_code',
+                'content': mysql_code_str,
+                'name': data_name
+            },
+            'id': message_id
+        }
 
-                    message = [
-                        {
-                            "role": "system",
-                            "content": str(reply_content),
-                        }
-                    ]
+        send_json_str = json.dumps(result_message)
+        await websocket.send(send_json_str)
+        print(str(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())) + ' ---- ' + " send a message:{}".format(
+            send_json_str))
 
-                    num_tokens = num_tokens_from_messages(message, model='gpt-4')
-                    mes_list.remove(mes)
+        logger.info(
+            "from user:[{}".format(
+                self.user_name) + "] , " + self.name + " send a message:{}".format(
+                send_json_str))
 
-                    if num_tokens > 5000:
-                        return 'The MySQL code is not very suitable. You have queried too much data at once. Please adjust the MySQL code to solve the problem.'
+        target_sender = 'bi'
+        target_data_type = 'mysql_code'
+        target_id = message_id
 
-                    return reply_content
+        mes = await self.receive_message(target_sender, target_data_type, target_id)
+        if mes is None:
+            return False, None
 
-        except Exception as e:
-            traceback.print_exc()
-            logger.error(
-                "from user:[{}".format(
-                    self.user_name) + "] , " + self.name + ", error: " + str(e))
+        receive_json = json.loads(mes)
+        reply_content = receive_json.get('data').get('content')
+        print('reply_content : ', reply_content)
 
-        return 'Failed to run mysql code. '
+        # The browser now keeps this query and builds the next chart on it
+        if_suss = receive_json.get('state') == 200
+        self.sql_result_cache.browser_ran(cache_key if if_suss else None)
+        return if_suss, reply_content
 
     async def run_chart_code(self, chart_code_str: str):
         try:
 
-            current_timestamp = int(time.time())
+            message_id = self.new_message_id()
             # chart_code_str = [{"globalSeriesType":"column","columnMapping":{"city":"x","Total_Sales":"y"}}]
             # print("chart_code_str : ", chart_code_str)
 
@@ -1186,7 +1257,7 @@ class BIProxyAgent(Agent):
                         'data_type': 'table_code',
                         'content': ["use table to show."]
                     },
-                    'id': str(current_timestamp)
+                    'id': message_id
 
                 }
             else:
@@ -1222,7 +1293,7 @@ class BIProxyAgent(Agent):
                         'data_type': 'chart_code',
                         'content': json_str
                     },
-                    'id': str(current_timestamp)
+                    'id': message_id
                 }
 
             websocket = self.websocket
@@ -1238,24 +1309,18 @@ class BIProxyAgent(Agent):
 
             target_sender = 'bi'
             target_data_type = 'chart_code'
-            target_id = current_timestamp
+            target_id = message_id
 
-            await self.receive_message(target_sender, target_data_type, target_id)
-
-            mes_list = self.delay_messages['bi']['chart_code']
-            print('mes_list : ', mes_list)
-            for mes in mes_list:
+            mes = await self.receive_message(target_sender, target_data_type, target_id)
+            if mes is not None:
                 receive_json = json.loads(mes)
-                if receive_json.get('sender') == 'bi':
-                    reply_content = receive_json['data']['content']
-                    print('reply_content : ', reply_content)
+                reply_content = receive_json['data']['content']
+                print('reply_content : ', reply_content)
 
-                    if receive_json.get('state') == 200:
-                        mes_list.remove(mes)
-                        return "Charts have been successfully generated for users."
-                    else:
-                        mes_list.remove(mes)
-                        return "Failed to generate chart. Please check whether the data format is correct"
+                if receive_json.get('state') == 200:
+                    return "Charts have been successfully generated for users."
+                else:
+                    return "Failed to generate chart. Please check whether the data format is correct"
 
         except Exception as e:
             traceback.print_exc()
@@ -1268,7 +1333,7 @@ class BIProxyAgent(Agent):
     async def ask_data_code(self, ask_data_str: str):
         try:
 
-            current_timestamp = int(time.time())
+            message_id = self.new_message_id()
             result_message = {
                 'state': 200,
                 'receiver': 'bi',
@@ -1276,7 +1341,7 @@ class BIProxyAgent(Agent):
                     'data_type': 'ask_data',
                     'content': ask_data_str
                 },
-                'id': str(current_timestamp)
+                'id': message_id
             }
 
             send_json_str = json.dumps(result_message)
@@ -1291,24 +1356,18 @@ class BIProxyAgent(Agent):
 
             target_sender = 'bi'
             target_data_type = 'ask_data'
-            target_id = current_timestamp
-
-            await self.receive_message(target_sender, target_data_type, target_id)
+            target_id = message_id
 
-            mes_list = self.delay_messages['bi']['ask_data']
-            print('mes_list : ', mes_list)
-            for mes in mes_list:
+            mes = await self.receive_message(target_sender, target_data_type, target_id)
+            if mes is not None:
                 receive_json = json.loads(mes)
-                if receive_json.get('sender') == 'bi':
-                    reply_content = receive_json['data']['content']
-                    print('reply_content : ', reply_content)
+                reply_content = receive_json['data']['content']
+                print('reply_content : ', reply_content)
 
-                    if receive_json.get('state') == 200:
-                        mes_list.remove(mes)
-                        return True, reply_content
-                    else:
-                        mes_list.remove(mes)
-                        return False, "Failed to get chart data. " + str(reply_content)
+                if receive_json.get('state') == 200:
+                    return True, reply_content
+                else:
+                    return False, "Failed to get chart data. " + str(reply_content)
 
         except Exception as e:
             traceback.print_exc()
@@ -1321,7 +1380,7 @@ class BIProxyAgent(Agent):
     async def delete_chart(self, chart_names):
         try:
 
-            current_timestamp = int(time.time())
+            message_id = self.new_message_id()
             websocket = self.websocket
             result_message = {
                 'state': 200,
@@ -1330,7 +1389,7 @@ class BIProxyAgent(Agent):
                     'data_type': 'delete_chart',
                     'content': chart_names
                 },
-                'id': str(current_timestamp)
+                'id': message_id
 
             }
 
@@ -1351,26 +1410,20 @@ class BIProxyAgent(Agent):
             # 接收 message信息， 放入不同队列
             target_sender = 'bi'
             target_data_type = 'delete_chart'
-            target_id = current_timestamp
+            target_id = message_id
 
-            await self.receive_message(target_sender, target_data_type, target_id)
-
-            #  遍历待处理 delay_messages，【延时】消息队列，查询是否收到了消息
-            mes_list = self.delay_messages['bi']['delete_chart']
-            for mes in mes_list:
+            mes = await self.receive_message(target_sender, target_data_type, target_id)
+            if mes is not None:
                 receive_json = json.loads(mes)
-                if receive_json.get('sender') == 'bi':
-                    reply_content = receive_json['data']['content']
-                    print('reply_content : ', reply_content)
-
-                    if receive_json.get('state') == 200:
-                        mes_list.remove(mes)
-                        # return "Chart deleted successfully."
-                        return "删除图表成功"
-                    else:
-                        mes_list.remove(mes)
-                        # return "Chart deleted fail."
-                        return "删除图表失败。 请检查提供的图表列表格式是否正确以及图表名称是否存在。"
+                reply_content = receive_json['data']['content']
+                print('reply_content : ', reply_content)
+
+                if receive_json.get('state') == 200:
+                    # return "Chart deleted successfully."
+                    return "删除图表成功"
+                else:
+                    # return "Chart deleted fail."
+                    return "删除图表失败。 请检查提供的图表列表格式是否正确以及图表名称是否存在。"
 
         except Exception as e:
             print(e)
@@ -1408,42 +1461,18 @@ class BIProxyAgent(Agent):
             traceback.print_exc()
             logger.error("from user:[{}".format(self.user_name) + "] , " + str(e))
 
-    async def receive_message(self, target_sender: str, target_data_type: str, target_id: int):
-        """ Receive message information and put it into different queues """
-        for i in range(5):
-            try:
-                # msg_in = await self.websocket.recv()
-                msg_in = await asyncio.wait_for(self.websocket.recv(), timeout=10)  # 设置超时时间为5秒
-                print(str(time.strftime("%Y-%m-%d %H:%M:%S",
-                                        time.localtime())) + ' ---- ' + "from user:[{}".format(
-                    self.user_name) + "], got a message:{}".format(msg_in))
-                json_str = json.loads(msg_in)
-                q_state = json_str['state']
-
-                if q_state == 200 or q_state == 500:
-                    q_sender = json_str['sender']
-
-                    if json_str.get('sender') == 'heartCheck':
-                        continue
-                    if json_str.get('data').get('data_type'):
-                        # q_receiver = json_str['receiver']
-                        q_data_type = json_str['data']['data_type']
-                        print('q_data_type : ', q_data_type)
-                        q_str = json_str['data']['content']
-                        q_id = json_str['id']
-
-                        if target_id > 0:
-                            if str(q_id) != str(target_id):
-                                print("q_id: ", q_id)
-                                continue
-
-                        if q_sender == target_sender and q_data_type == target_data_type:
-                            self.delay_messages['bi'][q_data_type].append(msg_in)
-                            break
-                        else:
-                            await self.incoming.put(msg_in)
-            except asyncio.TimeoutError:
-                print("Asynchronous operation timeout")
+    def new_message_id(self):
+        """ Id of a request to the browser whose reply is awaited with receive_message """
+        return self.message_router.new_id()
+
+    async def receive_message(self, target_sender: str, target_data_type: str, target_id: str):
+        """ Wait for the browser's reply to request target_id, return the received message, or None on timeout """
+        msg_in = await self.message_router.wait_for(target_sender, target_data_type, target_id, CONFIG.bi_reply_timeout)
+        if msg_in is not None:
+            print(str(time.strftime("%Y-%m-%d %H:%M:%S",
+                                    time.localtime())) + ' ---- ' + "from user:[{}".format(
+                self.user_name) + "], got a reply:{}".format(msg_in))
+        return msg_in
 
     async def run_img_code(self, img_url: str, name: str):
         try:
@@ -3,6 +3,8 @@ from collections import defaultdict
 import copy
 import json
 import logging
+import time
+import uuid
 from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
 from ai.agents import oai
 from .agent import Agent
@@ -45,6 +47,7 @@ class ConversableAgent(Agent):
     }
     # MAX_CONSECUTIVE_AUTO_REPLY = 100  # maximum number of consecutive auto replies (subject to future change)
     MAX_CONSECUTIVE_AUTO_REPLY = 10  # maximum number of consecutive auto replies (subject to future change)
+    STREAM_FRAME_INTERVAL = 0.1  # minimum seconds between two partial answer frames of a streamed reply
 
     def __init__(
         self,
@@ -63,6 +66,7 @@ class ConversableAgent(Agent):
         openai_proxy: Optional[str] = None,
         use_cache: Optional[bool] = True,
         report_file_name: Optional[str] = None,
+        stream_outgoing: Optional = None,
 
     ):
         """
@@ -105,6 +109,8 @@ class ConversableAgent(Agent):
                 for available options.
                 To disable llm-based auto reply, set to False.
             default_auto_reply (str or dict or None): default auto reply when no code execution or llm-based reply is generated.
+            stream_outgoing (asyncio.Queue): the chat's outgoing queue. When given, llm replies are streamed to the user
+                as partial answer frames while they are generated.
         -------------------------------------------------------------------------------------------
 
         """
@@ -145,6 +151,7 @@ class ConversableAgent(Agent):
         self.openai_proxy = openai_proxy
         self.use_cache = use_cache
         self.report_file_name = report_file_name
+        self.stream_outgoing = stream_outgoing
 
     def register_reply(
         self,
@@ -654,38 +661,31 @@ class ConversableAgent(Agent):
             messages = self._oai_messages[sender]
         print('run functon generate_oai_reply :', self.user_name)
 
-        def create_chat():
-            # print("create_chat: ")
+        # TODO: #1143 handle token limit exceeded error
+        if self.stream_outgoing is not None:
+            response = await self._stream_oai_reply(
+                context=messages[-1].pop("context", None), use_cache=self.use_cache,
+                messages=self._oai_system_message + messages,
+                openai_proxy=self.openai_proxy,
+                agent_name=self.name,
+                **llm_config
+            )
+        elif self.openai_proxy is None:
+            response = await oai.ChatCompletion.acreate(
+                context=messages[-1].pop("context", None), use_cache=self.use_cache,
+                messages=self._oai_system_message + messages,
+                agent_name=self.name,
+                **llm_config
+            )
+        else:
             print("self.openai_proxy , ", self.openai_proxy)
-
-            # TODO: #1143 handle token limit exceeded error
-            if self.openai_proxy is None:
-                response = oai.ChatCompletion.create(
-                    context=messages[-1].pop("context", None), use_cache=self.use_cache,
-                    messages=self._oai_system_message + messages,
-                    agent_name=self.name,
-                    **llm_config
-                )
-            else:
-                response = oai.ChatCompletion.create(
-                    context=messages[-1].pop("context", None), use_cache=self.use_cache,
-                    messages=self._oai_system_message + messages,
-                    openai_proxy=self.openai_proxy,
-                    agent_name=self.name,
-                    **llm_config
-                )
-
-            # print("response: ", response)
-            return response
-
-        async def consume_async():
-            # loop = asyncio.new_event_loop()
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(None, create_chat)
-            # print("result :", result)
-            return result
-
-        response = await consume_async()
+            response = await oai.ChatCompletion.acreate(
+                context=messages[-1].pop("context", None), use_cache=self.use_cache,
+                messages=self._oai_system_message + messages,
+                openai_proxy=self.openai_proxy,
+                agent_name=self.name,
+                **llm_config
+            )
         # print("response: ", response)
 
         # # TODO: #1143 handle token limit exceeded error
@@ -697,6 +697,40 @@ class ConversableAgent(Agent):
 
         return True, oai.ChatCompletion.extract_text_or_function_call(response)[0]
 
+    async def _stream_oai_reply(self, **params):
+        """Create the llm reply like `generate_oai_reply`, forwarding its text to the user while it arrives.
+
+        Every frame carries the whole text so far, at most one frame per STREAM_FRAME_INTERVAL;
+        the frame with `done` set closes the stream.
+        """
+        stream = oai.ChatCompletion.astream(**params)
+        stream_id = str(uuid.uuid4())
+        text = ""
+        sent_at = 0
+        async for chunk in stream:
+            text += chunk
+            if time.time() - sent_at >= self.STREAM_FRAME_INTERVAL:
+                await self._put_stream_frame(stream_id, text, done=False)
+                sent_at = time.time()
+        if text:
+            await self._put_stream_frame(stream_id, text, done=True)
+        return stream.response
+
+    async def _put_stream_frame(self, stream_id, text, done):
+        result_message = {
+            'state': 200,
+            'receiver': 'user',
+            'data': {
+                'data_type': 'answer',
+                'content': text,
+                'stream': {
+                    'id': stream_id,
+                    'done': done,
+                },
+            },
+        }
+        await self.stream_outgoing.put(json.dumps(result_message))
+
     def run_coroutine_threadsafe(self, coro, loop):
         return asyncio.run_coroutine_threadsafe(coro, loop)
 
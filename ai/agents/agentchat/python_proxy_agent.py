@@ -5,8 +5,6 @@ import json
 from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
 from ai.agents import oai
 from .agent import Agent
-import numpy as np
-from sklearn.linear_model import LinearRegression
 import ast
 import re
 from ai.backend.util import base_util
@@ -23,6 +21,7 @@ from ai.backend.util.write_log import logger
 from ai.agents.code_utils import tell_logger
 from ai.backend.util.base_util import dbinfo_decode
 from ai.backend.util import database_util
+from ai.agents.chart_stats import format_decimal, calculate_dispersion, calculate_trendline, count_outliers
 
 try:
     from termcolor import colored
@@ -31,65 +30,6 @@ except ImportError:
         return x
 
 
-# 函数，用于精确到小数点后两位
-def format_decimal(value):
-    if isinstance(value, float):
-        return round(value, 2)
-    elif isinstance(value, int):
-        return value
-    return value
-
-
-def calculate_dispersion(data):
-    x_values = np.array([point[0] for point in data])
-    y_values = np.array([point[1] for point in data])
-    x_std, y_std = np.std(x_values), np.std(y_values)
-    dispersion = format_decimal((x_std + y_std) / 2)
-    correlation = np.corrcoef(x_values, y_values)[0, 1]
-    correlation = format_decimal(correlation)
-    x_min, x_max = format_decimal(min(x_values)), format_decimal(max(x_values))
-    y_min, y_max = format_decimal(min(y_values)), format_decimal(max(y_values))
-    ave_x = format_decimal(sum(x_values) / len(x_values))
-    ave_y = format_decimal(sum(y_values) / len(y_values))
-    return dispersion, correlation, (x_min, x_max), (y_min, y_max), (ave_x, ave_y)
-
-
-def calculate_trendline(data):
-    x_values = np.array([point[0] for point in data]).reshape(-1, 1)
-    y_values = np.array([point[1] for point in data])
-
-    model = LinearRegression().fit(x_values, y_values)
-    slope = model.coef_[0]
-    intercept = model.intercept_
-
-    return slope, intercept
-
-
-def calculate_distance(point1, point2):
-    return np.sqrt((point1[0] - point2[0]) ** 2 + (point1[1] - point2[1]) ** 2)
-
-
-def count_outliers(data):
-    distances = []
-    # 计算所有数据点之间的距离
-    for i in range(len(data)):
-        for j in range(i + 1, len(data)):
-            distances.append(calculate_distance(data[i], data[j]))
-    # 计算平均距离
-    avg_distance = np.mean(distances)
-    # 找出中值点
-    median_point = np.median(data, axis=0)
-    # 计算距离中值点的距离，并检查是否大于平均距离的200%
-    outliers_count = sum([1 for point in data if calculate_distance(point, median_point) > avg_distance * 2])
-    if outliers_count < 5:
-        outliers = [format_decimal(point) for point in data if any(calculate_distance(point, median_point) > avg_distance * 2 for p in data)]
-    else:
-        outliers = [format_decimal(point) for point in data if any(calculate_distance(point, median_point) > avg_distance * 2 for p in data)]
-        outliers.sort(key=lambda point: abs(calculate_distance(point, median_point)), reverse=True)
-        outliers = outliers[:5]
-    return outliers_count, outliers
-
-
 class PythonProxyAgent(Agent):
     """(In preview) A class for generic conversable agents which can be configured as assistant or user proxy.
 
@@ -127,6 +67,7 @@ class PythonProxyAgent(Agent):
         outgoing: Optional = None,
         incoming: Optional = None,
         db_id: Optional = None,
+        db_info_cache: Optional = None,
         is_log_out: Optional[bool] = True,
         report_file_name: Optional[str] = None,
         is_auto_pilot: Optional[bool] = False
@@ -209,6 +150,8 @@ class PythonProxyAgent(Agent):
         self.outgoing = outgoing
         self.incoming = incoming
         self.db_id = db_id
+        # DbInfoCache of the chat, reused by its code turns
+        self.db_info_cache = db_info_cache
         self.is_log_out = is_log_out
         self.report_file_name = report_file_name
         self.is_auto_pilot = is_auto_pilot
@@ -770,8 +713,7 @@ class PythonProxyAgent(Agent):
                 else:
                     return True, f"exitcode:exitcode failed\nCode output: Please give me executable python code.\n"
             if self.db_id is not None and int(self.db_id) > 0:
-                obj = database_util.Main(self.db_id)
-                if_suss, db_info = obj.run_decode()
+                if_suss, db_info = await database_util.get_decoded_db_info(self.db_id, self.db_info_cache)
                 if if_suss:
                     code_blocks = [(item[0], dbinfo_decode(item[1], db_info)) if isinstance(item[1], str) else item for
                                    item in
@@ -781,7 +723,11 @@ class PythonProxyAgent(Agent):
                     # print('new_code_blocks : ', code_blocks)
 
             # found code blocks, execute code and push "last_n_messages" back
-            exitcode, logs = self.execute_code_blocks(code_blocks)
+            # The code (SQL and chart building) runs in a thread, so concurrent
+            # charts and other chats aren't blocked while it runs.
+            exitcode, logs = await asyncio.get_running_loop().run_in_executor(
+                None, self.execute_code_blocks, code_blocks
+            )
             code_execution_config["last_n_messages"] = last_n_messages
             exitcode2str = "execution succeeded" if exitcode == 0 else "execution failed"
             length = 10000
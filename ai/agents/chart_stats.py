@@ -0,0 +1,115 @@
+"""
+Summary statistics of scatter chart data, described to the LLM by `PythonProxyAgent`.
+
+Every function takes the series data as echarts gives it, a list of
+[x, y, ...] points, and works on whole numpy arrays. The mean pairwise
+distance behind `count_outliers` is exact up to PAIRWISE_SAMPLE_SIZE points
+and estimated from a fixed random sample of them above that.
+
+Run `python -m ai.agents.chart_stats [points]` for a benchmark.
+"""
+import sys
+import time
+
+import numpy as np
+
+# Points above which the mean pairwise distance is estimated from a sample.
+PAIRWISE_SAMPLE_SIZE = 1000
+# Rows of the distance matrix computed at once.
+PAIRWISE_BLOCK_SIZE = 512
+MAX_REPORTED_OUTLIERS = 5
+
+
+# 函数，用于精确到小数点后两位
+def format_decimal(value):
+    if isinstance(value, float):
+        return round(value, 2)
+    elif isinstance(value, int):
+        return value
+    return value
+
+
+def as_points(data):
+    """The (x, y) columns of the chart data as an (n, 2) float array."""
+    return np.asarray([point[:2] for point in data], dtype=float)
+
+
+def calculate_dispersion(data):
+    points = as_points(data)
+    x_values, y_values = points[:, 0], points[:, 1]
+    x_std, y_std = points.std(axis=0)
+    dispersion = format_decimal(float((x_std + y_std) / 2))
+    correlation = format_decimal(float(np.corrcoef(x_values, y_values)[0, 1]))
+    x_min, y_min = points.min(axis=0)
+    x_max, y_max = points.max(axis=0)
+    ave_x, ave_y = points.mean(axis=0)
+    return (
+        dispersion,
+        correlation,
+        (format_decimal(float(x_min)), format_decimal(float(x_max))),
+        (format_decimal(float(y_min)), format_decimal(float(y_max))),
+        (format_decimal(float(ave_x)), format_decimal(float(ave_y))),
+    )
+
+
+def calculate_trendline(data):
+    """Least squares line through the points, as (slope, intercept)."""
+    points = as_points(data)
+    slope, intercept = np.polyfit(points[:, 0], points[:, 1], 1)
+    return float(slope), float(intercept)
+
+
+def mean_pairwise_distance(points, sample_size=PAIRWISE_SAMPLE_SIZE):
+    """Mean euclidean distance between all pairs of points."""
+    if len(points) > sample_size:
+        # Seeded, so the same chart is always described the same way.
+        rng = np.random.default_rng(0)
+        points = points[rng.choice(len(points), sample_size, replace=False)]
+
+    n = len(points)
+    if n < 2:
+        return 0.0
+
+    total = 0.0
+    for start in range(0, n, PAIRWISE_BLOCK_SIZE):
+        block = points[start:start + PAIRWISE_BLOCK_SIZE]
+        distances = np.sqrt(((block[:, None, :] - points[None, :, :]) ** 2).sum(axis=2))
+        total += distances.sum()
+    # Every pair was counted twice, the zero distances of points to themselves once.
+    return total / (n * (n - 1))
+
+
+def count_outliers(data):
+    """Count the points further from the median point than twice the mean pairwise distance.
+
+    Returns the count and the (at most MAX_REPORTED_OUTLIERS) furthest of those points.
+    """
+    points = as_points(data)
+    avg_distance = mean_pairwise_distance(points)
+    median_point = np.median(points, axis=0)
+    distances = np.sqrt(((points - median_point) ** 2).sum(axis=1))
+
+    outlier_indexes = np.flatnonzero(distances > avg_distance * 2)
+    outliers_count = len(outlier_indexes)
+    if outliers_count >= MAX_REPORTED_OUTLIERS:
+        furthest = np.argsort(-distances[outlier_indexes], kind="stable")[:MAX_REPORTED_OUTLIERS]
+        outlier_indexes = outlier_indexes[furthest]
+    outliers = [data[i] for i in outlier_indexes]
+    return outliers_count, outliers
+
+
+def benchmark(n=5000, repeat=3):
+    rng = np.random.default_rng(1)
+    x = rng.normal(0, 10, n)
+    data = np.column_stack([x, 2 * x + rng.normal(0, 5, n)]).round(2).tolist()
+
+    for func in (calculate_dispersion, calculate_trendline, count_outliers):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func(data)
+        elapsed = (time.perf_counter() - started) / repeat
+        print("{:<22} {:>6} points  {:8.2f} ms".format(func.__name__, n, elapsed * 1000))
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
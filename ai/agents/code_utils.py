@@ -12,6 +12,7 @@ from ai.agents import oai
 import json
 import traceback
 from ai.backend.base_config import CONFIG
+from ai.agents.kernel_pool import KernelTimeout, get_kernel_pool
 
 
 if_hide_sensitive = CONFIG.if_hide_sensitive
@@ -218,6 +219,24 @@ def _cmd(lang):
     raise NotImplementedError(f"{lang} not recognized in code execution")
 
 
+def _use_kernel_pool(lang):
+    return lang.startswith("python") and not WIN32 and CONFIG.python_kernel_pool_size > 0
+
+
+def _native_result(result, filepath, filename, work_dir, original_filename):
+    if result.returncode:
+        logs = result.stderr
+        if original_filename is None:
+            abs_path = str(pathlib.Path(filepath).absolute())
+            logs = logs.replace(str(abs_path), "").replace(filename, "")
+        else:
+            abs_path = str(pathlib.Path(work_dir).absolute()) + PATH_SEPARATOR
+            logs = logs.replace(str(abs_path), "")
+    else:
+        logs = result.stdout
+    return result.returncode, logs, None
+
+
 def execute_code(
     code: Optional[str] = None,
     timeout: Optional[int] = None,
@@ -289,6 +308,19 @@ def execute_code(
             fout.write(code)
     # check if already running in a docker container
     in_docker_container = os.path.exists("/.dockerenv")
+    if (not use_docker or in_docker_container) and _use_kernel_pool(lang):
+        try:
+            returncode, stdout, stderr = get_kernel_pool(CONFIG.python_kernel_pool_size).run(
+                filename, work_dir, timeout
+            )
+        except KernelTimeout:
+            if original_filename is None:
+                os.remove(filepath)
+            return 1, TIMEOUT_MSG, None
+        result = subprocess.CompletedProcess(filename, returncode, stdout, stderr)
+        if original_filename is None:
+            os.remove(filepath)
+        return _native_result(result, filepath, filename, work_dir, original_filename)
     if not use_docker or in_docker_container:
         # already running in a docker container
         cmd = [
@@ -321,17 +353,7 @@ def execute_code(
                 return 1, TIMEOUT_MSG, None
         if original_filename is None:
             os.remove(filepath)
-        if result.returncode:
-            logs = result.stderr
-            if original_filename is None:
-                abs_path = str(pathlib.Path(filepath).absolute())
-                logs = logs.replace(str(abs_path), "").replace(filename, "")
-            else:
-                abs_path = str(pathlib.Path(work_dir).absolute()) + PATH_SEPARATOR
-                logs = logs.replace(str(abs_path), "")
-        else:
-            logs = result.stdout
-        return result.returncode, logs, None
+        return _native_result(result, filepath, filename, work_dir, original_filename)
 
     # create a docker client
     client = docker.from_env()
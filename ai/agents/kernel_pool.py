@@ -0,0 +1,161 @@
+import json
+import logging
+import os
+import queue
+import select
+import subprocess
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "kernel_worker.py")
+# Extra time given to a kernel to report a timed out run before it is killed.
+KILL_GRACE_PERIOD = 10
+STARTUP_TIMEOUT = 120
+
+
+class KernelTimeout(Exception):
+    pass
+
+
+class KernelError(Exception):
+    pass
+
+
+class Kernel(object):
+    """A warm `kernel_worker.py` process that runs one file at a time."""
+
+    def __init__(self, preload_modules=None):
+        args = [sys.executable, "-u", WORKER_SCRIPT]
+        if preload_modules is not None:
+            args.append(json.dumps(preload_modules))
+
+        self.process = subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+        )
+        self._read_response(STARTUP_TIMEOUT)
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def _read_response(self, timeout):
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not ready:
+            raise KernelError("kernel did not respond in time")
+
+        line = self.process.stdout.readline()
+        if not line:
+            raise KernelError("kernel exited")
+        return json.loads(line)
+
+    def run(self, filename, cwd, timeout):
+        request = {"filename": filename, "cwd": os.path.abspath(cwd), "timeout": timeout}
+        self.process.stdin.write(json.dumps(request) + "\n")
+        self.process.stdin.flush()
+
+        response = self._read_response(timeout + KILL_GRACE_PERIOD)
+        if response["timeout"]:
+            raise KernelTimeout()
+
+        return response["returncode"], response["stdout"], response["stderr"]
+
+    def close(self):
+        try:
+            self.process.kill()
+            self.process.wait()
+        except Exception:
+            logger.debug("Failed stopping kernel.", exc_info=True)
+
+
+class KernelPool(object):
+    """Up to `size` warm kernels shared by the agents of this process.
+
+    Kernels are started on first use and reused across runs; a kernel that
+    fails or misses its deadline is replaced by a fresh one.
+    """
+
+    def __init__(self, size, preload_modules=None):
+        self.size = size
+        self.preload_modules = preload_modules
+        self._idle = queue.LifoQueue()
+        self._started = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        with self._lock:
+            start_new = self._idle.empty() and self._started < self.size
+            if start_new:
+                self._started += 1
+
+        if start_new:
+            try:
+                return Kernel(self.preload_modules)
+            except Exception:
+                with self._lock:
+                    self._started -= 1
+                raise
+
+        while True:
+            kernel = self._idle.get()
+            if kernel.alive:
+                return kernel
+
+            kernel.close()
+            with self._lock:
+                self._started -= 1
+            return self._acquire()
+
+    def _release(self, kernel, discard=False):
+        if discard or not kernel.alive:
+            kernel.close()
+            with self._lock:
+                self._started -= 1
+        else:
+            self._idle.put(kernel)
+
+    def run(self, filename, cwd, timeout):
+        """Run `filename` (relative to `cwd`) like `python filename` would.
+
+        Returns (returncode, stdout, stderr); raises KernelTimeout when the
+        code runs for longer than `timeout` seconds.
+        """
+        kernel = self._acquire()
+        started_at = time.time()
+        try:
+            result = kernel.run(filename, cwd, timeout)
+        except KernelTimeout:
+            self._release(kernel)
+            raise
+        except Exception:
+            self._release(kernel, discard=True)
+            if time.time() - started_at >= timeout:
+                raise KernelTimeout()
+            raise
+
+        self._release(kernel)
+        return result
+
+    def shutdown(self):
+        while not self._idle.empty():
+            self._release(self._idle.get(), discard=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_kernel_pool(size, preload_modules=None):
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = KernelPool(size, preload_modules)
+        return _pool
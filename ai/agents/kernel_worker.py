@@ -0,0 +1,156 @@
+"""Warm interpreter used by `ai.agents.kernel_pool`.
+
+Started as a plain script (it must not import the `ai` package), it imports
+the heavy libraries generated code usually needs once, then serves run
+requests read as JSON lines from stdin. Every run happens in a forked child,
+so the code starts from the same clean, already-imported state each time and
+can't leak globals, patched modules or open handles into the next run.
+"""
+import builtins
+import importlib
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+import traceback
+
+PRELOAD_MODULES = [
+    "numpy",
+    "pandas",
+    "pymysql",
+    "mysql.connector",
+    "psycopg2",
+    "sqlalchemy",
+    "pymongo",
+    "pyecharts",
+    "sklearn",
+]
+
+
+def preload(modules):
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+
+
+def _exit_code(value):
+    if value is None:
+        return 0
+    if isinstance(value, int):
+        return value
+    print(value, file=sys.stderr)
+    return 1
+
+
+def _run_child(request, stdout_path, stderr_path):
+    # Own process group, so a timeout also stops anything the code spawned.
+    os.setsid()
+
+    for fd, path in ((1, stdout_path), (2, stderr_path)):
+        out = os.open(path, os.O_WRONLY | os.O_TRUNC)
+        os.dup2(out, fd)
+        os.close(out)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    sys.stdout = open(1, "w", encoding="utf-8", closefd=False)
+    sys.stderr = open(2, "w", encoding="utf-8", closefd=False)
+
+    code = 1
+    try:
+        os.chdir(request["cwd"])
+        filename = request["filename"]
+        sys.argv = [filename]
+        sys.path.insert(0, os.path.dirname(os.path.abspath(filename)))
+
+        with open(filename, encoding="utf-8") as f:
+            source = f.read()
+
+        main = {"__name__": "__main__", "__file__": filename, "__builtins__": builtins}
+        exec(compile(source, filename, "exec"), main)
+        code = 0
+    except SystemExit as e:
+        code = _exit_code(e.code)
+    except BaseException as e:
+        # Skip this frame, so the traceback reads like `python <filename>`.
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def _wait(pid, timeout):
+    deadline = time.time() + timeout
+    while True:
+        finished, status = os.waitpid(pid, os.WNOHANG)
+        if finished:
+            if os.WIFSIGNALED(status):
+                return -os.WTERMSIG(status), False
+            return os.WEXITSTATUS(status), False
+
+        if time.time() >= deadline:
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except OSError:
+                pass
+            os.waitpid(pid, 0)
+            return 1, True
+
+        time.sleep(0.01)
+
+
+def _read(path):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def run(request):
+    stdout_fd, stdout_path = tempfile.mkstemp(prefix="kernel_out_")
+    stderr_fd, stderr_path = tempfile.mkstemp(prefix="kernel_err_")
+    os.close(stdout_fd)
+    os.close(stderr_fd)
+
+    try:
+        pid = os.fork()
+        if pid == 0:
+            _run_child(request, stdout_path, stderr_path)
+
+        returncode, timed_out = _wait(pid, request["timeout"])
+        return {
+            "returncode": returncode,
+            "timeout": timed_out,
+            "stdout": _read(stdout_path),
+            "stderr": _read(stderr_path),
+        }
+    finally:
+        os.remove(stdout_path)
+        os.remove(stderr_path)
+
+
+def serve():
+    # Keep the protocol channel away from anything the preloaded modules print.
+    channel = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+
+    preload(json.loads(sys.argv[1]) if len(sys.argv) > 1 else PRELOAD_MODULES)
+    channel.write(json.dumps({"ready": True}) + "\n")
+    channel.flush()
+
+    for line in sys.stdin:
+        response = run(json.loads(line))
+        channel.write(json.dumps(response) + "\n")
+        channel.flush()
+
+
+if __name__ == "__main__":
+    serve()
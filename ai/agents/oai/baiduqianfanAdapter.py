@@ -7,7 +7,11 @@ import requests
 import copy
 import re
 
+from . import transport
+
 BAIDUQIANFAN_MODEL = ""
+CHAT_URL = "https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/{model}?access_token={access_token}"
+TOKEN_URL = "https://aip.baidubce.com/oauth/2.0/token?grant_type=client_credentials&client_id={api_key}&client_secret={secrat_key}"
 
 
 class BaiduqianfanClient:
@@ -31,10 +35,38 @@ class BaiduqianfanClient:
         return result
         pass
 
+    @classmethod
+    async def arun(cls, api_key, secrat_key, data, model):
+        if api_key is None or "" == api_key:
+            raise Exception("Error, api key is empty")
+        if secrat_key is None or "" == secrat_key:
+            raise Exception("Error, secrat key is empty")
+        try:
+            token = await transport.post_json(
+                "BaiduQianFan", TOKEN_URL.format(api_key=api_key, secrat_key=secrat_key), ""
+            )
+            access_token = token.get("access_token")
+        except Exception as e:
+            print(e)
+            raise Exception("Error, get access token error")
+        messages_copy = copy.deepcopy(data['messages'])
+        functon_call = data['functions'] if "functions" in data else None
+        call_message = cls.input_to_openai(messages_copy, functon_call)
+        try:
+            response = await transport.post_json(
+                "BaiduQianFan", CHAT_URL.format(model=model, access_token=access_token), {"messages": call_message}
+            )
+        except Exception as e:
+            print(e)
+            raise Exception("Error, call baiduqianfan api error")
+        if "error_code" in response:
+            raise Exception("Error, call baiduqianfan api error" + str(response))
+        return cls.output_to_openai(response, model)
+
     @classmethod
     def call_baiduqianfan(cls, messages, model, access_token):
         try:
-            url = f"https://aip.baidubce.com/rpc/2.0/ai_custom/v1/wenxinworkshop/chat/{model}?access_token={access_token}"
+            url = CHAT_URL.format(model=model, access_token=access_token)
             payload = json.dumps({
                 "messages": messages
             })
@@ -51,7 +83,7 @@ class BaiduqianfanClient:
     @classmethod
     def get_access_token(cls, api_key, secrat_key):
         try:
-            url = f"https://aip.baidubce.com/oauth/2.0/token?grant_type=client_credentials&client_id={api_key}&client_secret={secrat_key}"
+            url = TOKEN_URL.format(api_key=api_key, secrat_key=secrat_key)
 
             payload = json.dumps("")
             headers = {
@@ -1,7 +1,9 @@
 from time import sleep
+import asyncio
 import logging
 import time
 from typing import List, Optional, Dict, Callable, Union
+import os
 import sys
 import shutil
 import numpy as np
@@ -9,6 +11,9 @@ from flaml import tune, BlendSearch
 from flaml.tune.space import is_constant
 from flaml.automl.logger import logger_formatter
 from .openai_utils import get_key
+from . import transport
+from .response_cache import response_cache
+from ai.backend.util.token_util import num_tokens_from_messages
 from ..agent_llm import AGENT_LLM_MODEL
 import requests
 
@@ -38,6 +43,41 @@ if not logger.handlers:
     _ch.setFormatter(logger_formatter)
     logger.addHandler(_ch)
 
+# LLMs whose replies can be streamed; the others deliver their reply in one piece.
+STREAMING_LLMS = {"OpenAI", "Deepseek"}
+
+
+class CompletionStream:
+    """Async iterator over the text chunks of a completion, returned by `Completion.astream`.
+
+    Once the iteration is over, `response` holds the complete response, the
+    same `acreate` would have returned. Chunks are only produced while the LLM
+    streams its reply: cached responses, function calls and LLMs that can't
+    stream yield nothing and only set `response`.
+    """
+
+    def __init__(self, start):
+        self._start = start
+        self.response = None
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        chunks = asyncio.Queue()
+        task = asyncio.ensure_future(self._start(chunks.put_nowait))
+        task.add_done_callback(lambda _: chunks.put_nowait(None))
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    break
+                yield chunk
+            self.response = task.result()
+        finally:
+            if not task.done():
+                task.cancel()
+
 
 class Completion(openai_Completion):
     """A class for OpenAI completion API.
@@ -181,209 +221,436 @@ class Completion(openai_Completion):
         cls._count_create += 1
 
     @classmethod
-    def _get_response(cls, config: Dict, raise_on_ratelimit_or_timeout=False, use_cache=True):
-        """Get the response from the openai api call.
+    def _resolve_llm(cls, config: Dict):
+        """Return (llm name, url, model, api key, api secret) to call for the agent in `config`.
 
-        Try cache first. If not found, call the openai api. If the api call fails, retry after retry_wait_time.
+        AGENT_LLM_MODEL may route an agent to another LLM than the default one.
         """
-        config = config.copy()
         agent_name = config['agent_name'] if 'agent_name' in config else None
+        use_llm_name = config.get("api_type")  # default llm
+        use_url = config['api_base'].strip() if "api_base" in config and config['api_base'] is not None else None
+        use_model = config['model'].strip() if "model" in config and config['model'] is not None else None
+        use_api_key = config['api_key']
+        llm_setting = config.get("llm_setting")  # all llm config
+        other_llm_name = AGENT_LLM_MODEL[agent_name]['llm'] if agent_name in AGENT_LLM_MODEL and \
+            AGENT_LLM_MODEL[agent_name][
+            'replace_default'] and llm_setting is not None else use_llm_name
+        use_api_secret = llm_setting[use_llm_name]['ApiSecret'] if llm_setting and "ApiSecret" in llm_setting[use_llm_name] else None
+        print("Agent_name", agent_name, 'default: llm:', use_llm_name, "url:", use_url, "model", use_model, "other LLM", other_llm_name)
+        if other_llm_name is not None and use_llm_name != other_llm_name:
+            use_message_count = AGENT_LLM_MODEL[agent_name]['use_message_count']
+            if 0 == use_message_count or len(config['messages']) <= use_message_count:
+                use_llm_name = other_llm_name
+                use_model = AGENT_LLM_MODEL[agent_name]['model'] if 'model' in AGENT_LLM_MODEL[agent_name] else None
+                use_api_key = llm_setting[AGENT_LLM_MODEL[agent_name]['llm']]['ApiKey']
+                use_api_secret = llm_setting[AGENT_LLM_MODEL[agent_name]['llm']]['ApiSecret'] if "ApiSecret" in llm_setting[AGENT_LLM_MODEL[agent_name]['llm']] else None
+                if "" == use_api_key:
+                    print("agent_llm llm api key empty, use_model:", use_model)
+                    raise Exception("agent_llm llm api key empty use_model:", use_model)
+            pass
+
+        print("agent_name:", agent_name, 'fact use: llm:', use_llm_name, "url:", use_url, "may use model:", use_model)
+        return use_llm_name, use_url, use_model, use_api_key, use_api_secret
+
+    @classmethod
+    def _llm_request_data(cls, config: Dict):
+        if config.get('functions'):
+            return {
+                "messages": config['messages'],
+                "functions": config['functions']
+            }
+        return {
+            "messages": config['messages']
+        }
+
+    @classmethod
+    def _call_llm(cls, use_llm_name, use_url, use_model, use_api_key, use_api_secret, data):
+        """Call a LLM other than OpenAI through its adapter."""
+        # Here the judgment calls a different LLM
+        if "DeepInsight" == use_llm_name:
+            """
+            The DeepInsight webserver is called here
+            """
+            headers = {
+                "token": use_api_key,
+                "ai_name": "openai",
+                "model": use_model
+            }
+            print('create_url : ', use_url)
+            res = requests.post(use_url, json=data, headers=headers)
+            if res.status_code != 200:
+                res.raise_for_status()
+            return res.json()
+        elif "Azure" == use_llm_name:
+            """
+            The Azure is called here
+            """
+            from .azureAdapter import AzureClient
+            return AzureClient.run(use_api_key, data, use_model, use_url)
+        elif "AliBaiLian" == use_llm_name:
+            from .alibailianAdapter import AlibailianClient
+            return AlibailianClient.run(use_api_key, data, use_model)
+        elif "ZhiPuAI" == use_llm_name:
+            """
+            The ZhipuAI is called here
+            """
+            from .zhipuaiAdapter import ZhiPuAIClient
+            return ZhiPuAIClient.run(use_api_key, data, use_model)
+        elif "Deepseek" == use_llm_name:
+            """
+            The Deepseek is called here
+            """
+            from .deepseekAdapter import DeepSeekClient
+            return DeepSeekClient.run(use_api_key, data, use_model, use_url)
+        elif "BaiduQianFan" == use_llm_name:
+            """
+            The BaiduQianFan 百度千帆 平台
+            """
+            from .baiduqianfanAdapter import BaiduqianfanClient
+            return BaiduqianfanClient.run(use_api_key, use_api_secret, data, use_model)
+        elif "AWSClaude" == use_llm_name:
+            from .claudeAdapter import AWSClaudeClient
+            api_data = {
+                'ApiKey': use_api_key,
+                'ApiSecret': use_api_secret
+            }
+            return AWSClaudeClient.run(api_data, data, use_model, use_url)
+        else:
+            raise Exception("No model:", use_llm_name)
+
+    @classmethod
+    async def _acall_llm(cls, use_llm_name, use_url, use_model, use_api_key, use_api_secret, data):
+        """Async version of `_call_llm`.
+
+        HTTP based adapters share the keep-alive sessions of `transport`; SDK
+        based ones run in the default executor, under the same per provider
+        concurrency limit.
+        """
+        if "DeepInsight" == use_llm_name:
+            headers = {
+                "token": use_api_key,
+                "ai_name": "openai",
+                "model": use_model
+            }
+            print('create_url : ', use_url)
+            return await transport.post_json("DeepInsight", use_url, data, headers)
+        elif "Deepseek" == use_llm_name:
+            from .deepseekAdapter import DeepSeekClient
+            return await DeepSeekClient.arun(use_api_key, data, use_model, use_url)
+        elif "BaiduQianFan" == use_llm_name:
+            from .baiduqianfanAdapter import BaiduqianfanClient
+            return await BaiduqianfanClient.arun(use_api_key, use_api_secret, data, use_model)
+        else:
+            return await transport.run_blocking(
+                use_llm_name, cls._call_llm, use_llm_name, use_url, use_model, use_api_key, use_api_secret, data
+            )
+
+    @classmethod
+    async def _astream_llm(cls, use_llm_name, use_url, use_model, use_api_key, use_api_secret, data, on_delta):
+        """Streaming version of `_acall_llm` for the LLMs in STREAMING_LLMS other than OpenAI."""
+        if "Deepseek" == use_llm_name:
+            from .deepseekAdapter import DeepSeekClient
+            return await DeepSeekClient.astream(use_api_key, data, on_delta, use_model, use_url)
+        raise Exception("No streaming model:", use_llm_name)
+
+    @classmethod
+    async def _astream_openai(cls, openai_completion, params: Dict, on_delta):
+        """Stream a chat completion from OpenAI and assemble the chunks into one response.
+
+        A stream that ends without a finish reason, empty or cut off, raises APIError,
+        so the incomplete reply is never returned or cached. The token usage is the one
+        the last chunk reports, estimated when the server doesn't send it.
+        """
+        content = []
+        finish_reason = None
+        usage = None
+        meta = {"id": None, "created": None, "model": params.get("model")}
+        chunks = await openai_completion.acreate(
+            stream=True, stream_options={"include_usage": True}, **params
+        )
+        async for chunk in chunks:
+            meta.update((key, chunk[key]) for key in meta if chunk.get(key))
+            if chunk.get("usage"):
+                usage = chunk["usage"]
+            for choice in chunk["choices"]:
+                delta = choice["delta"].get("content")
+                if delta:
+                    content.append(delta)
+                    on_delta(delta)
+                finish_reason = choice.get("finish_reason") or finish_reason
+        if finish_reason is None:
+            raise APIError("The streamed reply ended before it was complete")
+        if usage is None:
+            prompt_tokens = int(num_tokens_from_messages(params.get("messages", [])))
+            completion_tokens = int(num_tokens_from_messages([{"role": "assistant", "content": "".join(content)}]))
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+        return openai.openai_object.OpenAIObject.construct_from({
+            "id": meta["id"],
+            "object": "chat.completion",
+            "created": meta["created"],
+            "model": meta["model"],
+            "usage": usage,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(content)},
+                "finish_reason": finish_reason,
+            }],
+        })
+
+    @classmethod
+    def _prepare_openai_config(cls, config: Dict):
+        """Strip our own keys from `config` and convert functions to tools; returns the completion class."""
+        if "llm_setting" in config:
+            del config['llm_setting']
+        if "agent_name" in config:
+            del config['agent_name']
+        if "api_type" in config:
+            del config['api_type']
+
+        tools = []
+        if "functions" in config:
+            functions = config.pop("functions")
+            for function in functions:
+                tools.append({
+                    "type": "function",
+                    "function": function
+                })
+        if len(tools) > 0:
+            config['tools'] = tools
+
+        return (
+            openai.ChatCompletion
+            if config["model"].replace("gpt-35-turbo", "gpt-3.5-turbo") in cls.chat_models
+            or issubclass(cls, ChatCompletion)
+            else openai.Completion
+        )
+
+    @classmethod
+    def _convert_tool_calls(cls, response):
+        if "tool_calls" in response.choices[0].message and len(response.choices[0].message.tool_calls) > 0:
+            tool_calls = response.choices[0].message.pop("tool_calls")
+            function_call = tool_calls[0]
+            response.choices[0].message['function_call'] = {
+                "name": function_call.function.name,
+                "arguments": function_call.function.arguments
+            }
+            response.choices[0]['finish_reason'] = "function_call"
+        return response
+
+    @classmethod
+    def _handle_request_error(cls, err, config: Dict, retry: Dict):
+        """Decide how a failed request continues.
+
+        Returns the seconds to wait before retrying, or None when giving up
+        with -1; raises when the error must be propagated. `retry` holds the
+        request's retry state (start_time, request_timeout, max_retry_period,
+        retry_wait_time, raise_on_ratelimit_or_timeout, use_cache, the cache and its keys).
+        """
+        retry_wait_time = retry["retry_wait_time"]
+        if isinstance(err, (ServiceUnavailableError, APIConnectionError)):
+            # transient error
+            logger.info(f"retrying in {retry_wait_time} seconds...", exc_info=1)
+            return retry_wait_time
+        if isinstance(err, APIError) and not isinstance(err, (RateLimitError, Timeout)):
+            error_code = err and err.json_body and isinstance(err.json_body, dict) and err.json_body.get("error")
+            error_code = error_code and error_code.get("code")
+            if error_code == "content_filter":
+                raise err
+            # transient error
+            logger.info(f"retrying in {retry_wait_time} seconds...", exc_info=1)
+            return retry_wait_time
+        if isinstance(err, (RateLimitError, Timeout)):
+            max_retry_period = retry["max_retry_period"]
+            request_timeout = retry["request_timeout"]
+            time_left = max_retry_period - (time.time() - retry["start_time"] + retry_wait_time)
+            if (
+                time_left > 0
+                and isinstance(err, RateLimitError)
+                or time_left > request_timeout
+                and isinstance(err, Timeout)
+                and "request_timeout" not in config
+            ):
+                if isinstance(err, Timeout):
+                    request_timeout <<= 1
+                retry["request_timeout"] = min(request_timeout, time_left)
+                logger.info(f"retrying in {retry_wait_time} seconds...", exc_info=1)
+                return retry_wait_time
+            elif retry["raise_on_ratelimit_or_timeout"]:
+                raise err
+            else:
+                if retry["use_cache"] and isinstance(err, Timeout):
+                    retry["cache"].set(retry["key"], -1)
+                logger.warning(
+                    f"Failed to get response from openai api due to getting RateLimitError or Timeout for {max_retry_period} seconds."
+                )
+                return None
+        if isinstance(err, InvalidRequestError):
+            if "azure" in config.get("api_type", openai.api_type) and "model" in config:
+                # azure api uses "engine" instead of "model"
+                config["engine"] = config.pop("model").replace("gpt-3.5-turbo", "gpt-35-turbo")
+                return 0
+        raise err
+
+    @classmethod
+    def _start_request(cls, config: Dict, raise_on_ratelimit_or_timeout, use_cache, cache=None):
+        """Return (cached response or None, retry state) for a request."""
         openai.api_key_path = config.pop("api_key_path", openai.api_key_path)
+        schema = config.pop("schema_fingerprint", None)
         key = get_key(config)
+        shared_keys = response_cache.keys_for(config, schema) if use_cache else None
+        if use_cache and cache is None:
+            cache = cls._cache
         # use cache
         if use_cache:
-            response = cls._cache.get(key, None)
+            response = response_cache.get(shared_keys)
+            if response is not None:
+                cls._book_keeping(config, response)
+                return response, None
+            response = cache.get(key, None)
             print('use_cache_response: ', response)
             if response is not None and (response != -1 or not raise_on_ratelimit_or_timeout):
                 # print("using cached response")
                 cls._book_keeping(config, response)
-                return response
+                return response, None
+
+        return None, {
+            "start_time": time.time(),
+            "request_timeout": cls.request_timeout,
+            "max_retry_period": config.pop("max_retry_period", cls.max_retry_period),
+            "retry_wait_time": config.pop("retry_wait_time", cls.retry_wait_time),
+            "raise_on_ratelimit_or_timeout": raise_on_ratelimit_or_timeout,
+            "use_cache": use_cache,
+            "cache": cache,
+            "key": key,
+            "shared_keys": shared_keys,
+            "schema": schema,
+        }
 
-        start_time = time.time()
-        request_timeout = cls.request_timeout
-        max_retry_period = config.pop("max_retry_period", cls.max_retry_period)
-        retry_wait_time = config.pop("retry_wait_time", cls.retry_wait_time)
+    @classmethod
+    def _finish_request(cls, config: Dict, response, retry: Dict):
+        if retry["use_cache"]:
+            retry["cache"].set(retry["key"], response)
+            response_cache.put(retry["shared_keys"], response, retry["schema"])
+        cls._book_keeping(config, response)
+        return response
 
+    @classmethod
+    def _get_response(cls, config: Dict, raise_on_ratelimit_or_timeout=False, use_cache=True):
+        """Get the response from the openai api call.
+
+        Try cache first. If not found, call the openai api. If the api call fails, retry after retry_wait_time.
+        """
+        config = config.copy()
+        response, retry = cls._start_request(config, raise_on_ratelimit_or_timeout, use_cache)
+        if retry is None:
+            return response
+
+        use_llm_name, use_url, use_model, use_api_key, use_api_secret = cls._resolve_llm(config)
         while True:
             try:
-                use_llm_name = config.get("api_type")  # default llm
-                use_url = config['api_base'].strip() if "api_base" in config and config['api_base'] is not None else None
-                use_model = config['model'].strip() if "model" in config and config['model'] is not None else None
-                use_api_key = config['api_key']
-                llm_setting = config.get("llm_setting")  # all llm config
-                other_llm_name = AGENT_LLM_MODEL[agent_name]['llm'] if agent_name in AGENT_LLM_MODEL and \
-                    AGENT_LLM_MODEL[agent_name][
-                    'replace_default'] and llm_setting is not None else use_llm_name
-                use_api_secret = llm_setting[use_llm_name]['ApiSecret'] if llm_setting and "ApiSecret" in llm_setting[use_llm_name] else None
-                print("Agent_name", agent_name, 'default: llm:', use_llm_name, "url:", use_url, "model", use_model, "other LLM", other_llm_name)
-                if other_llm_name is not None and use_llm_name != other_llm_name:
-                    use_message_count = AGENT_LLM_MODEL[agent_name]['use_message_count']
-                    if 0 == use_message_count or len(config['messages']) <= use_message_count:
-                        use_llm_name = other_llm_name
-                        use_model = AGENT_LLM_MODEL[agent_name]['model'] if 'model' in AGENT_LLM_MODEL[agent_name] else None
-                        use_api_key = llm_setting[AGENT_LLM_MODEL[agent_name]['llm']]['ApiKey']
-                        use_api_secret = llm_setting[AGENT_LLM_MODEL[agent_name]['llm']]['ApiSecret'] if "ApiSecret" in llm_setting[AGENT_LLM_MODEL[agent_name]['llm']] else None
-                        if "" == use_api_key:
-                            print("agent_llm llm api key empty, use_model:", use_model)
-                            raise Exception("agent_llm llm api key empty use_model:", use_model)
-                    pass
-
-                print("agent_name:", agent_name, 'fact use: llm:', use_llm_name, "url:", use_url, "may use model:", use_model)
                 if use_llm_name != "OpenAI":
                     """
                     A different LLM is called here
                     """
-                    if config.get('functions'):
-                        data = {
-                            "messages": config['messages'],
-                            "functions": config['functions']
-                        }
-                    else:
-                        data = {
-                            "messages": config['messages']
-                        }
-                    # Here the judgment calls a different LLM
-                    if "DeepInsight" == use_llm_name:
-                        """
-                        The DeepInsight webserver is called here
-                        """
-                        headers = {
-                            "token": use_api_key,
-                            "ai_name": "openai",
-                            "model": use_model
-                        }
-                        print('create_url : ', use_url)
-                        res = requests.post(use_url, json=data, headers=headers)
-                        if res.status_code != 200:
-                            res.raise_for_status()
-                        response = res.json()
-                    elif "Azure" == use_llm_name:
-                        """
-                        The Azure is called here
-                        """
-                        from .azureAdapter import AzureClient
-                        response = AzureClient.run(use_api_key, data, use_model, use_url)
-                    elif "AliBaiLian" == use_llm_name:
-                        from .alibailianAdapter import AlibailianClient
-                        response = AlibailianClient.run(use_api_key, data, use_model)
-                    elif "ZhiPuAI" == use_llm_name:
-                        """
-                        The ZhipuAI is called here
-                        """
-                        from .zhipuaiAdapter import ZhiPuAIClient
-                        response = ZhiPuAIClient.run(use_api_key, data, use_model)
-                    elif "Deepseek" == use_llm_name:
-                        """
-                        The Deepseek is called here
-                        """
-                        from .deepseekAdapter import DeepSeekClient
-                        response = DeepSeekClient.run(use_api_key, data, use_model, use_url)
-                    elif "BaiduQianFan" == use_llm_name:
-                        """
-                        The BaiduQianFan 百度千帆 平台
-                        """
-                        from .baiduqianfanAdapter import BaiduqianfanClient
-                        response = BaiduqianfanClient.run(use_api_key, use_api_secret, data, use_model)
-                    elif "AWSClaude" == use_llm_name:
-                        from .claudeAdapter import AWSClaudeClient
-                        api_data = {
-                            'ApiKey': use_api_key,
-                            'ApiSecret': use_api_secret
-                        }
-                        response = AWSClaudeClient.run(api_data, data, use_model, use_url)
-                    else:
-                        raise Exception("No model:", use_llm_name)
+                    data = cls._llm_request_data(config)
+                    response = cls._call_llm(use_llm_name, use_url, use_model, use_api_key, use_api_secret, data)
                 else:
                     """
                     By default, openai is invoked
                     """
-                    if "llm_setting" in config:
-                        del config['llm_setting']
-                    if "agent_name" in config:
-                        del config['agent_name']
-                    if "api_type" in config:
-                        del config['api_type']
-
-                    tools = []
-                    if "functions" in config:
-                        functions = config.pop("functions")
-                        for function in functions:
-                            tools.append({
-                                "type": "function",
-                                "function": function
-                            })
-                    if len(tools) > 0:
-                        config['tools'] = tools
-
-                    openai_completion = (
-                        openai.ChatCompletion
-                        if config["model"].replace("gpt-35-turbo", "gpt-3.5-turbo") in cls.chat_models
-                        or issubclass(cls, ChatCompletion)
-                        else openai.Completion
-                    )
+                    openai_completion = cls._prepare_openai_config(config)
                     if "request_timeout" in config:
                         response = openai_completion.create(**config)
                     else:
-                        response = openai_completion.create(request_timeout=request_timeout, **config)
-                    if "tool_calls" in response.choices[0].message and len(response.choices[0].message.tool_calls) > 0:
-                        tool_calls = response.choices[0].message.pop("tool_calls")
-                        function_call = tool_calls[0]
-                        response.choices[0].message['function_call'] = {
-                            "name": function_call.function.name,
-                            "arguments": function_call.function.arguments
-                        }
-                        response.choices[0]['finish_reason'] = "function_call"
-
+                        response = openai_completion.create(request_timeout=retry["request_timeout"], **config)
+                    cls._convert_tool_calls(response)
             except (
                 ServiceUnavailableError,
                 APIConnectionError,
-            ):
-                # transient error
-                logger.info(f"retrying in {retry_wait_time} seconds...", exc_info=1)
-                sleep(retry_wait_time)
-            except APIError as err:
-                error_code = err and err.json_body and isinstance(err.json_body, dict) and err.json_body.get("error")
-                error_code = error_code and error_code.get("code")
-                if error_code == "content_filter":
-                    raise
-                # transient error
-                logger.info(f"retrying in {retry_wait_time} seconds...", exc_info=1)
-                sleep(retry_wait_time)
-            except (RateLimitError, Timeout) as err:
-                time_left = max_retry_period - (time.time() - start_time + retry_wait_time)
-                if (
-                    time_left > 0
-                    and isinstance(err, RateLimitError)
-                    or time_left > request_timeout
-                    and isinstance(err, Timeout)
-                    and "request_timeout" not in config
-                ):
-                    if isinstance(err, Timeout):
-                        request_timeout <<= 1
-                    request_timeout = min(request_timeout, time_left)
-                    logger.info(f"retrying in {retry_wait_time} seconds...", exc_info=1)
-                    sleep(retry_wait_time)
-                elif raise_on_ratelimit_or_timeout:
-                    raise
+                APIError,
+                RateLimitError,
+                Timeout,
+                InvalidRequestError,
+            ) as err:
+                wait = cls._handle_request_error(err, config, retry)
+                if wait is None:
+                    return -1
+                sleep(wait)
+            else:
+                return cls._finish_request(config, response, retry)
+
+    @classmethod
+    async def _aget_response(
+        cls, config: Dict, raise_on_ratelimit_or_timeout=False, use_cache=True, cache=None, on_delta=None
+    ):
+        """Async version of `_get_response`, which never blocks the event loop.
+
+        Concurrent requests can't share `cls._cache`, so the cache to use is passed in.
+        With `on_delta`, replies without function calls from the STREAMING_LLMS are
+        streamed, calling `on_delta(text)` for every chunk.
+        """
+        config = config.copy()
+        response, retry = cls._start_request(config, raise_on_ratelimit_or_timeout, use_cache, cache)
+        if retry is None:
+            return response
+
+        use_llm_name, use_url, use_model, use_api_key, use_api_secret = cls._resolve_llm(config)
+        stream = on_delta is not None and use_llm_name in STREAMING_LLMS and not config.get("functions")
+        streamed = []
+        if stream:
+            forward = on_delta
+
+            def on_delta(delta):
+                streamed.append(len(delta))
+                forward(delta)
+
+        while True:
+            try:
+                if use_llm_name != "OpenAI":
+                    data = cls._llm_request_data(config)
+                    if stream:
+                        response = await cls._astream_llm(
+                            use_llm_name, use_url, use_model, use_api_key, use_api_secret, data, on_delta
+                        )
+                    else:
+                        response = await cls._acall_llm(use_llm_name, use_url, use_model, use_api_key, use_api_secret, data)
                 else:
-                    response = -1
-                    if use_cache and isinstance(err, Timeout):
-                        cls._cache.set(key, response)
-                    logger.warning(
-                        f"Failed to get response from openai api due to getting RateLimitError or Timeout for {max_retry_period} seconds."
+                    openai_completion = cls._prepare_openai_config(config)
+                    params = config if "request_timeout" in config else dict(
+                        config, request_timeout=retry["request_timeout"]
                     )
-                    return response
-            except InvalidRequestError:
-                if "azure" in config.get("api_type", openai.api_type) and "model" in config:
-                    # azure api uses "engine" instead of "model"
-                    config["engine"] = config.pop("model").replace("gpt-3.5-turbo", "gpt-35-turbo")
-                else:
+                    async with transport.get_semaphore("OpenAI"):
+                        # Let the openai client reuse our keep-alive session.
+                        session_token = openai.aiosession.set(transport.get_session("OpenAI"))
+                        try:
+                            if stream and openai_completion is openai.ChatCompletion:
+                                response = await cls._astream_openai(openai_completion, params, on_delta)
+                            else:
+                                response = await openai_completion.acreate(**params)
+                        finally:
+                            openai.aiosession.reset(session_token)
+                    cls._convert_tool_calls(response)
+            except (
+                ServiceUnavailableError,
+                APIConnectionError,
+                APIError,
+                RateLimitError,
+                Timeout,
+                InvalidRequestError,
+            ) as err:
+                if streamed:
+                    # Part of the reply was already handed out, it can't be retried.
                     raise
+                wait = cls._handle_request_error(err, config, retry)
+                if wait is None:
+                    return -1
+                await asyncio.sleep(wait)
             else:
-                if use_cache:
-                    cls._cache.set(key, response)
-                cls._book_keeping(config, response)
-                return response
+                return cls._finish_request(config, response, retry)
 
     @classmethod
     def _get_max_valid_n(cls, key, max_tokens):
@@ -956,6 +1223,115 @@ class Completion(openai_Completion):
             cls.set_cache(seed)
             return cls._get_response(params, raise_on_ratelimit_or_timeout=raise_on_ratelimit_or_timeout)
 
+    @classmethod
+    async def acreate(
+        cls,
+        context: Optional[Dict] = None,
+        use_cache: Optional[bool] = True,
+        config_list: Optional[List[Dict]] = None,
+        filter_func: Optional[Callable[[Dict, Dict, Dict], bool]] = None,
+        raise_on_ratelimit_or_timeout: Optional[bool] = True,
+        allow_format_str_template: Optional[bool] = False,
+        openai_proxy: Optional[str] = None,
+        agent_name: Optional[str] = None,
+        on_delta: Optional[Callable[[str], None]] = None,
+        **config,
+    ):
+        """Async version of `create`, taking the same arguments.
+
+        Requests go through the shared keep-alive sessions and per provider
+        concurrency limits of `ai.agents.oai.transport`, and retries wait with
+        `asyncio.sleep`, so many chats can wait on the LLM in one event loop.
+        When `on_delta` is given, a reply that can be streamed is passed to it
+        chunk by chunk while it arrives (see `astream`).
+        """
+        if ERROR:
+            raise ERROR
+        if not transport.enabled():
+            return await asyncio.get_running_loop().run_in_executor(
+                None,
+                lambda: cls.create(
+                    context,
+                    use_cache,
+                    config_list=config_list,
+                    filter_func=filter_func,
+                    raise_on_ratelimit_or_timeout=raise_on_ratelimit_or_timeout,
+                    allow_format_str_template=allow_format_str_template,
+                    openai_proxy=openai_proxy,
+                    agent_name=agent_name,
+                    **config,
+                ),
+            )
+        if openai_proxy is not None:
+            openai.proxy = openai_proxy
+
+        if type(config_list) is list and len(config_list) == 0:
+            logger.warning(
+                "Completion was provided with a config_list, but the list was empty. Adopting default OpenAI behavior, which reads from the 'model' parameter instead."
+            )
+
+        if config_list:
+            last = len(config_list) - 1
+            cost = 0
+            for i, each_config in enumerate(config_list):
+                base_config = config.copy()
+                base_config["allow_format_str_template"] = allow_format_str_template
+                base_config.update(each_config)
+                if i < last and filter_func is None and "max_retry_period" not in base_config:
+                    # max_retry_period = 0 to avoid retrying when no filter is given
+                    base_config["max_retry_period"] = 0
+                try:
+                    response = await cls.acreate(
+                        context,
+                        use_cache,
+                        raise_on_ratelimit_or_timeout=i < last or raise_on_ratelimit_or_timeout,
+                        openai_proxy=openai_proxy,
+                        agent_name=agent_name,
+                        on_delta=on_delta,
+                        **base_config,
+                    )
+                    if response == -1:
+                        return response
+                    pass_filter = filter_func is None or filter_func(
+                        context=context, base_config=config, response=response
+                    )
+                    if pass_filter or i == last:
+                        response["cost"] = cost + response["cost"]
+                        response["config_id"] = i
+                        response["pass_filter"] = pass_filter
+                        return response
+                    cost += response["cost"]
+                except (AuthenticationError, RateLimitError, Timeout, InvalidRequestError):
+                    logger.debug(f"failed with config {i}", exc_info=1)
+                    if i == last:
+                        raise
+        params = cls._construct_params(context, config, allow_format_str_template=allow_format_str_template)
+        params['agent_name'] = agent_name
+        if not use_cache:
+            return await cls._aget_response(
+                params, raise_on_ratelimit_or_timeout=raise_on_ratelimit_or_timeout, use_cache=False,
+                on_delta=on_delta,
+            )
+        seed = params.pop("seed", cls.seed)
+        with diskcache.Cache(f"{os.path.dirname(cls.cache_path)}/{seed}") as cache:
+            return await cls._aget_response(
+                params, raise_on_ratelimit_or_timeout=raise_on_ratelimit_or_timeout, cache=cache,
+                on_delta=on_delta,
+            )
+
+    @classmethod
+    def astream(cls, *args, **kwargs) -> CompletionStream:
+        """Like `acreate`, but returns a `CompletionStream` of the reply's text chunks.
+
+        ```python
+        stream = ChatCompletion.astream(messages=messages, **llm_config)
+        async for chunk in stream:
+            print(chunk, end="")
+        response = stream.response
+        ```
+        """
+        return CompletionStream(lambda on_delta: cls.acreate(*args, on_delta=on_delta, **kwargs))
+
     @classmethod
     def instantiate(
         cls,
@@ -6,6 +6,8 @@ import xml.etree.ElementTree as E_T
 import re
 import copy
 
+from . import transport
+
 
 # 强制 检查函数
 STRICT_MODE_CHECK_FUNCTION = False
@@ -51,41 +53,139 @@ class DeepSeekClient:
             return False
         pass
 
+    @classmethod
+    async def arun(cls, apiKey, data, model=None, use_url=None):
+        """
+        define run function, awaiting the shared async transport
+        """
+
+        if apiKey is None or apiKey == "":
+            raise Exception("LLM DeepSeek apikey empty,use_model: ", model, " need apikey")
+        messages_copy = copy.deepcopy(data['messages'])
+        messages = cls.transform_message_role(messages_copy)
+        model = model if model else DEEPSEEK_MODEL
+        use_url = use_url if use_url else DEEPSEEK_DEFAULT_URL
+        ai_result = await cls.acall_deepSeek(apiKey, messages, model, use_url)
+        if ai_result:
+            return cls.output_to_openai(ai_result)
+        else:
+            return False
+
+    @classmethod
+    async def astream(cls, apiKey, data, on_delta, model=None, use_url=None):
+        """
+        define streaming run function, calling on_delta(text) for every content chunk
+        and returning the assembled openai result like arun
+        """
+
+        if apiKey is None or apiKey == "":
+            raise Exception("LLM DeepSeek apikey empty,use_model: ", model, " need apikey")
+        messages_copy = copy.deepcopy(data['messages'])
+        messages = cls.transform_message_role(messages_copy)
+        model = model if model else DEEPSEEK_MODEL
+        use_url = use_url if use_url else DEEPSEEK_DEFAULT_URL
+        ai_result = await cls.astream_deepSeek(apiKey, messages, on_delta, model, use_url)
+        if ai_result:
+            return cls.output_to_openai(ai_result)
+        else:
+            return False
+
+    @classmethod
+    def build_request(cls, apikey, message, model=DEEPSEEK_MODEL, temperature=DEEPSEEK_TEMPERTURE, stream=False):
+        """
+        deepSeek request payload and headers
+        """
+        payload = {
+            "messages": message,
+            "model": model,
+            "frequency_penalty": 0,
+            "max_tokens": 2048,
+            "presence_penalty": 0,
+            "stop": None,
+            "stream": stream,
+            "temperature": temperature,
+            "top_p": 1,
+            "logprobs": False,
+            "top_logprobs": None
+        }
+        if stream:
+            # the last chunk then carries the token usage
+            payload["stream_options"] = {"include_usage": True}
+        headers = {
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'Authorization': 'Bearer ' + str(apikey)
+        }
+        return payload, headers
+
     @classmethod
     def call_deepSeek(cls, apikey, message, model=DEEPSEEK_MODEL, use_url=DEEPSEEK_DEFAULT_URL, temperature=DEEPSEEK_TEMPERTURE):
         """
         call deepSeek
         """
+        response = None
         try:
-            payload = json.dumps({
-                "messages": message,
-                "model": model,
-                "frequency_penalty": 0,
-                "max_tokens": 2048,
-                "presence_penalty": 0,
-                "stop": None,
-                "stream": False,
-                "temperature": temperature,
-                "top_p": 1,
-                "logprobs": False,
-                "top_logprobs": None
-            })
-            headers = {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-                'Authorization': 'Bearer ' + str(apikey)
-            }
-
-            response = requests.request("POST", use_url, headers=headers, data=payload)
+            payload, headers = cls.build_request(apikey, message, model, temperature)
+            response = requests.request("POST", use_url, headers=headers, data=json.dumps(payload))
             result = json.loads(response.text)
         except Exception as e:
             print("error" * 10)
-            print(response.text)
+            print(response.text if response is not None else None)
             print(e)
             result = False
         return result
         pass
 
+    @classmethod
+    async def acall_deepSeek(cls, apikey, message, model=DEEPSEEK_MODEL, use_url=DEEPSEEK_DEFAULT_URL, temperature=DEEPSEEK_TEMPERTURE):
+        """
+        call deepSeek through the shared keep-alive session
+        """
+        try:
+            payload, headers = cls.build_request(apikey, message, model, temperature)
+            result = await transport.post_json("Deepseek", use_url, payload, headers)
+        except Exception as e:
+            print("error" * 10)
+            print(getattr(e, "body", None))
+            print(e)
+            result = False
+        return result
+
+    @classmethod
+    async def astream_deepSeek(cls, apikey, message, on_delta, model=DEEPSEEK_MODEL, use_url=DEEPSEEK_DEFAULT_URL, temperature=DEEPSEEK_TEMPERTURE):
+        """
+        call deepSeek with a streamed response, returning the chunks joined into one completion
+        """
+        content = []
+        usage = None
+        finish_reason = None
+        try:
+            payload, headers = cls.build_request(apikey, message, model, temperature, stream=True)
+            async for chunk in transport.stream_sse("Deepseek", use_url, payload, headers):
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                for choice in chunk.get("choices") or []:
+                    delta = (choice.get("delta") or {}).get("content")
+                    if delta:
+                        content.append(delta)
+                        on_delta(delta)
+                    finish_reason = choice.get("finish_reason") or finish_reason
+        except Exception as e:
+            print("error" * 10)
+            print(getattr(e, "body", None))
+            print(e)
+            if content:
+                # part of the reply was already streamed, don't hand out (or cache) the rest as a reply
+                raise
+            return False
+        if content and finish_reason is None:
+            raise Exception("LLM DeepSeek stream ended before the reply was complete")
+        return {
+            "object": "chat.completion",
+            "choices": [{"message": {"role": "assistant", "content": "".join(content)}}],
+            "usage": usage or {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
     @classmethod
     def output_to_openai(cls, data):
         completion = str(data["choices"][0]['message']['content'])
@@ -0,0 +1,227 @@
+"""
+In-process cache of LLM responses shared by all chats.
+
+Unlike the per seed diskcache of `Completion`, whose key is the whole request
+(api key included), entries are keyed by the model, the fingerprint of the
+database schema the prompt talks about and the normalized prompt, so users
+asking the same question about the same schema share answers. Optionally, a
+prompt whose last message is close enough to a cached one (cosine similarity
+of locally computed character trigram embeddings) is answered from the cache
+too, as long as the rest of the conversation is the same.
+
+Entries expire after `ttl` seconds and the least recently used ones are
+evicted once the cached responses take more than `max_bytes`. Chats record
+which data source a fingerprint describes with `track`; when the schema of a
+data source changes, `invalidate_data_source` drops the answers about it.
+"""
+import copy
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TTL = 24 * 3600
+# Cosine similarity a last message needs to reuse a cached answer; None only allows exact matches.
+DEFAULT_SIMILARITY_THRESHOLD = None
+EMBEDDING_DIMENSIONS = 512
+
+_whitespace = re.compile(r"\s+")
+
+
+def schema_fingerprint(schema):
+    """Fingerprint of a schema description, as tagged on requests by `AgentInstanceUtil`."""
+    return hashlib.sha1(str(schema).encode("utf-8")).hexdigest()
+
+
+def normalize_text(text):
+    return _whitespace.sub(" ", str(text)).strip()
+
+
+def _normalize_message(message):
+    normalized = {"role": message.get("role"), "content": normalize_text(message.get("content") or "")}
+    for key in ("name", "function_call"):
+        if message.get(key) is not None:
+            normalized[key] = message[key]
+    return normalized
+
+
+def embed(text):
+    """Unit vector of hashed character trigram counts, a cheap local text embedding."""
+    vector = np.zeros(EMBEDDING_DIMENSIONS)
+    text = normalize_text(text).lower()
+    for i in range(max(len(text) - 2, 1)):
+        digest = hashlib.md5(text[i:i + 3].encode("utf-8")).digest()
+        vector[int.from_bytes(digest[:4], "little") % EMBEDDING_DIMENSIONS] += 1
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class ResponseCache(object):
+    """A thread safe LRU of LLM responses, bounded by their total size and age."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL, similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        # key -> (expires_at, size, response, context key, schema fingerprint, embedding)
+        self._entries = OrderedDict()
+        # context key -> keys of the entries sharing it
+        self._contexts = {}
+        # data source id -> fingerprints of the schemas chats described it with
+        self._data_sources = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def keys_for(self, config, schema=None):
+        """Return (key, context key, last message) of a request config.
+
+        The context key covers everything but the last message: model, schema
+        fingerprint, functions and the earlier messages.
+        """
+        if "messages" in config:
+            messages = [_normalize_message(message) for message in config["messages"]]
+        else:
+            messages = [{"role": "user", "content": normalize_text(config.get("prompt", ""))}]
+        last = messages[-1]["content"] if messages else ""
+        context = json.dumps(
+            {
+                "model": config.get("model"),
+                "schema": schema,
+                "functions": [function.get("name") for function in config.get("functions") or []],
+                "temperature": config.get("temperature"),
+                "messages": messages[:-1],
+            },
+            sort_keys=True,
+            default=str,
+        )
+        context_key = hashlib.sha256(context.encode("utf-8")).hexdigest()
+        key = hashlib.sha256((context_key + json.dumps(messages[-1:], sort_keys=True, default=str)).encode("utf-8")).hexdigest()
+        return key, context_key, last
+
+    def _pop(self, key):
+        expires_at, size, response, context_key, schema, vector = self._entries.pop(key)
+        self._bytes -= size
+        siblings = self._contexts.get(context_key)
+        if siblings is not None:
+            siblings.pop(key, None)
+            if not siblings:
+                del self._contexts[context_key]
+        return response
+
+    def _get_fresh(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _most_similar(self, context_key, last):
+        siblings = self._contexts.get(context_key)
+        if not siblings:
+            return None
+        keys = list(siblings)
+        similarities = np.stack([siblings[key] for key in keys]) @ embed(last)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+        return self._get_fresh(keys[best])
+
+    def get(self, keys):
+        """Return a copy of the cached response for the `keys_for` a request, or None."""
+        if not self.max_bytes:
+            return None
+
+        key, context_key, last = keys
+        with self._lock:
+            entry = self._get_fresh(key)
+            if entry is not None:
+                self.hits += 1
+            elif self.similarity_threshold is not None:
+                entry = self._most_similar(context_key, last)
+                if entry is not None:
+                    self.similar_hits += 1
+            if entry is None:
+                self.misses += 1
+                return None
+            response = entry[2]
+        return copy.deepcopy(response)
+
+    def put(self, keys, response, schema=None):
+        # Failed requests come back as -1 (rate limit/timeout) or False (DeepSeekClient
+        # errors); they must not be replayed to other chats.
+        if not self.max_bytes or not response or response == -1:
+            return
+        try:
+            size = len(json.dumps(response, default=str))
+        except (TypeError, ValueError):
+            return
+        if size > self.max_bytes // 4:
+            return
+
+        key, context_key, last = keys
+        vector = embed(last) if self.similarity_threshold is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+
+            self._entries[key] = (time.time() + self.ttl, size, copy.deepcopy(response), context_key, schema, vector)
+            if vector is not None:
+                self._contexts.setdefault(context_key, {})[key] = vector
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, schema_fingerprint=None):
+        """Drop the responses about a schema, or all of them; returns how many were dropped."""
+        with self._lock:
+            if schema_fingerprint is None:
+                keys = list(self._entries)
+            else:
+                keys = [key for key, entry in self._entries.items() if entry[4] == schema_fingerprint]
+            for key in keys:
+                self._pop(key)
+            return len(keys)
+
+    def track(self, data_source_id, schema_fingerprint):
+        """Record that `schema_fingerprint` describes (some tables of) a data source."""
+        if data_source_id is None or schema_fingerprint is None:
+            return
+        with self._lock:
+            self._data_sources.setdefault(str(data_source_id), set()).add(schema_fingerprint)
+
+    def invalidate_data_source(self, data_source_id):
+        """Drop the responses about the schemas of a data source; returns how many were dropped."""
+        with self._lock:
+            fingerprints = self._data_sources.pop(str(data_source_id), set())
+        return sum(self.invalidate(fingerprint) for fingerprint in fingerprints)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.similar_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.similar_hits) / lookups if lookups else 0.0,
+            }
+
+
+response_cache = ResponseCache()
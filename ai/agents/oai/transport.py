@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Shared asyncio HTTP transport for the LLM adapters.
+
+Every provider gets one keep-alive aiohttp session (and connection pool) per
+event loop, so agent turns reuse TCP/TLS connections instead of opening new
+ones, and a semaphore that caps how many requests to that provider are in
+flight at once. Transient failures (connection errors, timeouts, 429 and 5xx
+responses) are retried with exponential backoff without blocking the loop.
+Streamed (server-sent events) responses are only retried until the response
+headers arrive; a stream that breaks off midway raises.
+"""
+import asyncio
+import json
+import logging
+import random
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+# Requests in flight per provider and event loop; providers not listed use the default.
+DEFAULT_CONCURRENCY = 32
+PROVIDER_CONCURRENCY = {
+    "OpenAI": 64,
+    "Deepseek": 32,
+    "DeepInsight": 64,
+    "BaiduQianFan": 16,
+}
+# Connections kept open per provider session.
+CONNECTION_POOL_SIZE = 100
+DEFAULT_TIMEOUT = 90
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 30
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TransportError(Exception):
+    def __init__(self, message, status=None, body=None):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+
+# {loop: {provider: session}} and {loop: {provider: semaphore}}
+_sessions = {}
+_semaphores = {}
+
+
+def enabled():
+    return aiohttp is not None
+
+
+def _close_abandoned(sessions):
+    """Close the connections of sessions whose loop was closed without `close_sessions`.
+
+    Their `close()` can't be awaited anymore, so the connector's transports are
+    closed directly and the connector detached (the session then counts as closed).
+    """
+    for session in sessions.values():
+        connector = session.connector
+        if connector is not None and not connector.closed:
+            connector._close()
+        session.detach()
+
+
+def _per_loop(registry):
+    loop = asyncio.get_running_loop()
+    if loop not in registry:
+        # Forget loops that have been closed since.
+        for closed in [known for known in registry if known.is_closed()]:
+            if registry is _sessions:
+                _close_abandoned(registry[closed])
+            del registry[closed]
+        registry[loop] = {}
+    return registry[loop]
+
+
+def get_semaphore(provider):
+    semaphores = _per_loop(_semaphores)
+    if provider not in semaphores:
+        semaphores[provider] = asyncio.Semaphore(PROVIDER_CONCURRENCY.get(provider, DEFAULT_CONCURRENCY))
+    return semaphores[provider]
+
+
+def get_session(provider):
+    sessions = _per_loop(_sessions)
+    session = sessions.get(provider)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=CONNECTION_POOL_SIZE, keepalive_timeout=60),
+        )
+        sessions[provider] = session
+    return session
+
+
+async def close_sessions():
+    """Close the sessions of the running loop (call before the loop shuts down)."""
+    loop = asyncio.get_running_loop()
+    sessions = _sessions.pop(loop, {})
+    _semaphores.pop(loop, None)
+    for session in sessions.values():
+        await session.close()
+
+
+def _backoff(attempt):
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+async def with_retries(provider, send, max_retries=MAX_RETRIES, limit=True):
+    """Await `send()` under the provider's concurrency limit, retrying transient failures.
+
+    Pass `limit=False` when the caller already holds the provider's semaphore.
+    """
+    attempt = 0
+    while True:
+        try:
+            if not limit:
+                return await send()
+            async with get_semaphore(provider):
+                return await send()
+        except TransportError as e:
+            if e.status not in RETRY_STATUSES or attempt >= max_retries:
+                raise
+            error = e
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            if attempt >= max_retries:
+                raise
+            error = e
+
+        delay = _backoff(attempt)
+        attempt += 1
+        logger.info("%s request failed (%r), retrying in %.1f seconds...", provider, error, delay)
+        await asyncio.sleep(delay)
+
+
+async def post_json(provider, url, payload, headers=None, timeout=DEFAULT_TIMEOUT, max_retries=MAX_RETRIES):
+    """POST `payload` as JSON and return the decoded JSON response."""
+
+    async def send():
+        async with get_session(provider).post(
+            url,
+            data=json.dumps(payload),
+            headers={"Content-Type": "application/json", **(headers or {})},
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        ) as response:
+            body = await response.text()
+            if response.status >= 400:
+                raise TransportError(
+                    "{} request failed with status {}".format(provider, response.status),
+                    status=response.status,
+                    body=body,
+                )
+            return json.loads(body)
+
+    return await with_retries(provider, send, max_retries)
+
+
+async def stream_sse(provider, url, payload, headers=None, timeout=DEFAULT_TIMEOUT, max_retries=MAX_RETRIES):
+    """POST `payload` as JSON and yield the decoded `data:` events of the streamed response.
+
+    `timeout` bounds the wait for each chunk rather than the whole response.
+    """
+
+    async def connect():
+        response = await get_session(provider).post(
+            url,
+            data=json.dumps(payload),
+            headers={"Content-Type": "application/json", "Accept": "text/event-stream", **(headers or {})},
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout),
+        )
+        if response.status >= 400:
+            body = await response.text()
+            response.release()
+            raise TransportError(
+                "{} request failed with status {}".format(provider, response.status),
+                status=response.status,
+                body=body,
+            )
+        return response
+
+    async with get_semaphore(provider):
+        response = await with_retries(provider, connect, max_retries, limit=False)
+        try:
+            async for line in response.content:
+                line = line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                yield json.loads(data)
+        finally:
+            response.release()
+
+
+async def run_blocking(provider, func, *args):
+    """Run a synchronous adapter call in the default executor, under the provider's limit."""
+    async with get_semaphore(provider):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
@@ -153,74 +153,29 @@ class AIDB:
             print("The number of tables to be processed this time:  ", len(table_content))
             if len(table_content) > 0:
                 try:
-                    num = 1 + (len(q_str.get('table_desc')) - len(table_content))
-                    for db_desc in table_content:
-                        print("Start processing table: ", str(db_desc))
-                        planner_user = self.agent_instance_util.get_agent_planner_user()
-                        database_describer = self.agent_instance_util.get_agent_data_checker_assistant()
-
-                        qustion_message = """Help me check that the following data comments are complete and correct."""
-
-                        # if self.language_mode == CONFIG.language_chinese:
-                        #     qustion_message = "帮助我检查下列数据注释是否完整且正确: "
-
-                        await asyncio.wait_for(planner_user.initiate_chat(
-                            database_describer,
-                            # message=content + '\n' + " This is my question: " + '\n' + str(qustion_message),
-                            message=str(qustion_message) + '\n' + str(db_desc),
-                        ), timeout=120)  # time out 120 seconds
-
-                        answer_message = planner_user.last_message()["content"]
-                        print("answer_message: ", answer_message)
-
-                        match = re.search(
-                            r"```.*```", answer_message.strip(), re.MULTILINE | re.IGNORECASE | re.DOTALL
-                        )
-                        json_str = ""
-                        if match:
-                            json_str = match.group()
-                        else:
-                            json_str = answer_message
-
-                        try:
-                            json_str = json_str.replace("```json", "")
-                            json_str = json_str.replace("```", "")
-                            # print('json_str : ', json_str)
-                            chart_code_str = json_str.replace("\n", "")
-                            if base_util.is_json(chart_code_str):
-                                table_desc = json.loads(chart_code_str)
-                            else:
-                                table_desc = ast.literal_eval(chart_code_str)
-
-                            table_name = table_desc.get('table_name')
-
-                            # print("q_str['table_desc'] ,", q_str['table_desc'])
-                            for table in q_str['table_desc']:
-                                if table.get('table_name') == table_name:
-                                    if table_desc.get('is_pass') and table_desc.get('is_pass') == 1:
-                                        if table.get('table_comment') == '':
-                                            table['table_comment'] = table.get('table_name')
-
-                                        table['is_pass'] = table_desc.get('is_pass')
-                                    if table_desc.get('field_desc'):
-                                        for fd in table_desc.get('field_desc'):
-                                            field_name = fd.get('name')
-                                            for field in table.get('field_desc'):
-                                                if field.get('name') == field_name:
-                                                    if fd.get('is_pass') and fd.get('is_pass') == 1:
-                                                        if field.get('comment') == '':
-                                                            field['comment'] = field.get('name')
-                                                        field['is_pass'] = fd.get(
-                                                            'is_pass')
-
-                            percentage = (num / len(q_str.get('table_desc'))) * 100
-                            percentage_integer = int(percentage)
-
-                            await self.put_message(200, CONFIG.talker_log, CONFIG.type_data_check,
-                                                   content=percentage_integer)
-                            num = num + 1
-                        except Exception as e:
-                            pass
+                    total = len(q_str.get('table_desc'))
+                    checked = [total - len(table_content)]
+                    semaphore = asyncio.Semaphore(CONFIG.data_check_concurrency)
+
+                    async def check_batch(batch):
+                        async with semaphore:
+                            table_descs = await self.check_table_comments(batch)
+                        for table_desc in table_descs:
+                            self.apply_table_check(q_str, table_desc)
+
+                        checked[0] += len(batch)
+                        percentage_integer = int((checked[0] / total) * 100)
+                        await self.put_message(200, CONFIG.talker_log, CONFIG.type_data_check,
+                                               content=percentage_integer)
+
+                    tasks = [asyncio.ensure_future(check_batch(batch))
+                             for batch in self.batch_tables(table_content)]
+                    try:
+                        await asyncio.gather(*tasks)
+                    except Exception:
+                        for task in tasks:
+                            task.cancel()
+                        raise
 
                 except Exception as e:
                     traceback.print_exc()
@@ -253,6 +208,98 @@ class AIDB:
                     CONFIG.max_token_num) + ' , please select again'
             return await self.put_message(500, CONFIG.talker_log, CONFIG.type_data_check, content)
 
+    def batch_tables(self, table_content):
+        """Group the tables to check so that each prompt stays within CONFIG.data_check_batch_tokens."""
+        batches = []
+        batch = []
+        batch_tokens = 0
+        for db_desc in table_content:
+            tokens = num_tokens_from_messages([{"role": "user", "content": str(db_desc)}], model='gpt-4')
+            if batch and batch_tokens + tokens > CONFIG.data_check_batch_tokens:
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append(db_desc)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def check_table_comments(self, batch):
+        """Ask the data checker about a batch of tables; returns the checked table descriptions it replied."""
+        print("Start processing tables: ", str(batch))
+        planner_user = self.agent_instance_util.get_agent_planner_user()
+        database_describer = self.agent_instance_util.get_agent_data_checker_assistant()
+
+        if len(batch) == 1:
+            qustion_message = """Help me check that the following data comments are complete and correct."""
+            table_message = str(batch[0])
+        else:
+            qustion_message = ("Help me check that the following data comments are complete and correct. "
+                               "Check every table on its own, and reply with a JSON list holding one JSON instance per table.")
+            table_message = '\n'.join(str(db_desc) for db_desc in batch)
+
+        # if self.language_mode == CONFIG.language_chinese:
+        #     qustion_message = "帮助我检查下列数据注释是否完整且正确: "
+
+        await asyncio.wait_for(planner_user.initiate_chat(
+            database_describer,
+            message=str(qustion_message) + '\n' + table_message,
+        ), timeout=120)  # time out 120 seconds
+
+        answer_message = planner_user.last_message()["content"]
+        print("answer_message: ", answer_message)
+
+        match = re.search(
+            r"```.*```", answer_message.strip(), re.MULTILINE | re.IGNORECASE | re.DOTALL
+        )
+        json_str = ""
+        if match:
+            json_str = match.group()
+        else:
+            json_str = answer_message
+
+        try:
+            json_str = json_str.replace("```json", "")
+            json_str = json_str.replace("```", "")
+            # print('json_str : ', json_str)
+            chart_code_str = json_str.replace("\n", "")
+            if base_util.is_json(chart_code_str):
+                table_descs = json.loads(chart_code_str)
+            else:
+                table_descs = ast.literal_eval(chart_code_str)
+        except Exception as e:
+            return []
+
+        if isinstance(table_descs, dict):
+            table_descs = [table_descs]
+        if not isinstance(table_descs, list):
+            return []
+        return [table_desc for table_desc in table_descs if isinstance(table_desc, dict)]
+
+    def apply_table_check(self, q_str, table_desc):
+        """Mark the tables and fields of q_str that the data checker passed."""
+        table_name = table_desc.get('table_name')
+
+        # print("q_str['table_desc'] ,", q_str['table_desc'])
+        for table in q_str['table_desc']:
+            if table.get('table_name') == table_name:
+                if table_desc.get('is_pass') and table_desc.get('is_pass') == 1:
+                    if table.get('table_comment') == '':
+                        table['table_comment'] = table.get('table_name')
+
+                    table['is_pass'] = table_desc.get('is_pass')
+                if table_desc.get('field_desc'):
+                    for fd in table_desc.get('field_desc'):
+                        field_name = fd.get('name')
+                        for field in table.get('field_desc'):
+                            if field.get('name') == field_name:
+                                if fd.get('is_pass') and fd.get('is_pass') == 1:
+                                    if field.get('comment') == '':
+                                        field['comment'] = field.get('name')
+                                    field['is_pass'] = fd.get(
+                                        'is_pass')
+
     async def put_message(self, state=200, receiver='log', data_type=None, content=None):
         mess = {'state': state, 'data': {'data_type': data_type, 'content': content}, 'receiver': receiver}
         consume_output = json.dumps(mess)
@@ -244,7 +244,7 @@ class AnalysisCsv(Analysis):
             for i in range(max_retry_times):
                 try:
                     planner_user = self.agent_instance_util.get_agent_planner_user()
-                    analyst = self.agent_instance_util.get_agent_analyst()
+                    analyst = self.agent_instance_util.get_agent_analyst(stream=True)
 
                     question_supplement = 'Please make an analysis and summary in English, including which charts were generated, and briefly introduce the contents of these charts. IMPORTANT: Do not add "TERMINATE" at the end of your message.'
                     if self.language_mode == language_chinese:
@@ -264,7 +264,7 @@ class AnalysisCsv(Analysis):
 
                     # 使用现有的 analyst 实例，不尝试修改其系统消息
                     # 直接使用 agent_instance_util 中已经配置好的 analyst
-                    analyst = self.agent_instance_util.get_agent_analyst()
+                    analyst = self.agent_instance_util.get_agent_analyst(stream=True)
 
                     # 设置 human_input_mode 为 "NEVER"
                     planner_user.human_input_mode = "NEVER"
@@ -241,7 +241,7 @@ class AnalysisMysql(Analysis):
             for i in range(max_retry_times):
                 try:
                     planner_user = self.agent_instance_util.get_agent_planner_user()
-                    analyst = self.agent_instance_util.get_agent_analyst()
+                    analyst = self.agent_instance_util.get_agent_analyst(stream=True)
 
                     question_supplement = 'Please make an analysis and summary in English, including which charts were generated, and briefly introduce the contents of these charts. IMPORTANT: Do not add "TERMINATE" at the end of your message.'
                     if self.language_mode == CONFIG.language_chinese:
@@ -690,7 +690,7 @@ class QueryEnhancer:
             for i in range(max_retry_times):
                 try:
                     planner_user = self.agent_instance_util.get_agent_planner_user()
-                    analyst = self.agent_instance_util.get_agent_analyst()
+                    analyst = self.agent_instance_util.get_agent_analyst(stream=True)
 
                     # 检查是否有空数据图表
                     has_empty_charts = False
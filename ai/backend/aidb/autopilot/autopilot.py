@@ -1,8 +1,11 @@
 from ai.backend.base_config import CONFIG
 from ai.backend.aidb import AIDB
 from ai.agents.agentchat import HumanProxyAgent, TaskSelectorAgent, Questioner, AssistantAgent
+from ai.backend.util.write_log import logger
 from jinja2 import Template
 from pathlib import Path
+import asyncio
+import json
 import time
 import os
 
@@ -93,6 +96,46 @@ class Autopilot(AIDB):
     async def task_generate_echart(self, qustion_message):
         return self.qustion_message
 
+    async def generate_echarts(self, report_demands, report_file_name=None):
+        """Run task_generate_echart for all report demands at the same time.
+
+        At most CONFIG.autopilot_concurrency charts are generated at once, each within
+        CONFIG.autopilot_question_timeout seconds. Returns the (answer_message, echart_code)
+        of every demand in the demands' order, (None, None) for a chart that failed.
+        """
+        semaphore = asyncio.Semaphore(CONFIG.autopilot_concurrency)
+        finished = [0]
+
+        async def generate(report_demand):
+            async with semaphore:
+                try:
+                    if report_file_name is None:
+                        task = self.task_generate_echart(str(report_demand))
+                    else:
+                        task = self.task_generate_echart(str(report_demand), report_file_name)
+                    result = await asyncio.wait_for(task, timeout=CONFIG.autopilot_question_timeout)
+                except Exception as e:
+                    logger.error("from user:[{}".format(self.user_name) + "] , " + "error: " + repr(e))
+                    result = None, None
+
+            finished[0] += 1
+            if report_file_name is not None:
+                self.update_report_progress(report_file_name, finished[0], len(report_demands))
+            return result
+
+        return await asyncio.gather(*[generate(report_demand) for report_demand in report_demands])
+
+    def update_report_progress(self, report_file_name, finished, total):
+        """Record in the report file how many of its charts are done."""
+        try:
+            with open(report_file_name, 'r') as file:
+                data = json.load(file)
+            data['progress'] = int(finished / total * 100)
+            with open(report_file_name, 'w') as file:
+                json.dump(data, file, indent=4)
+        except Exception as e:
+            logger.error("update report progress error: " + str(e))
+
     def get_agent_ai_analyst(self, report_file_name=None):
         """ ai_analyst """
         ai_analyst = AssistantAgent(
@@ -189,19 +189,17 @@ class AutopilotMongoDB(Autopilot):
         report_html_code['report_thought'] = question_message
 
         question_list = []
-        que_num = 1
-        for ques in question_message:
+        report_demands = []
+        for ques in question_message[:4]:
             print('ques :', ques)
             report_demand = 'i need a echart report , ' + ques['report_name'] + ':' + ques['description']
             print("report_demand: ", report_demand)
+            report_demands.append(report_demand)
 
+        echart_results = await self.generate_echarts(report_demands)
+        for ques, report_demand, (answer_message, echart_code) in zip(question_message, report_demands, echart_results):
             question = {}
             question['question'] = ques
-            que_num = que_num + 1
-            if que_num > 5:
-                break
-
-            answer_message, echart_code = await self.task_generate_echart(str(report_demand))
             question['answer'] = answer_message
             question['echart_code'] = echart_code
             report_html_code['report_question'].append(question)
@@ -119,20 +119,19 @@ class AutopilotMysql(Autopilot):
             report_html_code['report_thought'] = question_message
 
             question_list = []
-            que_num = 0
-            for ques in question_message:
+            report_demands = []
+            for ques in question_message[:max_report_question]:
                 print('ques :', ques)
                 report_demand = 'i need a echart report , ' + ques['report_name'] + ' : ' + ques['description']
                 # report_demand = ' 10-1= ?? '
                 print("report_demand: ", report_demand)
+                report_demands.append(report_demand)
 
+            echart_results = await self.generate_echarts(report_demands, report_file_name)
+            for ques, report_demand, (answer_message, echart_code) in zip(question_message, report_demands,
+                                                                          echart_results):
                 question = {}
                 question['question'] = ques
-                que_num = que_num + 1
-                if que_num > max_report_question:
-                    break
-
-                answer_message, echart_code = await self.task_generate_echart(str(report_demand), report_file_name)
                 if answer_message is not None and echart_code is not None:
                     question['answer'] = answer_message
                     question['echart_code'] = echart_code
@@ -1,5 +1,6 @@
 from flask import Flask, request
 import asyncio
+from ai.agents.oai import transport
 from ai.backend.chat_task import ChatClass
 from ai.backend.aidb.autopilot.autopilot_mysql_api import AutopilotMysql
 from concurrent.futures import ThreadPoolExecutor
@@ -13,9 +14,11 @@ executor = ThreadPoolExecutor()
 def run_async(func):
     def wrapper(*args, **kwargs):
         loop = asyncio.new_event_loop()
-        result = loop.run_until_complete(func(*args, **kwargs))
-        loop.close()
-        return result
+        try:
+            return loop.run_until_complete(func(*args, **kwargs))
+        finally:
+            loop.run_until_complete(transport.close_sessions())
+            loop.close()
 
     return wrapper
 
@@ -30,8 +30,36 @@ class Config:
 
         self.python_base_dependency = """python installed dependency environment: pymysql, pandas, mysql-connector-python, pyecharts, sklearn, psycopg2, sqlalchemy, pymongo"""
 
+        # Warm interpreters used to run generated python code natively (0 starts a new interpreter per run)
+        self.python_kernel_pool_size = 2
+
         self.max_token_num = 7500
 
+        # Seconds the decoded connection info of a data source is reused by the code turns of a chat
+        self.db_info_cache_ttl = 300
+
+        # Seconds an agent waits for the browser to reply to a request (run SQL, save a chart, ...)
+        self.bi_reply_timeout = 50
+
+        # SQL results reused within a chat: entries kept and seconds they stay valid
+        self.sql_result_cache_size = 64
+        self.sql_result_cache_ttl = 600
+        # Run agent SQL on MySQL data sources from the AI server instead of the browser.
+        # The browser then keeps its previous query, so only enable it where charts are not built there.
+        # This path connects with the data source's stored credentials and skips the BI permission checks
+        # (groups, view_only). It only runs single SELECT statements, in a read-only transaction; other SQL,
+        # other data source types (StarRocks included) and SQL that fails here still go through the browser.
+        self.sql_direct_execution = False
+        self.sql_direct_execution_timeout = 60
+
+        # Comment check: tables checked per prompt (up to this many tokens) and prompts in flight at once
+        self.data_check_batch_tokens = 1500
+        self.data_check_concurrency = 4
+
+        # Autopilot: charts of a report generated at once, and seconds allowed per chart
+        self.autopilot_concurrency = 5
+        self.autopilot_question_timeout = 600
+
         self.talker_bi = 'bi'
         self.talker_user = 'user'
         self.talker_log = 'log'
@@ -4,8 +4,10 @@ import time
 import traceback
 from ai.backend.util.write_log import logger
 from ai.agents import AgentInstanceUtil
+from ai.agents.oai.response_cache import response_cache
 from ai.backend.memory import ChatMemoryManager
 from ai.backend.base_config import CONFIG
+from ai.backend.util.message_router import MessageRouter
 from ai.backend.aidb.report import ReportMysql, ReportPostgresql, ReportStarrocks, ReportMongoDB
 from ai.backend.aidb.analysis import AnalysisMysql, AnalysisCsv, AnalysisPostgresql, AnalysisStarrocks, AnalysisMongoDB
 from ai.backend.aidb import AIDB
@@ -23,6 +25,8 @@ class ChatClass:
         # Messages that cannot be processed currently are temporarily stored.
         self.delay_messages = {'user': [], 'bi': {'mysql_code': [], 'chart_code': [],
                                                   'delete_chart': [], 'ask_data': []}, 'close': []}
+        # Delivers the browser's replies to the requests of the agents
+        self.message_router = MessageRouter()
 
         # Generate unique session ID
         session_id = str(id(websocket))
@@ -37,6 +41,7 @@ class ChatClass:
                                                      delay_messages=self.delay_messages,
                                                      outgoing=self.outgoing,
                                                      incoming=self.incoming,
+                                                     message_router=self.message_router,
                                                      )
         self.agent_instance_util.set_socket(websocket)
         self.agent_instance_util.set_language_mode(CONFIG.default_language_mode)
@@ -62,9 +67,10 @@ class ChatClass:
         self.autopilotCSV = AutopilotCSV(self)
 
     async def get_message(self):
-        """ Receive messages and put them into the [pending] message queue """
+        """ Receive messages, hand replies to the agents waiting for them and put the rest into the [pending] message queue """
         msg_in = await self.ws.recv()
-        await self.incoming.put(msg_in)
+        if not self.message_router.dispatch(msg_in):
+            await self.incoming.put(msg_in)
         got_mess = str(time.strftime("%Y-%m-%d %H:%M:%S",
                                      time.localtime())) + ' ---- ' + "from user:[{}".format(
             self.user_name) + "], got a message:{}".format(msg_in)
@@ -87,10 +93,11 @@ class ChatClass:
         except asyncio.QueueEmpty:
             return ""  # Return an empty string if the queue is empty
 
-    async def consume(self):
-        """ Process received messages """
+    async def consume(self, message=None):
+        """ Process a received message, the next one in the queue if none is given """
         try:
-            message = await self.incoming.get()
+            if message is None:
+                message = await self.incoming.get()
 
             # do something 'consuming' :)
             result = {'state': 200, 'data': {}, 'receiver': ''}
@@ -113,11 +120,20 @@ class ChatClass:
                 q_database = 'mysql'  # default value
                 if json_str.get('database'):
                     q_database = json_str.get('database')
+                self.agent_instance_util.db_type = q_database
 
                 q_chat_type = 'chat'  # default value
                 if json_str.get('chat_type'):
                     q_chat_type = json_str.get('chat_type')
 
+                q_databases_id = json_str['data'].get('databases_id')
+                if q_data_type == CONFIG.type_comment:
+                    # The table descriptions of the data source were edited, cached answers about its schema are stale
+                    response_cache.invalidate_data_source(q_databases_id)
+                if q_data_type in (CONFIG.type_comment, CONFIG.type_comment_first, CONFIG.type_comment_second):
+                    # The data source is (re)selected or edited, fetch its connection info again
+                    self.agent_instance_util.db_info_cache.invalidate(q_databases_id)
+
                 if q_chat_type == 'test':
                     await AIDB(self).test_api_key()
 
@@ -156,6 +172,9 @@ class ChatClass:
                     elif q_database == 'csv':
                         await self.autopilotCSV.deal_question(json_str, message)
 
+                if q_data_type in (CONFIG.type_comment_first, CONFIG.type_comment_second):
+                    response_cache.track(q_databases_id, self.agent_instance_util.schema_fingerprint)
+
             else:
                 result['state'] = 500
                 if self.language_mode == CONFIG.language_chinese:
@@ -1,6 +1,7 @@
 import asyncio
 import websockets
 import time
+from ai.agents.oai import transport
 from ai.backend.chat_task import ChatClass
 
 
@@ -24,25 +25,50 @@ class WSServer:
 
         # start_server = websockets.serve(self.handler, '0.0.0.0', 5678)
         asyncio.get_event_loop().run_until_complete(start_server)
-        asyncio.get_event_loop().run_forever()
+        try:
+            asyncio.get_event_loop().run_forever()
+        finally:
+            loop.run_until_complete(transport.close_sessions())
+            loop.close()
 
     async def handler(self, websocket, path):
         master = ChatClass(websocket, path)
 
+        # Receive, process and send in separate tasks, so the replies the agents wait for
+        # while a question is processed are received, and their messages sent, right away.
+        disconnected = asyncio.Event()
+        consumer_task = asyncio.ensure_future(self.consume_forever(master, disconnected))
+        producer_task = asyncio.ensure_future(self.produce_forever(master))
+        try:
+            while True:
+                await master.get_message()
+        except websockets.ConnectionClosed:
+            print(str(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())) + ' ---- ' + "user disconnected:{}".format(
+                master.user_name))
+        finally:
+            # The consumer finishes the message in progress (a report being generated is still saved)
+            # and then stops; there is nobody left to send to.
+            disconnected.set()
+            producer_task.cancel()
+            await consumer_task
+
+    @staticmethod
+    async def consume_forever(master, disconnected):
+        """Process the received messages one by one, until the browser disconnects."""
+        stop = asyncio.ensure_future(disconnected.wait())
+        try:
+            while not disconnected.is_set():
+                arrived = asyncio.ensure_future(master.incoming.get())
+                await asyncio.wait([arrived, stop], return_when=asyncio.FIRST_COMPLETED)
+                if not arrived.done():
+                    arrived.cancel()
+                    return
+                await master.consume(arrived.result())
+        finally:
+            stop.cancel()
+
+    @staticmethod
+    async def produce_forever(master):
         while True:
-            listener_task = asyncio.ensure_future(master.get_message())
-            producer_task = asyncio.ensure_future(master.produce())
-            done, pending = await asyncio.wait(
-                [listener_task, producer_task],
-                return_when=asyncio.FIRST_COMPLETED)
-
-            if listener_task in done:
-                await master.consume()
-            else:
-                listener_task.cancel()
-
-            if producer_task in done:
-                msg_to_send = producer_task.result()
-                await master.send_message(msg_to_send)
-            else:
-                producer_task.cancel()
+            msg_to_send = await master.produce()
+            await master.send_message(msg_to_send)
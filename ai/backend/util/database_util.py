@@ -4,8 +4,10 @@
 @ info:
 @ date: 2023/10/15 16:05
 """
+import asyncio
 import json
 import os
+import threading
 import time
 import requests
 from dotenv import load_dotenv
@@ -87,6 +89,72 @@ def decode_data_info(code):
     pass
 
 
+class DbInfoCache:
+    """Decoded data source info of one chat by database id, kept for `ttl` seconds.
+
+    The code turns of the chat reuse the credentials instead of asking the web
+    server again. The chat drops an entry when it selects or edits the data source,
+    so the next turn picks up the current credentials.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, db_id):
+        with self._lock:
+            entry = self._entries.get(str(db_id))
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._entries[str(db_id)]
+                return None
+            return dict(entry[1])
+
+    def set(self, db_id, db_info):
+        if self.ttl <= 0 or not isinstance(db_info, dict):
+            return
+        with self._lock:
+            self._entries[str(db_id)] = (time.time() + self.ttl, dict(db_info))
+
+    def invalidate(self, db_id=None):
+        """Forget a data source (after it was edited or deleted), or all of them."""
+        with self._lock:
+            if db_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(db_id), None)
+
+
+# db_id -> future of the run_decode in flight for it, so concurrent code turns share one request
+_decoding = {}
+
+
+async def get_decoded_db_info(db_id, db_info_cache=None):
+    """Async version of `Main(db_id).run_decode()`, cached in the chat's `db_info_cache` when given;
+    the web server is asked in the default executor."""
+    if db_info_cache is not None:
+        db_info = db_info_cache.get(db_id)
+        if db_info is not None:
+            return True, db_info
+
+    loop = asyncio.get_running_loop()
+    future = _decoding.get(str(db_id))
+    if future is None or future.get_loop() is not loop:
+        future = loop.run_in_executor(None, Main(db_id).run_decode)
+        _decoding[str(db_id)] = future
+        future.add_done_callback(lambda _: _decoding.pop(str(db_id), None))
+
+    if_suss, db_info = await asyncio.shield(future)
+    if db_info_cache is not None:
+        if if_suss:
+            db_info_cache.set(db_id, db_info)
+        else:
+            db_info_cache.invalidate(db_id)
+    return if_suss, dict(db_info) if if_suss and isinstance(db_info, dict) else db_info
+
+
 class Main:
     def __init__(self, db_id: str):
         self.db_id = db_id
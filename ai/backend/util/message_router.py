@@ -0,0 +1,100 @@
+"""
+Routes the frames of a browser connection to the agents waiting for them.
+
+`WSServer.handler` reads every frame of a connection in one place and offers
+it to the connection's MessageRouter first. A reply to a request an agent
+sent to the browser (`run_mysql_code`, `run_chart_code`, ...) resolves the
+future that agent awaits, looked up by (sender, data_type, id); any other
+frame goes on to `ChatClass.consume`. Request ids come from `new_id`, so the
+agents of one connection can wait for several replies at once.
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import OrderedDict
+
+from ai.backend.util.write_log import logger
+
+# Ids of answered or timed out requests remembered, so late replies are dropped instead of handled as questions
+MAX_FINISHED_IDS = 1024
+# Ids handed out but not waited for yet (requests that failed before being sent are forgotten eventually,
+# together with the replies that came for them)
+MAX_PENDING_IDS = 1024
+
+
+class MessageRouter(object):
+    def __init__(self):
+        self._ids = itertools.count(int(time.time() * 1000))
+        # key -> future of the agent waiting for it
+        self._waiters = {}
+        # ids handed out whose reply is not waited for yet, and replies that came before the wait;
+        # only replies to pending ids are kept, so both are bounded by MAX_PENDING_IDS
+        self._pending = OrderedDict()
+        self._early = {}
+        self._finished = OrderedDict()
+
+    @staticmethod
+    def key_for(sender, data_type, message_id):
+        return str(sender), str(data_type), str(message_id)
+
+    def new_id(self):
+        """A connection-unique id for a request whose reply will be waited for."""
+        message_id = str(next(self._ids))
+        self._pending[message_id] = True
+        while len(self._pending) > MAX_PENDING_IDS:
+            self._forget(next(iter(self._pending)))
+        return message_id
+
+    def _forget(self, message_id):
+        self._pending.pop(message_id, None)
+        for key in [key for key in self._early if key[2] == message_id]:
+            del self._early[key]
+
+    def _finish(self, message_id):
+        self._forget(message_id)
+        self._finished[message_id] = True
+        while len(self._finished) > MAX_FINISHED_IDS:
+            self._finished.popitem(last=False)
+
+    def dispatch(self, message):
+        """Hand a received frame to the agent waiting for it; returns False for frames that are not replies."""
+        try:
+            frame = json.loads(message)
+            key = self.key_for(frame.get('sender'), frame['data'].get('data_type'), frame.get('id'))
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return False
+
+        future = self._waiters.get(key)
+        if future is not None:
+            if not future.done():
+                future.set_result(message)
+            return True
+
+        message_id = key[2]
+        if message_id in self._pending:
+            self._early[key] = message
+            return True
+        if message_id in self._finished:
+            logger.info("dropped a late reply: {}".format(message))
+            return True
+        return False
+
+    async def wait_for(self, sender, data_type, message_id, timeout):
+        """Wait for the reply to request `message_id`; returns the raw frame, or None after `timeout` seconds."""
+        key = self.key_for(sender, data_type, message_id)
+        message = self._early.pop(key, None)
+        if message is not None:
+            self._finish(key[2])
+            return message
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[key] = future
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            logger.info("no reply to {} within {} seconds".format(key, timeout))
+            return None
+        finally:
+            del self._waiters[key]
+            self._finish(key[2])
@@ -0,0 +1,178 @@
+"""
+Per chat cache of the results of the SQL run by `BIProxyAgent.run_mysql_code`.
+
+Entries are keyed by (data source id, `gen_query_hash` of the SQL), so the
+same query written with different whitespace, case or comments is served
+from the cache instead of making another round trip through the browser.
+
+The browser keeps the last query it ran and builds the following chart on
+it, so a result the browser produced is only reused while that query is
+still the browser's last one. Results of the direct execution path, which
+never touches the browser, are reused at any time.
+"""
+import asyncio
+import datetime
+import decimal
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from bi.utils import gen_query_hash
+except Exception:
+    # The AI server usually runs without the BI app settings; same normalization.
+    COMMENTS_REGEX = re.compile(r"/\*.*?\*/")
+
+    def gen_query_hash(sql):
+        sql = COMMENTS_REGEX.sub("", sql)
+        sql = "".join(sql.split()).lower()
+        return hashlib.md5(sql.encode("utf-8")).hexdigest()
+
+
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_TTL = 600
+
+SOURCE_BROWSER = "browser"
+SOURCE_DIRECT = "direct"
+
+
+class SqlResultCache(object):
+    """LRU of the query results of one chat, bounded by entry count and age."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (expires_at, result, source)
+        self._entries = OrderedDict()
+        # Key of the last query the browser ran
+        self.browser_key = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key_for(db_id, sql):
+        return str(db_id), gen_query_hash(sql)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None or (entry[2] == SOURCE_BROWSER and key != self.browser_key):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, result, source=SOURCE_BROWSER):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + self.ttl, result, source)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def browser_ran(self, key):
+        """Record that the browser ran (and now keeps) the query of `key`."""
+        with self._lock:
+            self.browser_key = key
+
+    def invalidate(self, db_id=None):
+        with self._lock:
+            if db_id is None:
+                self._entries.clear()
+                self.browser_key = None
+            else:
+                for key in [key for key in self._entries if key[0] == str(db_id)]:
+                    del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def supports_direct_execution(db_type, db_info):
+    """Whether SQL can run directly on a data source of `db_type` with the decoded options `db_info`.
+
+    Only MySQL: StarRocks has the same options but no read-only transactions.
+    """
+    return db_type == "mysql" and isinstance(db_info, dict) and "passwd" in db_info and "db" in db_info
+
+
+_SQL_COMMENTS = re.compile(r"/\*.*?\*/|(?:--|#)[^\n]*", re.S)
+_READ_ONLY_STATEMENT = re.compile(r"^(select|with)\b", re.I)
+_SELECT_INTO_FILE = re.compile(r"\binto\s+(outfile|dumpfile)\b", re.I)
+
+
+def is_read_only_sql(sql):
+    """Whether `sql` is a single SELECT statement, the only SQL the direct path runs.
+
+    Conservative: anything else, like several statements or a `;` inside a
+    string, is left to the browser path.
+    """
+    sql = _SQL_COMMENTS.sub(" ", str(sql)).strip().rstrip(";").strip()
+    return bool(_READ_ONLY_STATEMENT.match(sql)) and ";" not in sql and not _SELECT_INTO_FILE.search(sql)
+
+
+def _json_value(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return value
+
+
+def _execute(db_info, sql, timeout):
+    import pymysql
+
+    connection = pymysql.connect(
+        host=db_info.get("host") or "127.0.0.1",
+        port=int(db_info.get("port") or 3306),
+        user=db_info.get("user"),
+        password=db_info.get("passwd") or "",
+        database=db_info.get("db"),
+        charset=db_info.get("charset") or "utf8mb4",
+        connect_timeout=timeout,
+        read_timeout=timeout,
+    )
+    try:
+        with connection.cursor() as cursor:
+            # The statement was checked by is_read_only_sql, the server enforces it too.
+            cursor.execute("START TRANSACTION READ ONLY")
+            cursor.execute(sql)
+            if cursor.description is None:
+                return {"columns": [], "rows": []}
+            names = [column[0] for column in cursor.description]
+            rows = [dict(zip(names, [_json_value(value) for value in row])) for row in cursor.fetchall()]
+    finally:
+        try:
+            connection.rollback()
+        finally:
+            connection.close()
+
+    # Same shape as the `query_result.data` the browser replies with.
+    columns = [{"name": name, "friendly_name": name} for name in names]
+    return {"columns": columns, "rows": rows}
+
+
+async def execute_direct(db_info, sql, timeout):
+    """Run the SELECT `sql` on a MySQL data source in the default executor, in a read-only transaction."""
+    if not is_read_only_sql(sql):
+        raise ValueError("Only a single SELECT statement can be run directly")
+    return await asyncio.get_running_loop().run_in_executor(None, _execute, db_info, sql, timeout)
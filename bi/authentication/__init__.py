@@ -11,7 +11,6 @@ from bi import models, settings
 from bi.authentication import jwt_auth
 from bi.authentication.org_resolving import current_org
 from bi.settings.organization import settings as org_settings
-from bi.tasks import record_event
 from sqlalchemy.orm.exc import NoResultFound
 from werkzeug.exceptions import Unauthorized
 
@@ -211,7 +210,7 @@ def log_user_logged_in(app, user):
         "ip": request.remote_addr,
     }
 
-    record_event.delay(event)
+    models.events_buffer.push(event)
 
 
 @login_manager.unauthorized_handler
@@ -5,7 +5,7 @@ from flask.cli import AppGroup
 from flask_migrate import stamp
 import sqlalchemy
 from sqlalchemy.exc import DatabaseError
-from sqlalchemy.sql import select
+from sqlalchemy.sql import bindparam, select
 from sqlalchemy_utils.types.encrypted.encrypted_type import FernetEngine
 
 from bi import settings
@@ -36,11 +36,81 @@ def is_db_empty():
 
 
 def load_extensions(db):
+    from bi.models.base import database_extensions
+
     with db.engine.connect() as connection:
-        for extension in settings.dynamic_settings.database_extensions:
+        for extension in database_extensions + settings.dynamic_settings.database_extensions:
             connection.execute(f'CREATE EXTENSION IF NOT EXISTS "{extension}";')
 
 
+def _load_extensions_or_warn(db):
+    """`load_extensions` for an existing database, where we may not be allowed to create them."""
+    try:
+        load_extensions(db)
+        return True
+    except DatabaseError as e:
+        print(
+            "Could not create the database extensions, which needs a superuser: {}\n"
+            "Search keeps working, but substring searches of 3 characters or more scan the tables. "
+            'Once a superuser ran CREATE EXTENSION IF NOT EXISTS "pg_trgm"; in the database, '
+            "run `manage.py database create_search_indexes`.".format(e.orig)
+        )
+        return False
+
+
+def _create_search_indexes(db, trigrams=True):
+    from bi.models import Query, Dashboard
+
+    inspector = sqlalchemy.inspect(db.get_engine())
+    suffixes = ("_trgm", "_search_bigrams") if trigrams else ("_search_bigrams",)
+    for model in (Query, Dashboard):
+        existing = {index["name"] for index in inspector.get_indexes(model.__tablename__)}
+        for index in model.__table__.indexes:
+            if index.name.endswith(suffixes) and index.name not in existing:
+                print("Creating index {}...".format(index.name))
+                index.create(db.engine)
+
+
+def _create_new_columns(db):
+    inspector = sqlalchemy.inspect(db.get_engine())
+    new_columns = [
+        ("query_results", "data_columnar", "bytea"),
+        ("queries", "search_bigrams", "text[]"),
+        ("dashboards", "search_bigrams", "text[]"),
+    ]
+    for table, column, column_type in new_columns:
+        existing = {c["name"] for c in inspector.get_columns(table)}
+        if column not in existing:
+            print("Adding column {}.{}...".format(table, column))
+            db.engine.execute("ALTER TABLE {} ADD COLUMN {} {}".format(table, column, column_type))
+
+
+def _fill_search_bigrams(db, batch_size=1000):
+    """Compute the search_bigrams of the queries and dashboards that don't have them yet."""
+    from bi.models import Query, Dashboard
+    from bi.models.base import search_bigrams
+
+    for model, columns in ((Query, ("name", "description")), (Dashboard, ("name",))):
+        while True:
+            rows = (
+                db.session.query(model.id, *[getattr(model, column) for column in columns])
+                .filter(model.search_bigrams.is_(None))
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            table = model.__table__
+            db.session.execute(
+                table.update()
+                .where(table.c.id == bindparam("row_id"))
+                .values(search_bigrams=bindparam("bigrams")),
+                [{"row_id": row[0], "bigrams": search_bigrams(*row[1:])} for row in rows],
+            )
+            db.session.commit()
+            print("Filled the search bigrams of {} {}.".format(len(rows), model.__tablename__))
+
+
 @manager.command()
 def create_tables():
     """Create the database tables."""
@@ -56,6 +126,22 @@ def create_tables():
         # To create triggers for searchable models, we need to call configure_mappers().
         sqlalchemy.orm.configure_mappers()
         db.create_all()
+    else:
+        # Columns and indexes added to existing tables since they were created
+        _create_new_columns(db)
+        _fill_search_bigrams(db)
+        _create_search_indexes(db, trigrams=_load_extensions_or_warn(db))
+
+
+@manager.command()
+def create_search_indexes():
+    """Create the trigram and bigram search indexes missing from an existing database."""
+    from bi.models import db
+
+    _wait_for_db_connection(db)
+    _create_new_columns(db)
+    _fill_search_bigrams(db)
+    _create_search_indexes(db, trigrams=_load_extensions_or_warn(db))
 
 
 @manager.command()
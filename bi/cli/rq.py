@@ -4,7 +4,7 @@ import sys
 import datetime
 from itertools import chain
 
-from click import argument
+from click import argument, option
 from flask.cli import AppGroup
 from rq import Connection
 from rq.worker import WorkerStatus
@@ -14,6 +14,7 @@ from supervisor_checks.check_modules import base
 
 from bi import rq_redis_connection
 from bi.tasks import (
+    SimpleWorker,
     Worker,
     rq_scheduler,
     schedule_periodic_jobs,
@@ -33,7 +34,14 @@ def scheduler():
 
 @manager.command()
 @argument("queues", nargs=-1)
-def worker(queues):
+@option(
+    "--fork/--no-fork",
+    default=True,
+    help="Run each job in a forked work horse (default). With --no-fork jobs run in "
+    "the worker process, which keeps pooled data source connections and MongoDB "
+    "clients between jobs but can't hard-kill or cancel a running job.",
+)
+def worker(queues, fork):
     # Configure any SQLAlchemy mappers loaded until now so that the mapping configuration
     # will already be available to the forked work horses and they won't need
     # to spend valuable time re-doing that on every fork.
@@ -45,7 +53,8 @@ def worker(queues):
         queues = chain(*[queue.split(",") for queue in queues])
 
     with Connection(rq_redis_connection):
-        w = Worker(queues, log_job_description=False, job_monitoring_interval=5)
+        worker_class = Worker if fork else SimpleWorker
+        w = worker_class(queues, log_job_description=False, job_monitoring_interval=5)
         w.work()
 
 
@@ -12,6 +12,7 @@ from bi.handlers.alerts import (
 from bi.handlers.base import org_scoped_rule
 from bi.handlers.dashboards import (
     MyDashboardsResource,
+    DashboardBundleResource,
     DashboardFavoriteListResource,
     DashboardListResource,
     DashboardResource,
@@ -150,6 +151,11 @@ api.add_org_resource(DashboardListResource, "/api/dashboards", endpoint="dashboa
 api.add_org_resource(
     DashboardResource, "/api/dashboards/<dashboard_id>", endpoint="dashboard"
 )
+api.add_org_resource(
+    DashboardBundleResource,
+    "/api/dashboards/<dashboard_id>/bundle",
+    endpoint="dashboard_bundle",
+)
 api.add_org_resource(
     PublicDashboardResource,
     "/api/dashboards/public/<token>",
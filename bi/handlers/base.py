@@ -9,8 +9,7 @@ from flask_login import current_user, login_required
 from flask_restful import Resource, abort
 from bi import settings
 from bi.authentication import current_org
-from bi.models import db
-from bi.tasks import record_event as record_event_task
+from bi.models import db, events_buffer
 from bi.utils import json_dumps
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy import cast
@@ -63,7 +62,7 @@ def record_event(org, user, options):
     if "timestamp" not in options:
         options["timestamp"] = int(time.time())
 
-    record_event_task.delay(options)
+    events_buffer.push(options)
 
 
 def require_fields(req, fields):
@@ -1,4 +1,4 @@
-from flask import request, url_for
+from flask import Response, request, stream_with_context, url_for
 from funcy import project, partial
 import os
 
@@ -20,10 +20,13 @@ from bi.permissions import (
 from bi.security import csp_allows_embeding
 from bi.serializers import (
     DashboardSerializer,
+    viewable_widget_ids,
     public_dashboard,
+    serialize_query_result,
 )
 from sqlalchemy.orm.exc import StaleDataError
 from bi.settings import WEB_LANGUAGE
+from bi.utils import json_dumps
 
 
 # Ordering map for relationships
@@ -39,6 +42,26 @@ order_results = partial(
 )
 
 
+def serialize_dashboard_for(dashboard, user, org, widgets):
+    """The dashboard response of `DashboardResource`, for the `widgets_with_queries` of the dashboard."""
+    response = DashboardSerializer(
+        dashboard, with_widgets=True, user=user, dashboard_widgets=widgets
+    ).serialize()
+
+    api_key = models.ApiKey.get_by_object(dashboard)
+    if api_key:
+        response["public_url"] = url_for(
+            "bi.public_dashboard",
+            token=api_key.api_key,
+            org_slug=org.slug,
+            _external=True,
+        )
+        response["api_key"] = api_key.api_key
+
+    response["can_edit"] = can_modify(dashboard, user)
+    return response
+
+
 class DashboardListResource(BaseResource):
     @require_permission("list_dashboards")
     def get(self):
@@ -195,21 +218,12 @@ class DashboardResource(BaseResource):
             fn = models.Dashboard.get_by_id_and_org
 
         dashboard = get_object_or_404(fn, dashboard_id, self.current_org)
-        response = DashboardSerializer(
-            dashboard, with_widgets=True, user=self.current_user
-        ).serialize()
-
-        api_key = models.ApiKey.get_by_object(dashboard)
-        if api_key:
-            response["public_url"] = url_for(
-                "bi.public_dashboard",
-                token=api_key.api_key,
-                org_slug=self.current_org.slug,
-                _external=True,
-            )
-            response["api_key"] = api_key.api_key
-
-        response["can_edit"] = can_modify(dashboard, self.current_user)
+        response = serialize_dashboard_for(
+            dashboard,
+            self.current_user,
+            self.current_org,
+            dashboard.widgets_with_queries(),
+        )
 
         self.record_event(
             {"action": "view", "object_id": dashboard.id, "object_type": "dashboard"}
@@ -299,6 +313,63 @@ class DashboardResource(BaseResource):
         return d
 
 
+class DashboardBundleResource(BaseResource):
+    @require_permission("list_dashboards")
+    def get(self, dashboard_id):
+        """
+        Retrieves a dashboard together with the latest results of its widgets' queries.
+
+        :param dashboard_id: Id of dashboard to retrieve.
+
+        :>json object dashboard: A :ref:`dashboard <dashboard-response-label>`
+        :>json object query_results: Latest query results by id, for the widgets
+            the user may view whose queries have no parameters
+        """
+        dashboard = get_object_or_404(
+            models.Dashboard.get_by_id_and_org, dashboard_id, self.current_org
+        )
+        widgets = dashboard.widgets_with_queries()
+        response = serialize_dashboard_for(
+            dashboard, self.current_user, self.current_org, widgets
+        )
+
+        self.record_event(
+            {"action": "view", "object_id": dashboard.id, "object_type": "dashboard"}
+        )
+
+        # Results of parameterized queries depend on the parameter values the
+        # client picks, so it fetches them itself.
+        viewable_ids = viewable_widget_ids(widgets, self.current_user)
+        result_ids = set()
+        for w in widgets:
+            if w.id not in viewable_ids:
+                continue
+            query = w.visualization.query_rel
+            if query.latest_query_data_id is not None and not query.parameters:
+                result_ids.add(query.latest_query_data_id)
+
+        is_api_user = self.current_user.is_api_user()
+
+        def generate():
+            yield '{"dashboard": '
+            yield json_dumps(response)
+            yield ', "query_results": {'
+            query_results = models.QueryResult.iter_many_cached(result_ids)
+            for i, (result_id, query_result) in enumerate(query_results):
+                yield "{}{}: {}".format(
+                    ", " if i else "",
+                    json_dumps(str(result_id)),
+                    json_dumps(serialize_query_result(query_result, is_api_user)),
+                )
+            yield "}}"
+
+        return Response(
+            stream_with_context(generate()),
+            200,
+            {"Content-Type": "application/json"},
+        )
+
+
 class PublicDashboardResource(BaseResource):
     decorators = BaseResource.decorators + [csp_allows_embeding]
 
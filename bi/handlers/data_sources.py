@@ -3,12 +3,12 @@ import time
 
 from flask import make_response, request
 from flask_restful import abort
-from funcy import project
 from sqlalchemy.exc import IntegrityError
 
 from bi import models
 from bi.handlers.base import BaseResource, get_object_or_404, require_fields
 from bi.permissions import (
+    data_source_access,
     require_access,
     require_admin,
     require_permission,
@@ -47,9 +47,7 @@ class DataSourceResource(BaseResource):
             ds = data_source.to_dict(all=self.current_user.has_permission("admin"))
 
         # add view_only info, required for frontend permissions
-        ds["view_only"] = all(
-            project(data_source.groups, self.current_user.group_ids).values()
-        )
+        ds["view_only"] = data_source_access(self.current_user).get(data_source.id, True)
         self.record_event(
             {"action": "view", "object_id": data_source_id, "object_type": "datasource"}
         )
@@ -122,6 +120,7 @@ class DataSourceListResource(BaseResource):
                 self.current_org, group_ids=self.current_user.group_ids
             )
 
+        access = data_source_access(self.current_user)
         response = {}
         for ds in data_sources:
             if ds.id in response:
@@ -129,9 +128,7 @@ class DataSourceListResource(BaseResource):
 
             try:
                 d = ds.to_dict()
-                d["view_only"] = all(
-                    project(ds.groups, self.current_user.group_ids).values()
-                )
+                d["view_only"] = access.get(ds.id, True)
                 response[ds.id] = d
             except AttributeError:
                 logging.exception(
@@ -196,6 +193,11 @@ class DataSourceSchemaResource(BaseResource):
         )
         require_access(data_source, self.current_user, view_only)
         refresh = request.args.get("refresh") is not None
+        tables = request.args.get("tables")
+
+        if tables:
+            tables = [name.strip() for name in tables.split(",") if name.strip()]
+            return {"schema": data_source.get_cached_schema(tables)}
 
         if not refresh:
             cached_schema = data_source.get_cached_schema()
@@ -2,7 +2,7 @@ import logging
 import time
 
 import unicodedata
-from flask import make_response, request
+from flask import Response, make_response, request, stream_with_context
 from flask_login import current_user
 from flask_restful import abort
 from werkzeug.urls import url_quote
@@ -32,8 +32,8 @@ from bi.models.parameterized_query import (
 )
 from bi.serializers import (
     serialize_query_result,
-    serialize_query_result_to_dsv,
-    serialize_query_result_to_xlsx,
+    stream_query_result_to_dsv,
+    stream_query_result_to_xlsx,
     serialize_job,
 )
 
@@ -90,7 +90,7 @@ def run_query(
     if max_age == 0:
         query_result = None
     else:
-        query_result = models.QueryResult.get_latest(data_source, query_text, max_age)
+        query_result = models.QueryResult.get_latest_cached(data_source, query_text, max_age)
 
     record_event(
         current_user.org,
@@ -432,15 +432,19 @@ class QueryResultResource(BaseResource):
     @staticmethod
     def make_csv_response(query_result):
         headers = {"Content-Type": "text/csv; charset=UTF-8"}
-        return make_response(
-            serialize_query_result_to_dsv(query_result, ","), 200, headers
+        return Response(
+            stream_with_context(stream_query_result_to_dsv(query_result, ",")),
+            200,
+            headers,
         )
 
     @staticmethod
     def make_tsv_response(query_result):
         headers = {"Content-Type": "text/tab-separated-values; charset=UTF-8"}
-        return make_response(
-            serialize_query_result_to_dsv(query_result, "\t"), 200, headers
+        return Response(
+            stream_with_context(stream_query_result_to_dsv(query_result, "\t")),
+            200,
+            headers,
         )
 
     @staticmethod
@@ -448,7 +452,9 @@ class QueryResultResource(BaseResource):
         headers = {
             "Content-Type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         }
-        return make_response(serialize_query_result_to_xlsx(query_result), 200, headers)
+        return Response(
+            stream_with_context(stream_query_result_to_xlsx(query_result)), 200, headers
+        )
 
 
 class JobResource(BaseResource):
@@ -3,13 +3,16 @@ import calendar
 import logging
 import time
 import numbers
+from collections import defaultdict
 import pytz
+from redis.exceptions import LockError, ResponseError
 
 from sqlalchemy import distinct, or_, and_, UniqueConstraint, cast
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.event import listens_for
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import backref, contains_eager, joinedload, subqueryload, load_only
+from sqlalchemy.orm.attributes import get_history
 from sqlalchemy.orm.exc import NoResultFound  # noqa: F401
 from sqlalchemy import func
 from sqlalchemy_utils import generic_relationship
@@ -30,7 +33,8 @@ from bi.query_runner import (
     TYPE_BOOLEAN,
     TYPE_DATE,
     TYPE_DATETIME,
-    BaseQueryRunner)
+    BaseQueryRunner,
+    NotSupported)
 from bi.utils import (
     generate_token,
     json_dumps,
@@ -42,8 +46,24 @@ from bi.utils import (
 from bi.utils.configuration import ConfigurationContainer
 from bi.models.parameterized_query import ParameterizedQuery
 
-from .base import db, gfk_type, Column, GFKBase, SearchBaseQuery, key_type, primary_key, ColumnNull
+from .base import (
+    db,
+    gfk_type,
+    Column,
+    GFKBase,
+    SearchBaseQuery,
+    key_type,
+    primary_key,
+    ColumnNull,
+    bigram_index,
+    search_bigrams,
+    substring_match,
+    substring_rank,
+    trigram_index,
+)
 from .changes import ChangeTrackingMixin, Change  # noqa
+from .columnar import ColumnarPersistence, ColumnarReader, is_columnar
+from . import result_cache
 from .mixins import BelongsToOrgMixin, TimestampMixin
 from .organizations import Organization
 from .types import (
@@ -65,8 +85,14 @@ class ScheduledQueriesExecutions(object):
     def __init__(self):
         self.executions = {}
 
-    def refresh(self):
-        self.executions = redis_connection.hgetall(self.KEY_NAME)
+    def refresh(self, query_ids=None):
+        if query_ids is None:
+            self.executions = redis_connection.hgetall(self.KEY_NAME)
+        elif query_ids:
+            fields = [str(query_id) for query_id in query_ids]
+            self.executions = dict(zip(fields, redis_connection.hmget(self.KEY_NAME, fields)))
+        else:
+            self.executions = {}
 
     def update(self, query_id):
         redis_connection.hmset(self.KEY_NAME, {query_id: time.time()})
@@ -82,6 +108,55 @@ class ScheduledQueriesExecutions(object):
 scheduled_queries_executions = ScheduledQueriesExecutions()
 
 
+class ScheduledQueriesIndex(object):
+    """Sorted set of scheduled query ids, scored by when each one is due next.
+
+    Queries are "touched" (scored 0, i.e. due for re-evaluation) when their
+    schedule changes or they start executing; `Query.outdated_queries` then
+    re-scores every query it evaluates. The whole set is rebuilt from the
+    database every SCHEDULE_INDEX_RECONCILE_INTERVAL seconds.
+    """
+
+    KEY_NAME = "sq:next_due"
+    RECONCILED_KEY_NAME = "sq:next_due:reconciled"
+
+    def touch(self, query_id):
+        redis_connection.zadd(self.KEY_NAME, {query_id: 0})
+
+    def reschedule(self, scores):
+        if scores:
+            redis_connection.zadd(self.KEY_NAME, scores)
+
+    def remove(self, query_ids):
+        if query_ids:
+            redis_connection.zrem(self.KEY_NAME, *query_ids)
+
+    def reconcile(self):
+        query_ids = [
+            query_id
+            for query_id, in db.session.query(Query.id).filter(Query.schedule.isnot(None))
+        ]
+
+        pipe = redis_connection.pipeline()
+        pipe.delete(self.KEY_NAME)
+        if query_ids:
+            pipe.zadd(self.KEY_NAME, {query_id: 0 for query_id in query_ids})
+        pipe.set(self.RECONCILED_KEY_NAME, time.time(), ex=settings.SCHEDULE_INDEX_RECONCILE_INTERVAL)
+        pipe.execute()
+
+    def due(self, now):
+        if not redis_connection.exists(self.RECONCILED_KEY_NAME):
+            self.reconcile()
+
+        return [
+            int(query_id)
+            for query_id in redis_connection.zrangebyscore(self.KEY_NAME, "-inf", now.timestamp())
+        ]
+
+
+scheduled_queries_index = ScheduledQueriesIndex()
+
+
 @generic_repr("id", "name", "type", "org_id", "created_at")
 class DataSource(BelongsToOrgMixin, db.Model):
     id = primary_key("DataSource")
@@ -189,14 +264,56 @@ class DataSource(BelongsToOrgMixin, db.Model):
         res = db.session.delete(self)
         db.session.commit()
 
-        redis_connection.delete(self._schema_key)
+        redis_connection.delete(
+            self._schema_key,
+            self._schema_tables_key,
+            self._schema_fingerprints_key,
+            self._schema_refreshed_key,
+        )
 
         return res
 
-    def get_cached_schema(self):
+    def get_cached_schema(self, tables=None):
+        """Return the cached schema, or only the entries of `tables` if given."""
+        if tables is not None:
+            cached = redis_connection.hmget(self._schema_tables_key, list(tables)) if tables else []
+            return [json_loads(table) for table in cached if table is not None]
+
+        cached = redis_connection.hgetall(self._schema_tables_key)
+        if cached:
+            return [json_loads(cached[name]) for name in sorted(cached)]
+
+        if redis_connection.exists(self._schema_refreshed_key):
+            return []
+
+        # Schemas cached before they were stored per table.
         cache = redis_connection.get(self._schema_key)
         return json_loads(cache) if cache else None
 
+    def _store_schema(self, schema, fingerprints=None):
+        pipe = redis_connection.pipeline()
+        pipe.delete(self._schema_key, self._schema_tables_key, self._schema_fingerprints_key)
+        if schema:
+            pipe.hset(
+                self._schema_tables_key,
+                mapping={table["name"]: json_dumps(table) for table in schema},
+            )
+        if fingerprints:
+            pipe.hset(self._schema_fingerprints_key, mapping=fingerprints)
+        pipe.set(self._schema_refreshed_key, time.time())
+        pipe.execute()
+
+    def _fetch_table_fingerprints(self, query_runner):
+        try:
+            return query_runner.get_table_fingerprints()
+        except NotSupported:
+            return None
+        except Exception:
+            logging.warning(
+                "Failed fingerprinting tables of data_source %s", self.id, exc_info=True
+            )
+            return None
+
     def get_schema(self, refresh=False):
         out_schema = None
         if not refresh:
@@ -204,6 +321,8 @@ class DataSource(BelongsToOrgMixin, db.Model):
 
         if out_schema is None:
             query_runner = self.query_runner
+            # Fingerprint first, so a change made while the schema is read gets picked up next time.
+            fingerprints = self._fetch_table_fingerprints(query_runner)
             schema = query_runner.get_schema(get_stats=refresh)
 
             try:
@@ -214,33 +333,113 @@ class DataSource(BelongsToOrgMixin, db.Model):
                 )
                 out_schema = schema
             finally:
-                redis_connection.set(self._schema_key, json_dumps(out_schema))
+                self._store_schema(out_schema, fingerprints)
 
         return out_schema
 
+    def refresh_schema(self):
+        """Re-read only the tables whose fingerprint changed since the last refresh.
+
+        Falls back to a full refresh when the query runner can't fingerprint or
+        read individual tables, or when nothing is cached yet.
+        """
+        # Skip the fingerprint query when the schema was refreshed (or found unchanged)
+        # within the refresh interval, give or take the jitter of the periodic job.
+        refreshed_at = redis_connection.get(self._schema_refreshed_key)
+        if refreshed_at and time.time() - float(refreshed_at) < settings.SCHEMAS_REFRESH_SCHEDULE * 60 - 60:
+            return None
+
+        query_runner = self.query_runner
+        fingerprints = self._fetch_table_fingerprints(query_runner)
+        known = redis_connection.hgetall(self._schema_fingerprints_key)
+
+        if fingerprints is None or not known or not redis_connection.exists(self._schema_refreshed_key):
+            return self.get_schema(refresh=True)
+
+        changed = [name for name, fingerprint in fingerprints.items() if known.get(name) != fingerprint]
+        removed = [name for name in known if name not in fingerprints]
+
+        if not changed and not removed:
+            redis_connection.set(self._schema_refreshed_key, time.time())
+            return None
+
+        try:
+            tables = query_runner.get_tables_schema(changed) if changed else []
+        except NotSupported:
+            return self.get_schema(refresh=True)
+
+        tables = [self._sort_table(table) for table in tables]
+        missing = set(changed) - set(table["name"] for table in tables)
+
+        pipe = redis_connection.pipeline()
+        if removed or missing:
+            pipe.hdel(self._schema_tables_key, *(removed + list(missing)))
+            pipe.hdel(self._schema_fingerprints_key, *removed)
+        if tables:
+            pipe.hset(
+                self._schema_tables_key,
+                mapping={table["name"]: json_dumps(table) for table in tables},
+            )
+        if changed:
+            pipe.hset(
+                self._schema_fingerprints_key,
+                mapping={name: fingerprints[name] for name in changed},
+            )
+        pipe.set(self._schema_refreshed_key, time.time())
+        pipe.execute()
+
+        logging.info(
+            "Refreshed schema of data_source %s: %d changed, %d removed tables",
+            self.id,
+            len(changed),
+            len(removed),
+        )
+        return tables
+
     def _sort_schema(self, schema):
-        result = []
-        for i in sorted(schema, key=lambda x: x["name"]):
-            if 'comment' in i:
-                combined = list(zip(i['columns'], i['comment']))
-                combined.sort()
-                i['columns'], i['comment'] = zip(*combined)
-                result.append({
-                    "name": i["name"],
-                    "columns": i['columns'],
-                    "comment": i['comment']
-                })
-            else:
-                result.append({
-                    "name": i["name"],
-                    "columns": sorted(i["columns"], key=lambda x: x["name"] if isinstance(x, dict) else x),
-                })
-        return result
+        return [self._sort_table(i) for i in sorted(schema, key=lambda x: x["name"])]
+
+    def _sort_table(self, i):
+        if 'comment' in i and 'types' in i:
+            combined = sorted(zip(i['columns'], i['comment'], i['types']), key=lambda x: x[0])
+            columns, comment, types = zip(*combined) if combined else ((), (), ())
+            return {
+                "name": i["name"],
+                "columns": columns,
+                "comment": comment,
+                "types": types
+            }
+        elif 'comment' in i:
+            combined = list(zip(i['columns'], i['comment']))
+            combined.sort()
+            i['columns'], i['comment'] = zip(*combined)
+            return {
+                "name": i["name"],
+                "columns": i['columns'],
+                "comment": i['comment']
+            }
+        else:
+            return {
+                "name": i["name"],
+                "columns": sorted(i["columns"], key=lambda x: x["name"] if isinstance(x, dict) else x),
+            }
 
     @property
     def _schema_key(self):
         return "data_source:schema:{}".format(self.id)
 
+    @property
+    def _schema_tables_key(self):
+        return "data_source:schema:{}:tables".format(self.id)
+
+    @property
+    def _schema_fingerprints_key(self):
+        return "data_source:schema:{}:fingerprints".format(self.id)
+
+    @property
+    def _schema_refreshed_key(self):
+        return "data_source:schema:{}:refreshed_at".format(self.id)
+
     @property
     def _pause_key(self):
         return "ds:{}:pause".format(self.id)
@@ -269,6 +468,8 @@ class DataSource(BelongsToOrgMixin, db.Model):
             DataSourceGroup.group == group, DataSourceGroup.data_source == self
         ).delete()
         db.session.commit()
+        # Bulk deletes skip the mapper events.
+        data_source_access.invalidate()
 
     def update_group_permission(self, group, view_only):
         dsg = DataSourceGroup.query.filter(
@@ -301,6 +502,11 @@ class DataSource(BelongsToOrgMixin, db.Model):
         groups = DataSourceGroup.query.filter(DataSourceGroup.data_source == self)
         return dict([(group.group_id, group.view_only) for group in groups])
 
+    @property
+    def groups_data_source_id(self):
+        """The data source whose groups are `groups`, see `permissions.has_access_to_groups`."""
+        return self.id
+
 
 @generic_repr("id", "data_source_id", "group_id", "view_only")
 class DataSourceGroup(db.Model):
@@ -315,6 +521,68 @@ class DataSourceGroup(db.Model):
     __tablename__ = "data_source_groups"
 
 
+class DataSourceAccess(object):
+    """The data sources groups can use, computed from `data_source_groups` and kept in Redis.
+
+    Maps are keyed by a version that every committed change of
+    `data_source_groups` bumps, so a permission change takes effect with the
+    next request and the stale maps just expire.
+    """
+
+    KEY_PREFIX = "permissions:data_sources"
+    VERSION_KEY_NAME = "permissions:data_sources:version"
+    TTL = 24 * 3600
+
+    def for_groups(self, group_ids):
+        """{data source id: view only} of the data sources any of `group_ids` can use."""
+        group_ids = sorted(set(group_ids or []))
+        if not group_ids:
+            return {}
+
+        version = int(redis_connection.get(self.VERSION_KEY_NAME) or 0)
+        key = "{}:{}:{}".format(
+            self.KEY_PREFIX, version, ",".join(str(group_id) for group_id in group_ids)
+        )
+        cached = redis_connection.get(key)
+        if cached is not None:
+            return {int(data_source_id): v for data_source_id, v in json_loads(cached).items()}
+
+        # Like `has_access_to_groups`: view only unless one of the groups has full access.
+        access = {}
+        for data_source_id, view_only in db.session.query(
+            DataSourceGroup.data_source_id, DataSourceGroup.view_only
+        ).filter(DataSourceGroup.group_id.in_(group_ids)):
+            access[data_source_id] = access.get(data_source_id, True) and bool(view_only)
+
+        redis_connection.set(key, json_dumps(access), ex=self.TTL)
+        return access
+
+    def invalidate(self):
+        redis_connection.incr(self.VERSION_KEY_NAME)
+
+
+data_source_access = DataSourceAccess()
+
+
+@listens_for(DataSourceGroup, "after_insert")
+@listens_for(DataSourceGroup, "after_update")
+@listens_for(DataSourceGroup, "after_delete")
+def data_source_group_changed(mapper, connection, target):
+    # Invalidated on commit, or a concurrent request could cache the old permissions again.
+    db.session.info["data_source_access_changed"] = True
+
+
+@listens_for(db.session, "after_commit")
+def invalidate_data_source_access(session):
+    if session.info.pop("data_source_access_changed", False):
+        data_source_access.invalidate()
+
+
+@listens_for(db.session, "after_rollback")
+def discard_data_source_access_changes(session):
+    session.info.pop("data_source_access_changed", None)
+
+
 DESERIALIZED_DATA_ATTR = "_deserialized_data"
 
 
@@ -325,7 +593,11 @@ class DBPersistence(object):
             return None
 
         if not hasattr(self, DESERIALIZED_DATA_ATTR):
-            setattr(self, DESERIALIZED_DATA_ATTR, json_loads(self._data))
+            if is_columnar(self._data):
+                deserialized = ColumnarReader(self._data_columnar).to_dict()
+            else:
+                deserialized = json_loads(self._data)
+            setattr(self, DESERIALIZED_DATA_ATTR, deserialized)
 
         return self._deserialized_data
 
@@ -333,11 +605,13 @@ class DBPersistence(object):
     def data(self, data):
         if hasattr(self, DESERIALIZED_DATA_ATTR):
             delattr(self, DESERIALIZED_DATA_ATTR)
+        if is_columnar(self._data):
+            self._data_columnar = None
         self._data = data
 
 
-QueryResultPersistence = (
-    settings.dynamic_settings.QueryResultPersistence or DBPersistence
+QueryResultPersistence = settings.dynamic_settings.QueryResultPersistence or (
+    ColumnarPersistence if settings.QUERY_RESULTS_STORAGE == "columnar" else DBPersistence
 )
 
 
@@ -351,6 +625,8 @@ class QueryResult(db.Model, QueryResultPersistence, BelongsToOrgMixin):
     query_hash = Column(db.String(32), index=True)
     query_text = Column("query", db.Text)
     _data = Column("data", db.Text)
+    # Deferred, so installs that never stored columnar results don't need the column.
+    _data_columnar = db.deferred(ColumnNull("data_columnar", db.LargeBinary))
     runtime = Column(postgresql.DOUBLE_PRECISION)
     retrieved_at = Column(db.DateTime(True))
 
@@ -370,6 +646,13 @@ class QueryResult(db.Model, QueryResultPersistence, BelongsToOrgMixin):
             "retrieved_at": self.retrieved_at,
         }
 
+    @property
+    def stored_size(self):
+        """Bytes the data takes in the database, whichever column holds it."""
+        if is_columnar(self._data):
+            return len(self._data_columnar or b"")
+        return len(self._data or "")
+
     @classmethod
     def unused(cls, days=7):
         age_threshold = datetime.datetime.now() - datetime.timedelta(days=days)
@@ -380,8 +663,14 @@ class QueryResult(db.Model, QueryResultPersistence, BelongsToOrgMixin):
         ).options(load_only("id"))
 
     @classmethod
-    def get_latest(cls, data_source, query, max_age=0):
-        query_hash = gen_query_hash(query)
+    def _get_latest(cls, data_source, query_hash, max_age, index_entry):
+        # A stale entry may just mean a newer result was stored without being
+        # indexed, so that case falls through to the database as well.
+        if index_entry is not None and index_entry.is_fresh(max_age):
+            query_result = cls.query.get(index_entry.id)
+            if query_result is not None:
+                return query_result
+            result_cache.drop_index_entry(data_source.id, query_hash)
 
         if max_age == -1:
             query = cls.query.filter(
@@ -398,7 +687,73 @@ class QueryResult(db.Model, QueryResultPersistence, BelongsToOrgMixin):
                 ),
             )
 
-        return query.order_by(cls.retrieved_at.desc()).first()
+        query_result = query.order_by(cls.retrieved_at.desc()).first()
+        if query_result is not None:
+            query_result.index_as_latest()
+
+        return query_result
+
+    @classmethod
+    def get_latest(cls, data_source, query, max_age=0):
+        query_hash = gen_query_hash(query)
+        index_entry = result_cache.get_index_entry(data_source.id, query_hash)
+
+        return cls._get_latest(data_source, query_hash, max_age, index_entry)
+
+    @classmethod
+    def get_latest_cached(cls, data_source, query, max_age=0):
+        """Like `get_latest`, but returns a detached `CachedQueryResult`.
+
+        Results are looked up through the Redis index and kept decoded in
+        process memory until they get older than `max_age`, so repeated hits
+        don't load the result row at all.
+        """
+        query_hash = gen_query_hash(query)
+        index_entry = result_cache.get_index_entry(data_source.id, query_hash)
+
+        if index_entry is not None and index_entry.is_fresh(max_age):
+            cached = result_cache.memory_cache.get(index_entry.id)
+            if cached is not None:
+                return cached
+
+        query_result = cls._get_latest(data_source, query_hash, max_age, index_entry)
+        if query_result is None:
+            return None
+
+        return cls._cache_in_memory(query_result, max_age)
+
+    @staticmethod
+    def _cache_in_memory(query_result, max_age):
+        """Keep a `CachedQueryResult` of `query_result` in memory until it gets older than `max_age`."""
+        cached = result_cache.CachedQueryResult(query_result.to_dict())
+        if max_age == -1:
+            ttl = settings.QUERY_RESULTS_INDEX_TTL
+        else:
+            ttl = query_result.retrieved_at.timestamp() + max_age - time.time()
+        result_cache.memory_cache.put(query_result.id, cached, query_result.stored_size, ttl)
+        return cached
+
+    @classmethod
+    def iter_many_cached(cls, result_ids, max_age=-1):
+        """Yield (id, `CachedQueryResult`) of results, the ones kept in memory first.
+
+        The others are streamed from one query and decoded one at a time. Like
+        `get_latest_cached`, they are kept in memory until they get older than `max_age`.
+        """
+        missing = []
+        for result_id in set(result_ids):
+            cached = result_cache.memory_cache.get(result_id)
+            if cached is None:
+                missing.append(result_id)
+            else:
+                yield result_id, cached
+
+        if missing:
+            for query_result in cls.query.filter(cls.id.in_(missing)).yield_per(1):
+                yield query_result.id, cls._cache_in_memory(query_result, max_age)
+
+    def index_as_latest(self):
+        result_cache.index_result(self, self.stored_size)
 
     @classmethod
     def store_result(
@@ -423,10 +778,15 @@ class QueryResult(db.Model, QueryResultPersistence, BelongsToOrgMixin):
     def groups(self):
         return self.data_source.groups
 
+    @property
+    def groups_data_source_id(self):
+        return self.data_source_id
 
-def should_schedule_next(
-    previous_iteration, now, interval, time=None, day_of_week=None, failures=0
+
+def next_scheduled_iteration(
+    previous_iteration, interval, time=None, day_of_week=None, failures=0
 ):
+    """Return when a schedule is due after `previous_iteration`, or None if never."""
     # if time exists then interval > 23 hours (82800s)
     # if day_of_week exists then interval > 6 days (518400s)
     if time is None:
@@ -467,8 +827,17 @@ def should_schedule_next(
         try:
             next_iteration += datetime.timedelta(minutes=2 ** failures)
         except OverflowError:
-            return False
-    return now > next_iteration
+            return None
+    return next_iteration
+
+
+def should_schedule_next(
+    previous_iteration, now, interval, time=None, day_of_week=None, failures=0
+):
+    next_iteration = next_scheduled_iteration(
+        previous_iteration, interval, time, day_of_week, failures
+    )
+    return next_iteration is not None and now > next_iteration
 
 
 @gfk_type
@@ -529,9 +898,17 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
     tags = Column(
         "tags", MutableList.as_mutable(postgresql.ARRAY(db.Unicode)), nullable=True
     )
+    # Characters and character pairs of the name and description, to search them for short terms
+    search_bigrams = Column(postgresql.ARRAY(db.Text), nullable=True)
 
     query_class = SearchBaseQuery
     __tablename__ = "queries"
+    __table_args__ = (
+        trigram_index("queries_name_trgm", "name"),
+        trigram_index("queries_description_trgm", "description"),
+        trigram_index("queries_query_trgm", "query"),
+        bigram_index("queries_search_bigrams", "search_bigrams"),
+    )
     __mapper_args__ = {"version_id_col": version, "version_id_generator": False}
 
     def __str__(self):
@@ -655,22 +1032,30 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
 
     @classmethod
     def outdated_queries(cls):
+        now = utils.utcnow()
+        due_query_ids = scheduled_queries_index.due(now)
+        if not due_query_ids:
+            return []
+
         queries = (
             Query.query.options(
                 joinedload(Query.latest_query_data).load_only("retrieved_at")
             )
-                .filter(Query.schedule.isnot(None))
+                .filter(Query.id.in_(due_query_ids), Query.schedule.isnot(None))
                 .order_by(Query.id)
                 .all()
         )
 
-        now = utils.utcnow()
         outdated_queries = {}
-        scheduled_queries_executions.refresh()
+        scheduled_queries_executions.refresh([query.id for query in queries])
+
+        unscheduled = set(due_query_ids) - set(query.id for query in queries)
+        next_due = {}
 
         for query in queries:
             try:
                 if query.schedule.get("disabled"):
+                    unscheduled.add(query.id)
                     continue
 
                 if query.schedule["until"]:
@@ -679,22 +1064,29 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
                     )
 
                     if schedule_until <= now:
+                        unscheduled.add(query.id)
                         continue
 
                 retrieved_at = scheduled_queries_executions.get(query.id) or (
                     query.latest_query_data and query.latest_query_data.retrieved_at
                 )
 
-                if should_schedule_next(
+                next_iteration = next_scheduled_iteration(
                     retrieved_at or now,
-                    now,
                     query.schedule["interval"],
                     query.schedule["time"],
                     query.schedule["day_of_week"],
                     query.schedule_failures,
-                ):
+                )
+
+                if next_iteration is None:
+                    unscheduled.add(query.id)
+                elif now > next_iteration:
+                    # Stays due until its execution starts and touches the index.
                     key = "{}:{}".format(query.query_hash, query.data_source_id)
                     outdated_queries[key] = query
+                else:
+                    next_due[query.id] = next_iteration.timestamp()
             except Exception as e:
                 query.schedule["disabled"] = True
                 db.session.commit()
@@ -708,6 +1100,9 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
                     type(e)(message).with_traceback(e.__traceback__)
                 )
 
+        scheduled_queries_index.reschedule(next_due)
+        scheduled_queries_index.remove(list(unscheduled))
+
         return list(outdated_queries.values())
 
     @classmethod
@@ -729,13 +1124,18 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
         )
 
         if multi_byte_search:
-            # Since tsvector doesn't work well with CJK languages, use `ilike` too
-            pattern = "%{}%".format(term)
+            # Since tsvector doesn't work well with CJK languages, match substrings
+            # (through the trigram or bigram indexes) and rank them with the search vector's weights
+            rank = substring_rank(
+                term, [(cls.name, 1.0), (cls.description, 0.2), (cls.query_text, 0.1)]
+            )
             return (
                 all_queries.filter(
-                    or_(cls.name.ilike(pattern), cls.description.ilike(pattern))
+                    substring_match(
+                        term, [cls.name, cls.description, cls.query_text], cls.search_bigrams
+                    )
                 )
-                    .order_by(Query.id)
+                    .order_by(db.desc(rank), func.length(cls.name), Query.id)
                     .limit(limit)
             )
 
@@ -748,32 +1148,26 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
 
     @classmethod
     def recent(cls, group_ids, user_id=None, limit=20):
-        query = (
-            cls.query.filter(Event.created_at > (db.func.current_date() - 7))
-                .join(Event, Query.id == Event.object_id.cast(db.Integer))
-                .join(
-                DataSourceGroup, Query.data_source_id == DataSourceGroup.data_source_id
-            )
-                .filter(
-                Event.action.in_(
-                    ["edit", "execute", "edit_name", "edit_description", "view_source"]
-                ),
-                Event.object_id != None,
-                Event.object_type == "query",
-                DataSourceGroup.group_id.in_(group_ids),
-                or_(Query.is_draft == False, Query.user_id == user_id),
-                Query.is_archived == False,
-            )
-                .group_by(Event.object_id, Query.id)
-                .order_by(db.desc(db.func.count(0)))
-        )
+        """The queries with the most activity in the last week, of the user or else of the groups.
 
-        if user_id:
-            query = query.filter(Event.user_id == user_id)
+        Activity counts come from the `recent_queries` rollup; the queries are
+        then looked up by id and filtered by the current permissions.
+        """
+        scores = recent_queries.scores(group_ids, user_id)
+        if not scores:
+            return []
 
-        query = query.limit(limit)
+        accessible_data_sources = db.session.query(DataSourceGroup.data_source_id).filter(
+            DataSourceGroup.group_id.in_(group_ids)
+        )
+        queries = cls.query.filter(
+            Query.id.in_(list(scores)),
+            Query.data_source_id.in_(accessible_data_sources),
+            or_(Query.is_draft == False, Query.user_id == user_id),
+            Query.is_archived == False,
+        )
 
-        return query
+        return sorted(queries, key=lambda query: (-scores[query.id], query.id))[:limit]
 
     @classmethod
     def get_by_id(cls, _id):
@@ -855,6 +1249,10 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
 
         return self.data_source.groups
 
+    @property
+    def groups_data_source_id(self):
+        return self.data_source_id
+
     @hybrid_property
     def lowercase_name(self):
         "Optional property useful for sorting purposes."
@@ -897,6 +1295,30 @@ class Query(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model):
 @listens_for(Query, "before_update")
 def receive_before_insert_update(mapper, connection, target):
     target.update_query_hash()
+    target.search_bigrams = search_bigrams(target.name, target.description)
+
+
+@listens_for(Query, "after_insert")
+@listens_for(Query, "after_update")
+def receive_after_insert_update(mapper, connection, target):
+    if target.schedule is not None and (
+        get_history(target, "schedule").has_changes()
+        or get_history(target, "schedule_failures").has_changes()
+    ):
+        # Touched on commit, so the scheduler never re-scores the query from the old
+        # row, and a rolled back change leaves the index alone.
+        db.session.info.setdefault("touched_scheduled_queries", set()).add(target.id)
+
+
+@listens_for(db.session, "after_commit")
+def touch_scheduled_queries(session):
+    for query_id in session.info.pop("touched_scheduled_queries", ()):
+        scheduled_queries_index.touch(query_id)
+
+
+@listens_for(db.session, "after_rollback")
+def discard_scheduled_queries_touches(session):
+    session.info.pop("touched_scheduled_queries", None)
 
 
 @listens_for(Query.user_id, "set")
@@ -1293,6 +1715,10 @@ class Alert(TimestampMixin, BelongsToOrgMixin, db.Model):
     def groups(self):
         return self.query_rel.groups
 
+    @property
+    def groups_data_source_id(self):
+        return self.query_rel.data_source_id
+
     @property
     def muted(self):
         return self.options.get("muted", False)
@@ -1333,7 +1759,14 @@ class Dashboard(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model
         MutableDict.as_mutable(postgresql.JSON), server_default="{}", default={}
     )
 
+    # Characters and character pairs of the name, to search it for short terms
+    search_bigrams = Column(postgresql.ARRAY(db.Text), nullable=True)
+
     __tablename__ = "dashboards"
+    __table_args__ = (
+        trigram_index("dashboards_name_trgm", "name"),
+        bigram_index("dashboards_search_bigrams", "search_bigrams"),
+    )
     __mapper_args__ = {"version_id_col": version}
 
     def __str__(self):
@@ -1375,14 +1808,27 @@ class Dashboard(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model
 
     @classmethod
     def search(cls, org, groups_ids, user_id, search_term):
-        # TODO: switch to FTS
-        return cls.all(org, groups_ids, user_id).filter(
-            cls.name.ilike("%{}%".format(search_term))
+        # Substring match (through the trigram or bigram index) so CJK names are found too,
+        # shortest (closest) names first
+        dashboards = cls.all(org, groups_ids, user_id).subquery()
+        return (
+            Dashboard.query.options(
+                joinedload(Dashboard.user).load_only(
+                    "id", "name", "details", "email"
+                )
+            )
+                .filter(
+                cls.id.in_(db.session.query(dashboards.c.id)),
+                substring_match(search_term, [cls.name], cls.search_bigrams),
+            )
+                .order_by(func.length(cls.name), cls.id)
         )
 
     @classmethod
     def search_by_user(cls, term, user, limit=None):
-        return cls.by_user(user).filter(cls.name.ilike("%{}%".format(term))).limit(limit)
+        return cls.by_user(user).filter(
+            substring_match(term, [cls.name], cls.search_bigrams)
+        ).limit(limit)
 
     @classmethod
     def all_tags(cls, org, user):
@@ -1421,6 +1867,19 @@ class Dashboard(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model
     def get_by_slug_and_org(cls, slug, org):
         return cls.query.filter(cls.slug == slug, cls.org == org).one()
 
+    def widgets_with_queries(self):
+        """The widgets, with their visualizations, queries and query authors loaded in the same query."""
+        query_rel = joinedload(Widget.visualization).joinedload(Visualization.query_rel)
+        return (
+            Widget.query.filter(Widget.dashboard_id == self.id)
+            .options(
+                query_rel.joinedload(Query.user),
+                query_rel.joinedload(Query.last_modified_by),
+            )
+            .order_by(Widget.id)
+            .all()
+        )
+
     @hybrid_property
     def lowercase_name(self):
         "Optional property useful for sorting purposes."
@@ -1432,6 +1891,12 @@ class Dashboard(ChangeTrackingMixin, TimestampMixin, BelongsToOrgMixin, db.Model
         return func.lower(cls.name)
 
 
+@listens_for(Dashboard, "before_insert")
+@listens_for(Dashboard, "before_update")
+def receive_dashboard_before_insert_update(mapper, connection, target):
+    target.search_bigrams = search_bigrams(target.name)
+
+
 @generic_repr("id", "name", "type", "query_id")
 class Visualization(TimestampMixin, BelongsToOrgMixin, db.Model):
     id = primary_key("Visualization")
@@ -1523,8 +1988,8 @@ class Event(db.Model):
             "created_at": self.created_at.isoformat(),
         }
 
-    @classmethod
-    def record(cls, event):
+    @staticmethod
+    def columns(event):
         org_id = event.pop("org_id")
         user_id = event.pop("user_id", None)
         action = event.pop("action")
@@ -1533,7 +1998,7 @@ class Event(db.Model):
 
         created_at = datetime.datetime.utcfromtimestamp(event.pop("timestamp"))
 
-        event = cls(
+        return dict(
             org_id=org_id,
             user_id=user_id,
             action=action,
@@ -1542,9 +2007,193 @@ class Event(db.Model):
             additional_properties=event,
             created_at=created_at,
         )
+
+    @classmethod
+    def record(cls, event):
+        event = cls(**cls.columns(event))
         db.session.add(event)
         return event
 
+    @classmethod
+    def record_many(cls, events):
+        """Insert raw events with a single multi-row INSERT; returns the inserted rows."""
+        rows = [cls.columns(event) for event in events]
+        if rows:
+            db.session.execute(cls.__table__.insert().values(rows))
+        return rows
+
+
+class EventsBuffer(object):
+    """Redis list of raw events waiting to be written to the events table.
+
+    Requests push events here instead of enqueuing a job per event; the
+    periodic `flush_events` job moves the list aside and inserts it in
+    batches of EVENTS_FLUSH_BATCH_SIZE. A batch is trimmed from the list
+    right after it is committed, so a failed flush is retried by the next
+    one. Flushes hold a lock, so overlapping ones can't insert the same batch.
+    """
+
+    KEY_NAME = "events:buffer"
+    FLUSHING_KEY_NAME = "events:flushing"
+    LOCK_KEY_NAME = "events:flush_lock"
+    LOCK_TIMEOUT = 600
+
+    def push(self, event):
+        redis_connection.rpush(self.KEY_NAME, json_dumps(event))
+
+    def flush(self, batch_size=None):
+        lock = redis_connection.lock(self.LOCK_KEY_NAME, timeout=self.LOCK_TIMEOUT)
+        if not lock.acquire(blocking=False):
+            logger.info("Events are being flushed already, skipping.")
+            return 0
+        try:
+            return self._flush(batch_size or settings.EVENTS_FLUSH_BATCH_SIZE)
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                logger.warning("The events flush lock expired before the flush finished.")
+
+    def _flush(self, batch_size):
+        # Events of a failed flush are still in the flushing list; finish those first.
+        if not redis_connection.exists(self.FLUSHING_KEY_NAME):
+            try:
+                redis_connection.renamenx(self.KEY_NAME, self.FLUSHING_KEY_NAME)
+            except ResponseError:
+                # Nothing was buffered since the last flush.
+                return 0
+
+        flushed = 0
+        while True:
+            raw_events = redis_connection.lrange(self.FLUSHING_KEY_NAME, 0, batch_size - 1)
+            if not raw_events:
+                break
+
+            rows = Event.record_many([json_loads(raw_event) for raw_event in raw_events])
+            db.session.commit()
+            redis_connection.ltrim(self.FLUSHING_KEY_NAME, len(raw_events), -1)
+            flushed += len(raw_events)
+
+            # The batch is committed and trimmed, a failure here must not get it inserted again.
+            try:
+                recent_queries.record(rows)
+            except Exception:
+                logger.exception("Failed to count recent query activity.")
+
+        return flushed
+
+
+events_buffer = EventsBuffer()
+
+
+class RecentQueries(object):
+    """Rollup of the query activity behind `Query.recent`, maintained as events are recorded.
+
+    Every day has a sorted set of query ids per user and per group (of the
+    query's data source), scored by the number of events. The sets expire
+    once they fall out of the RECENT_DAYS window, so a lookup only sums a
+    few small sets instead of aggregating the events table. The first lookup
+    without the rollup (after a deploy or a Redis flush) rebuilds it from the
+    events table.
+    """
+
+    KEY_PREFIX = "queries:recent"
+    BUILT_KEY_NAME = "queries:recent:built"
+    REBUILD_LOCK_KEY_NAME = "queries:recent_rebuild"
+    REBUILD_BATCH_SIZE = 1000
+    RECENT_DAYS = 7
+    ACTIONS = ("edit", "execute", "edit_name", "edit_description", "view_source")
+
+    def _key(self, scope, scope_id, day):
+        return "{}:{}:{}:{}".format(self.KEY_PREFIX, scope, scope_id, day.strftime("%Y%m%d"))
+
+    def _days(self):
+        today = utils.utcnow().date()
+        return [today - datetime.timedelta(days=days) for days in range(self.RECENT_DAYS + 1)]
+
+    def record(self, events):
+        """Count the query events among `events` (`Event.columns` rows)."""
+        activity = []
+        for event in events:
+            if event["object_type"] != "query" or event["action"] not in self.ACTIONS:
+                continue
+            try:
+                query_id = int(event["object_id"])
+            except (TypeError, ValueError):
+                continue
+            activity.append((query_id, event["user_id"], event["created_at"].date()))
+
+        if not activity:
+            return
+
+        groups = defaultdict(list)
+        for query_id, group_id in (
+            db.session.query(Query.id, DataSourceGroup.group_id)
+            .join(DataSourceGroup, Query.data_source_id == DataSourceGroup.data_source_id)
+            .filter(Query.id.in_({query_id for query_id, _, _ in activity}))
+        ):
+            groups[query_id].append(group_id)
+
+        ttl = int(datetime.timedelta(days=self.RECENT_DAYS + 2).total_seconds())
+        pipe = redis_connection.pipeline()
+        for query_id, user_id, day in activity:
+            keys = [self._key("group", group_id, day) for group_id in groups[query_id]]
+            if user_id:
+                keys.append(self._key("user", user_id, day))
+            for key in keys:
+                pipe.zincrby(key, 1, query_id)
+                pipe.expire(key, ttl)
+        pipe.execute()
+
+    def rebuild(self):
+        """Count the query events of the window in the events table again."""
+        keys = list(redis_connection.scan_iter("{}:*".format(self.KEY_PREFIX)))
+        if keys:
+            redis_connection.delete(*keys)
+
+        events = (
+            db.session.query(Event.object_type, Event.object_id, Event.action, Event.user_id, Event.created_at)
+            .filter(
+                Event.object_type == "query",
+                Event.action.in_(self.ACTIONS),
+                Event.created_at >= self._days()[-1],
+            )
+            .yield_per(self.REBUILD_BATCH_SIZE)
+        )
+        batch = []
+        for event in events:
+            batch.append(event._asdict())
+            if len(batch) == self.REBUILD_BATCH_SIZE:
+                self.record(batch)
+                batch = []
+        self.record(batch)
+        redis_connection.set(self.BUILT_KEY_NAME, time.time())
+
+    def scores(self, group_ids, user_id=None):
+        """{query id: events in the window} of the user, or else of all the groups."""
+        if not redis_connection.exists(self.BUILT_KEY_NAME):
+            with redis_connection.lock(self.REBUILD_LOCK_KEY_NAME, timeout=600, blocking_timeout=60):
+                if not redis_connection.exists(self.BUILT_KEY_NAME):
+                    self.rebuild()
+
+        if user_id:
+            keys = [self._key("user", user_id, day) for day in self._days()]
+        else:
+            keys = [self._key("group", group_id, day) for group_id in group_ids for day in self._days()]
+
+        pipe = redis_connection.pipeline()
+        for key in keys:
+            pipe.zrange(key, 0, -1, withscores=True)
+
+        scores = defaultdict(float)
+        for members in pipe.execute():
+            for query_id, score in members:
+                scores[int(query_id)] += score
+        return scores
+
+
+recent_queries = RecentQueries()
+
 
 @generic_repr("id", "created_by_id", "org_id", "active")
 class ApiKey(TimestampMixin, GFKBase, db.Model):
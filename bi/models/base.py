@@ -1,6 +1,7 @@
 import functools
 
 from flask_sqlalchemy import BaseQuery, SQLAlchemy
+from sqlalchemy import case, or_
 from sqlalchemy.orm import object_session
 from sqlalchemy.pool import NullPool
 from sqlalchemy_searchable import make_searchable, vectorizer, SearchQueryMixin
@@ -44,6 +45,61 @@ class SearchBaseQuery(BaseQuery, SearchQueryMixin):
     """
 
 
+# Extensions the models need; created along with the tables.
+database_extensions = ["pg_trgm"]
+
+# pg_trgm extracts no trigram from a shorter term, its indexes can't serve those.
+MIN_TRIGRAM_TERM_LENGTH = 3
+
+
+def trigram_index(name, column):
+    """A pg_trgm GIN index on `column`, which `ILIKE '%term%'` can use instead of scanning the table."""
+    return db.Index(name, column, postgresql_using="gin", postgresql_ops={column: "gin_trgm_ops"})
+
+
+def bigram_index(name, column):
+    """A GIN index on a `search_bigrams` array column."""
+    return db.Index(name, column, postgresql_using="gin")
+
+
+def search_bigrams(*texts):
+    """The lower-cased characters and pairs of adjacent characters of `texts`.
+
+    Typical CJK search terms are one or two characters long, too short for the
+    trigram indexes; `substring_match` looks them up in an array of these.
+    """
+    tokens = set()
+    for text in texts:
+        text = (text or "").lower()
+        tokens.update(text)
+        tokens.update(text[i:i + 2] for i in range(len(text) - 1))
+    return sorted(token for token in tokens if token.split() == [token])
+
+
+def substring_match(term, columns, bigrams_column):
+    """Filter on `term` being part of one of `columns`, in a way their indexes can serve.
+
+    Terms of MIN_TRIGRAM_TERM_LENGTH characters or more use ILIKE, served by the
+    trigram indexes (CJK characters need a database locale that classifies them
+    as alphanumeric). Shorter terms are looked up in `bigrams_column`, which
+    holds the `search_bigrams` of the columns that are worth it (not query text).
+    """
+    term = term.strip()
+    if len(term) < MIN_TRIGRAM_TERM_LENGTH:
+        return bigrams_column.contains([term.lower()])
+    pattern = "%{}%".format(term)
+    return or_(*[column.ilike(pattern) for column in columns])
+
+
+def substring_rank(term, weighted_columns):
+    """Sum of the weights of the (column, weight) pairs that contain `term`, for ordering substring matches."""
+    pattern = "%{}%".format(term.strip())
+    return sum(
+        case([(db.func.coalesce(column, "").ilike(pattern), weight)], else_=0.0)
+        for column, weight in weighted_columns
+    )
+
+
 @vectorizer(db.Integer)
 def integer_vectorizer(column):
     return db.func.cast(column, db.Text)
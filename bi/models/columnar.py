@@ -0,0 +1,293 @@
+import struct
+import sys
+import zlib
+from array import array
+
+from bi.utils import json_dumps, json_loads
+
+# The encoded result goes to the binary `data_columnar` column and the text `data`
+# column only holds this marker, so rows written by the plain JSON persistence keep
+# working after the storage format is switched (and back).
+COLUMNAR_PREFIX = "dbcr1:"
+
+DESERIALIZED_DATA_ATTR = "_deserialized_data"
+COLUMNAR_READER_ATTR = "_columnar_reader"
+
+_HEADER = struct.Struct("<I")
+_INT64_MIN = -(2 ** 63)
+_INT64_MAX = 2 ** 63 - 1
+
+# Per-row markers of the mask block.
+PRESENT, NULL, MISSING = 0, 1, 2
+
+
+def is_columnar(value):
+    return isinstance(value, str) and value.startswith(COLUMNAR_PREFIX)
+
+
+def _column_encoding(values):
+    kinds = set(type(v) for v in values if v is not None)
+
+    if not kinds:
+        return "json"
+    if kinds == {bool}:
+        return "bool"
+    if kinds == {int}:
+        if all(_INT64_MIN <= v <= _INT64_MAX for v in values if v is not None):
+            return "int"
+        return "json"
+    if kinds == {float}:
+        return "float"
+    if kinds == {str}:
+        return "dict"
+    return "json"
+
+
+def _encode_column(values):
+    encoding = _column_encoding(values)
+
+    if encoding == "int":
+        data = array("q", (0 if v is None else v for v in values)).tobytes()
+        return encoding, [data]
+    if encoding == "float":
+        data = array("d", (0.0 if v is None else v for v in values)).tobytes()
+        return encoding, [data]
+    if encoding == "bool":
+        data = array("b", (-1 if v is None else int(v) for v in values)).tobytes()
+        return encoding, [data]
+    if encoding == "dict":
+        dictionary = {}
+        indexes = []
+        for v in values:
+            if v is None:
+                indexes.append(0)
+            else:
+                indexes.append(dictionary.setdefault(v, len(dictionary) + 1))
+        typecode = "H" if len(dictionary) < 0xFFFF else "I"
+        return "dict:" + typecode, [
+            json_dumps(list(dictionary.keys())).encode("utf-8"),
+            array(typecode, indexes).tobytes(),
+        ]
+
+    return encoding, [json_dumps(values).encode("utf-8")]
+
+
+def _load_array(typecode, raw, byteorder):
+    values = array(typecode)
+    values.frombytes(raw)
+    if byteorder != sys.byteorder:
+        values.byteswap()
+    return values
+
+
+def _decode_column(encoding, blocks, mask, byteorder):
+    if encoding == "json":
+        return json_loads(blocks[0].decode("utf-8"))
+
+    if encoding.startswith("dict:"):
+        dictionary = [None] + json_loads(blocks[0].decode("utf-8"))
+        indexes = _load_array(encoding[5:], blocks[1], byteorder)
+        return [dictionary[i] for i in indexes]
+
+    if encoding == "bool":
+        return [None if v == -1 else bool(v) for v in _load_array("b", blocks[0], byteorder)]
+
+    typecode = "q" if encoding == "int" else "d"
+    values = _load_array(typecode, blocks[0], byteorder).tolist()
+    if mask is not None:
+        for i, m in enumerate(mask):
+            if m != PRESENT:
+                values[i] = None
+    return values
+
+
+def encode_query_result_data(data):
+    """Encode a ``{"columns", "rows"}`` result into the columnar binary format.
+
+    Returns ``None`` when the result doesn't have the expected shape, in which
+    case the caller should store it as plain JSON.
+    """
+    if not isinstance(data, dict) or set(data.keys()) - {"columns", "rows"}:
+        return None
+
+    columns = data.get("columns") or []
+    rows = data.get("rows") or []
+    names = [c.get("name") for c in columns if isinstance(c, dict)]
+
+    if len(names) != len(columns) or len(set(names)) != len(names):
+        return None
+
+    known = set(names)
+    if any(not isinstance(row, dict) or row.keys() - known for row in rows):
+        return None
+
+    payload = []
+    offset = 0
+
+    def add_block(raw):
+        nonlocal offset
+        compressed = zlib.compress(raw)
+        payload.append(compressed)
+        position = [offset, len(compressed)]
+        offset += len(compressed)
+        return position
+
+    column_headers = []
+    for name in names:
+        mask = array(
+            "B",
+            (PRESENT if row.get(name) is not None else (NULL if name in row else MISSING) for row in rows),
+        )
+        values = [row.get(name) for row in rows]
+        encoding, blocks = _encode_column(values)
+        column_headers.append(
+            {
+                "name": name,
+                "encoding": encoding,
+                "mask": add_block(mask.tobytes()) if any(mask) else None,
+                "blocks": [add_block(b) for b in blocks],
+            }
+        )
+
+    header = json_dumps(
+        {
+            "columns": columns,
+            "row_count": len(rows),
+            "byteorder": sys.byteorder,
+            "encodings": column_headers,
+        }
+    ).encode("utf-8")
+
+    return _HEADER.pack(len(header)) + header + b"".join(payload)
+
+
+class ColumnarReader(object):
+    """Decodes a columnar result one column at a time, on demand."""
+
+    def __init__(self, value):
+        self._body = bytes(value)
+        (header_size,) = _HEADER.unpack_from(self._body)
+        self._payload_start = _HEADER.size + header_size
+        header = json_loads(self._body[_HEADER.size:self._payload_start].decode("utf-8"))
+
+        self.columns = header["columns"]
+        self.row_count = header["row_count"]
+        self._byteorder = header["byteorder"]
+        self._encodings = {c["name"]: c for c in header["encodings"]}
+        self._decoded = {}
+        self._masks = {}
+
+    def _block(self, position):
+        start = self._payload_start + position[0]
+        return zlib.decompress(self._body[start:start + position[1]])
+
+    def _mask(self, name):
+        if name not in self._masks:
+            position = self._encodings[name]["mask"]
+            self._masks[name] = array("B", self._block(position)) if position else None
+        return self._masks[name]
+
+    def column(self, name):
+        if name not in self._decoded:
+            column = self._encodings[name]
+            self._decoded[name] = _decode_column(
+                column["encoding"],
+                [self._block(b) for b in column["blocks"]],
+                self._mask(name),
+                self._byteorder,
+            )
+        return self._decoded[name]
+
+    def rows(self):
+        names = [c["name"] for c in self.columns]
+        values = [self.column(name) for name in names]
+        masks = [self._mask(name) for name in names]
+
+        if not any(m is not None and MISSING in m for m in masks):
+            return [dict(zip(names, row)) for row in zip(*values)] if names else [{} for _ in range(self.row_count)]
+
+        rows = []
+        for i in range(self.row_count):
+            rows.append(
+                {
+                    name: values[c][i]
+                    for c, name in enumerate(names)
+                    if masks[c] is None or masks[c][i] != MISSING
+                }
+            )
+        return rows
+
+    def to_dict(self):
+        return {"columns": self.columns, "rows": self.rows()}
+
+
+class ColumnarPersistence(object):
+    """QueryResult persistence that stores the data as compressed, typed
+    column arrays (strings are dictionary encoded) in the `data_columnar`
+    bytea column.
+
+    `data` still returns the regular ``{"columns", "rows"}`` dictionary;
+    `data_columns`, `data_column(name)` and `data_row_count` only decode
+    what they need.
+    Results stored as plain JSON are read transparently.
+    """
+
+    @property
+    def data(self):
+        if self._data is None:
+            return None
+
+        if not hasattr(self, DESERIALIZED_DATA_ATTR):
+            if is_columnar(self._data):
+                deserialized = self._columnar_data.to_dict()
+            else:
+                deserialized = json_loads(self._data)
+            setattr(self, DESERIALIZED_DATA_ATTR, deserialized)
+
+        return self._deserialized_data
+
+    @data.setter
+    def data(self, data):
+        for attr in (DESERIALIZED_DATA_ATTR, COLUMNAR_READER_ATTR):
+            if hasattr(self, attr):
+                delattr(self, attr)
+
+        encoded = None
+        if data is not None:
+            encoded = encode_query_result_data(json_loads(data) if isinstance(data, str) else data)
+
+        if encoded is not None:
+            self._data = COLUMNAR_PREFIX
+            self._data_columnar = encoded
+            return
+
+        if is_columnar(self._data):
+            self._data_columnar = None
+        self._data = data if data is None or isinstance(data, str) else json_dumps(data)
+
+    @property
+    def _columnar_data(self):
+        if not hasattr(self, COLUMNAR_READER_ATTR):
+            setattr(self, COLUMNAR_READER_ATTR, ColumnarReader(self._data_columnar))
+        return getattr(self, COLUMNAR_READER_ATTR)
+
+    @property
+    def data_columns(self):
+        if self._data is None:
+            return None
+        if is_columnar(self._data) and not hasattr(self, DESERIALIZED_DATA_ATTR):
+            return self._columnar_data.columns
+        return self.data["columns"]
+
+    @property
+    def data_row_count(self):
+        if self._data is None:
+            return 0
+        if is_columnar(self._data) and not hasattr(self, DESERIALIZED_DATA_ATTR):
+            return self._columnar_data.row_count
+        return len(self.data["rows"])
+
+    def data_column(self, name):
+        if is_columnar(self._data) and not hasattr(self, DESERIALIZED_DATA_ATTR):
+            return self._columnar_data.column(name)
+        return [row.get(name) for row in self.data["rows"]]
@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from bi import redis_connection, settings
+
+logger = logging.getLogger(__name__)
+
+# Redis hash pointing at the newest result of a query on a data source:
+# {"id": ..., "retrieved_at": <epoch seconds>, "size": <stored data length>}
+INDEX_KEY = "query_result:latest:{}:{}"
+
+
+def _index_key(data_source_id, query_hash):
+    return INDEX_KEY.format(data_source_id, query_hash)
+
+
+class IndexEntry(object):
+    def __init__(self, result_id, retrieved_at, size):
+        self.id = result_id
+        self.retrieved_at = retrieved_at
+        self.size = size
+
+    def is_fresh(self, max_age):
+        return max_age == -1 or self.retrieved_at + max_age >= time.time()
+
+
+def get_index_entry(data_source_id, query_hash):
+    try:
+        entry = redis_connection.hgetall(_index_key(data_source_id, query_hash))
+    except Exception:
+        logger.warning("Failed reading the query result index.", exc_info=True)
+        return None
+
+    if not entry:
+        return None
+
+    return IndexEntry(int(entry["id"]), float(entry["retrieved_at"]), int(entry.get("size", 0)))
+
+
+def index_result(query_result, size):
+    """Point the index of `query_result`'s query at it, unless a newer result is indexed."""
+    key = _index_key(query_result.data_source_id, query_result.query_hash)
+    retrieved_at = query_result.retrieved_at.timestamp()
+
+    try:
+        current = redis_connection.hget(key, "retrieved_at")
+        if current is not None and float(current) > retrieved_at:
+            return
+
+        pipe = redis_connection.pipeline()
+        pipe.hset(key, mapping={"id": query_result.id, "retrieved_at": retrieved_at, "size": size})
+        pipe.expire(key, settings.QUERY_RESULTS_INDEX_TTL)
+        pipe.execute()
+    except Exception:
+        logger.warning("Failed updating the query result index.", exc_info=True)
+
+
+def drop_index_entry(data_source_id, query_hash):
+    try:
+        redis_connection.delete(_index_key(data_source_id, query_hash))
+    except Exception:
+        logger.warning("Failed updating the query result index.", exc_info=True)
+
+
+class CachedQueryResult(object):
+    """Decoded copy of a QueryResult, detached from the database session."""
+
+    def __init__(self, values):
+        self._values = values
+
+    def __getattr__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def to_dict(self):
+        return dict(self._values)
+
+
+class ResultMemoryCache(object):
+    """A thread safe LRU of decoded results, bounded by their total stored size.
+
+    Every entry expires on its own deadline; results bigger than a quarter of
+    the budget are never kept.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _pop(self, result_id):
+        expires_at, size, result = self._entries.pop(result_id)
+        self._bytes -= size
+        return result
+
+    def get(self, result_id):
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is None:
+                return None
+
+            if entry[0] < time.time():
+                self._pop(result_id)
+                return None
+
+            self._entries.move_to_end(result_id)
+            return entry[2]
+
+    def put(self, result_id, result, size, ttl):
+        if not self.max_bytes or ttl <= 0 or size > self.max_bytes // 4:
+            return
+
+        with self._lock:
+            if result_id in self._entries:
+                self._pop(result_id)
+
+            self._entries[result_id] = (time.time() + ttl, size, result)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+memory_cache = ResultMemoryCache(settings.QUERY_RESULTS_MEMORY_CACHE_BYTES)
@@ -1,5 +1,6 @@
 import functools
 
+from flask import g, has_request_context
 from flask_login import current_user
 from flask_restful import abort
 from funcy import flatten
@@ -31,12 +32,43 @@ def has_access_to_object(obj, api_key, need_view_only):
         return False
 
 
-def has_access_to_groups(obj, user, need_view_only):
-    groups = obj.groups if hasattr(obj, "groups") else obj
+def data_source_access(user):
+    """{data source id: view only} of the data sources the groups of `user` can use.
+
+    Computed once per request and otherwise kept in Redis, see `models.DataSourceAccess`.
+    """
+    from bi.models import data_source_access as access_by_groups
+
+    group_ids = tuple(sorted(set(user.group_ids or [])))
+    if not has_request_context():
+        return access_by_groups.for_groups(group_ids)
+
+    cache = g.setdefault("data_source_access", {})
+    if group_ids not in cache:
+        cache[group_ids] = access_by_groups.for_groups(group_ids)
+    return cache[group_ids]
 
+
+def has_access_to_data_source(data_source_id, user, need_view_only):
     if "admin" in user.permissions:
         return True
 
+    access_view_only = data_source_access(user).get(data_source_id)
+    if access_view_only is None:
+        return False
+
+    return need_view_only or not access_view_only
+
+
+def has_access_to_groups(obj, user, need_view_only):
+    if "admin" in user.permissions:
+        return True
+
+    if hasattr(obj, "groups_data_source_id"):
+        return has_access_to_data_source(obj.groups_data_source_id, user, need_view_only)
+
+    groups = obj.groups if hasattr(obj, "groups") else obj
+
     matching_groups = set(groups.keys()).intersection(user.group_ids)
 
     if not matching_groups:
@@ -54,6 +86,11 @@ def require_access(obj, user, need_view_only):
         abort(403)
 
 
+def filter_accessible(objects, user, need_view_only=view_only):
+    """The objects `user` has access to, checked against one `data_source_access` lookup."""
+    return [obj for obj in objects if has_access(obj, user, need_view_only)]
+
+
 class require_permissions(object):
     def __init__(self, permissions, allow_one=False):
         self.permissions = permissions
@@ -123,6 +123,8 @@ class BaseQueryRunner(object):
     noop_query = None
     limit_query = " LIMIT 1000"
     limit_keywords = ["LIMIT", "OFFSET"]
+    # Whether runners that support it may reuse pooled connections (see bi.query_runner.pool).
+    pool_connections = True
 
     def __init__(self, configuration):
         self.syntax = "sql"
@@ -236,6 +238,16 @@ class BaseQueryRunner(object):
     def get_schema(self, get_stats=False):
         raise NotSupported()
 
+    def get_table_fingerprints(self):
+        """Return a {table name: fingerprint} dict, where a table's fingerprint
+        changes whenever its columns change. Used for incremental schema refreshes.
+        """
+        raise NotSupported()
+
+    def get_tables_schema(self, table_names):
+        """Return the schema entries of only the given tables."""
+        raise NotSupported()
+
     def _handle_run_query_error(self, error):
         if error is None:
             return
@@ -523,6 +535,8 @@ def with_ssh_tunnel(query_runner, details):
 
         return wrapper
 
+    # Connections through a tunnel don't outlive it, so they can't be pooled.
+    query_runner.pool_connections = False
     query_runner.run_query = tunnel(query_runner.run_query)
 
     return query_runner
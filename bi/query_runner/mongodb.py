@@ -12,6 +12,14 @@ from bi.utils import json_dumps  # step 6
 from bi.utils import JSONEncoder  # step 6
 import re  # step 6
 import datetime
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from bi import settings
+from bi.query_runner.pool import pooling_enabled
 
 # step2
 try:
@@ -72,55 +80,122 @@ def parse_oids(oids):
     return [bson_object_hook({"$oid": oid}) for oid in oids]
 
 
+# def 6-f2-f2
+def _flatten_document(document, depth, prefix="", flat=None):
+    """Flatten nested documents into dotted column names, `depth` levels deep."""
+    if flat is None:
+        flat = {}
+
+    for key, value in document.items():
+        name = prefix + str(key)
+        if depth > 0 and isinstance(value, dict):
+            _flatten_document(value, depth - 1, name + ".", flat)
+        else:
+            flat[name] = value
+
+    return flat
+
+
 # def 6-f2
-def parse_results(results):
+def parse_results(results, depth=None):
+    if depth is None:
+        depth = settings.MONGODB_FLATTEN_DEPTH
+
     rows = []
-    columns = []
+    columns = {}
 
     for row in results:
-        parsed_row = {}
-
-        for key in row:
-            if isinstance(row[key], dict):
-                for inner_key in row[key]:
-                    column_name = "{}.{}".format(key, inner_key)
-                    if _get_column_by_name(columns, column_name) is None:
-                        columns.append(
-                            {
-                                "name": column_name,
-                                "friendly_name": column_name,
-                                "type": TYPES_MAP.get(
-                                    type(row[key][inner_key]), TYPE_STRING
-                                ),
-                            }
-                        )
-
-                    parsed_row[column_name] = row[key][inner_key]
+        parsed_row = _flatten_document(row, depth)
+
+        for column_name, value in parsed_row.items():
+            if column_name not in columns:
+                columns[column_name] = {
+                    "name": column_name,
+                    "friendly_name": column_name,
+                    "type": TYPES_MAP.get(type(value), TYPE_STRING),
+                }
 
-            else:
-                if _get_column_by_name(columns, key) is None:
-                    columns.append(
-                        {
-                            "name": key,
-                            "friendly_name": key,
-                            "type": TYPES_MAP.get(type(row[key]), TYPE_STRING),
-                        }
-                    )
+        rows.append(parsed_row)
 
-                parsed_row[key] = row[key]
+    return rows, list(columns.values())
+
+
+# MongoClient is thread safe and keeps its own socket pool and topology monitor, so one
+# client per connection string and credentials is shared by the whole process.
+class _CachedClient(object):
+    def __init__(self, client):
+        self.client = client
+        self.in_use = 0
+        self.last_used = time.time()
+
+
+_clients = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+
+def _client_key(connection_string, kwargs):
+    key = json_dumps([connection_string, kwargs], sort_keys=True)
+    return hashlib.md5(key.encode("utf-8")).hexdigest()
 
-        rows.append(parsed_row)
 
-    return rows, columns
+def _evict_idle_clients(now):
+    expired = [
+        key
+        for key, cached in _clients.items()
+        if cached.in_use == 0 and now - cached.last_used > settings.QUERY_RUNNER_POOL_MAX_IDLE
+    ]
+    return [_clients.pop(key).client for key in expired]
 
 
-# def 6-f2-f1
-def _get_column_by_name(columns, column_name):
-    for c in columns:
-        if "name" in c and c["name"] == column_name:
-            return c
+@contextmanager
+def cached_mongo_client(connection_string, **kwargs):
+    """Yield a shared MongoClient for the connection string and options.
 
-    return None
+    Clients unused for DEEPBI_QUERY_RUNNER_POOL_MAX_IDLE seconds are closed.
+    Clients created before a fork are not reused by the child, as MongoClient
+    isn't fork safe. RQ's default worker forks a work horse for every job and
+    closes its clients when the job ends (see `close_mongo_clients`), so the
+    cache only outlives a job in the web process and in workers started with
+    `rq worker --no-fork`.
+    """
+    global _clients_pid
+
+    key = _client_key(connection_string, kwargs)
+    now = time.time()
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+
+        expired = _evict_idle_clients(now)
+        cached = _clients.get(key)
+        if cached is None:
+            cached = _CachedClient(pymongo.MongoClient(connection_string, **kwargs))
+            _clients[key] = cached
+        cached.in_use += 1
+
+    for client in expired:
+        client.close()
+
+    try:
+        yield cached.client
+    finally:
+        with _clients_lock:
+            cached.in_use -= 1
+            cached.last_used = time.time()
+
+
+def close_mongo_clients():
+    """Close every cached MongoClient of this process."""
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            return
+        clients = [cached.client for cached in _clients.values()]
+        _clients.clear()
+
+    for client in clients:
+        client.close()
 
 
 # def 6-f3
@@ -199,7 +274,8 @@ class MongoDB(BaseQueryRunner):
     def test_connection(self):
         try:
             # Just try to establish a connection, don't execute any commands
-            db_connection = self._get_db()
+            with self._get_db() as db_connection:
+                pass
 
             # Log success
             logger.info("MongoDB connection test successful for %s", self.configuration["connectionString"])
@@ -210,7 +286,8 @@ class MongoDB(BaseQueryRunner):
             logger.error("MongoDB connection test failed: %s", str(e))
             raise Exception(f"MongoDB connection error: {str(e)}")
 
-    # step 4-2 The method being called， return connection obj
+    # step 4-2 The method being called， yields connection obj
+    @contextmanager
     def _get_db(self):
         kwargs = {}
         if self.is_replica_set:
@@ -229,51 +306,54 @@ class MongoDB(BaseQueryRunner):
 
         # Check if connection string already contains database name
         connection_string = self.configuration["connectionString"]
-        if connection_string.endswith('/' + self.db_name) or '/' + self.db_name + '?' in connection_string:
-            # Connection string already contains database name
-            db_connection = pymongo.MongoClient(connection_string, **kwargs)
-        else:
+        if not (connection_string.endswith('/' + self.db_name) or '/' + self.db_name + '?' in connection_string):
             # Append database name to connection string
-            db_connection = pymongo.MongoClient(
-                connection_string + "/" + self.db_name, **kwargs
-            )
+            connection_string = connection_string + "/" + self.db_name
+
+        if not pooling_enabled(self):
+            db_connection = pymongo.MongoClient(connection_string, **kwargs)
+            try:
+                yield db_connection[self.db_name]
+            finally:
+                db_connection.close()
+            return
 
-        # Log connection details for debugging
-        logger.debug("MongoDB connection established with: %s, timeouts: %s ms",
-                    connection_string, kwargs.get("serverSelectionTimeoutMS"))
+        with cached_mongo_client(connection_string, **kwargs) as db_connection:
+            # Log connection details for debugging
+            logger.debug("MongoDB client ready for: %s, timeouts: %s ms",
+                         self.configuration["connectionString"], kwargs.get("serverSelectionTimeoutMS"))
 
-        # return connect obj
-        return db_connection[self.db_name]
+            # yield connect obj
+            yield db_connection[self.db_name]
 
     # step 5 get schema
     def get_schema(self, get_stats=False):
         schema = {}
         try:
             logger.info("Getting schema for MongoDB database: %s", self.db_name)
-            db = self._get_db()  # get connect obj
-
-            # Get list of collections
-            collections = db.list_collection_names()
-            logger.info("Found %d collections in MongoDB database", len(collections))
-
-            # Process each collection
-            for collection_name in collections:
-                if collection_name.startswith("system."):
-                    logger.debug("Skipping system collection: %s", collection_name)
-                    continue
-
-                logger.info("Processing collection: %s", collection_name)
-                columns = self._get_collection_fields(db, collection_name)
-
-                if columns:
-                    logger.info("Found %d columns in collection %s", len(columns), collection_name)
-                    schema[collection_name] = {
-                        "name": collection_name,
-                        "columns": sorted(columns),
-                        "comment": sorted(columns)
-                    }
-                else:
-                    logger.warning("No columns found in collection %s", collection_name)
+            with self._get_db() as db:  # get connect obj
+                # Get list of collections
+                collections = db.list_collection_names()
+                logger.info("Found %d collections in MongoDB database", len(collections))
+
+                # Process each collection
+                for collection_name in collections:
+                    if collection_name.startswith("system."):
+                        logger.debug("Skipping system collection: %s", collection_name)
+                        continue
+
+                    logger.info("Processing collection: %s", collection_name)
+                    columns = self._get_collection_fields(db, collection_name)
+
+                    if columns:
+                        logger.info("Found %d columns in collection %s", len(columns), collection_name)
+                        schema[collection_name] = {
+                            "name": collection_name,
+                            "columns": sorted(columns),
+                            "comment": sorted(columns)
+                        }
+                    else:
+                        logger.warning("No columns found in collection %s", collection_name)
 
             # If no collections were found, add a default one for testing
             if not schema and self.db_name == "ev_data":
@@ -434,7 +514,10 @@ class MongoDB(BaseQueryRunner):
         """
         {"collection": "users", "fields": {"_id": 1, "name": 2}}
         """
-        db = self._get_db()
+        with self._get_db() as db:
+            return self._run_query(db, query)
+
+    def _run_query(self, db, query):
         logger.debug(
             "mongodb connection string: %s", self.configuration["connectionString"]
         )
@@ -472,6 +555,8 @@ class MongoDB(BaseQueryRunner):
             for field_data in query_data["sort"]:
                 s.append((field_data["name"], field_data["direction"]))
 
+        batch_size = query_data.get("batchSize", settings.MONGODB_BATCH_SIZE)
+
         columns = []
         rows = []
 
@@ -488,12 +573,16 @@ class MongoDB(BaseQueryRunner):
             if "limit" in query_data:
                 cursor = cursor.limit(query_data["limit"])
 
+            cursor = cursor.batch_size(batch_size)
+
             if "count" in query_data:
                 cursor = len(list(cursor))
 
         elif aggregate:
             allow_disk_use = query_data.get("allowDiskUse", False)
-            r = db[collection].aggregate(aggregate, allowDiskUse=allow_disk_use)
+            r = db[collection].aggregate(
+                aggregate, allowDiskUse=allow_disk_use, batchSize=batch_size
+            )
 
             # Backwards compatibility with older pymongo versions.
             #
@@ -512,16 +601,13 @@ class MongoDB(BaseQueryRunner):
 
             rows.append({"count": cursor})
         else:
-            rows, columns = parse_results(cursor)
+            rows, columns = parse_results(cursor, query_data.get("flattenDepth"))
 
         if f:
-            ordered_columns = []
-            for k in sorted(f, key=f.get):
-                column = _get_column_by_name(columns, k)
-                if column:
-                    ordered_columns.append(column)
-
-            columns = ordered_columns
+            columns_by_name = {c["name"]: c for c in columns}
+            columns = [
+                columns_by_name[k] for k in sorted(f, key=f.get) if k in columns_by_name
+            ]
 
         if query_data.get("sortColumns"):
             reverse = query_data["sortColumns"] == "desc"
@@ -1,6 +1,9 @@
 import logging
 import os
 import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from bi import settings
 
 from bi.query_runner import (
     TYPE_FLOAT,
@@ -11,8 +14,10 @@ from bi.query_runner import (
     BaseSQLQueryRunner,
     InterruptException,
     JobTimeoutException,
+    NotSupported,
     register,
 )
+from bi.query_runner.pool import PooledConnectionMixin
 from bi.settings import parse_boolean
 from bi.utils import json_dumps, json_loads
 
@@ -49,7 +54,7 @@ class Result(object):
         pass
 
 
-class Mysql(BaseSQLQueryRunner):
+class Mysql(PooledConnectionMixin, BaseSQLQueryRunner):
     noop_query = "SELECT 1"
 
     @classmethod
@@ -125,45 +130,172 @@ class Mysql(BaseSQLQueryRunner):
 
         return connection
 
+    def _new_connection(self):
+        return self._connection()
+
+    def _ping_connection(self, connection):
+        connection.ping()
+
+    def _reset_connection(self, connection):
+        # COM_CHANGE_USER gives the next query a fresh session: it rolls back the
+        # transaction and drops user variables, temporary tables, session
+        # variables (time_zone, sql_mode, ...) and any `USE` of the previous one.
+        connection.change_user(
+            self.configuration.get("user", ""),
+            self.configuration.get("passwd", ""),
+            self.configuration["db"],
+        )
+        connection.set_character_set(self.configuration.get("charset", "utf8"))
+        connection.autocommit(False)
+
 
     def _get_tables(self, schema):
         """
-        Retrieve schema information using SHOW TABLES and SHOW COLUMNS
-        instead of querying information_schema.
+        Read the whole schema (column names, types and comments) from
+        information_schema in a single query, falling back to concurrent
+        SHOW FULL COLUMNS reads when that view can't be used.
+        """
+        try:
+            found = self._get_tables_from_information_schema(schema)
+        except Exception as e:
+            logger.warning("Can't read information_schema.COLUMNS: %s", str(e))
+            found = False
+
+        if not found:
+            try:
+                self._get_tables_by_table(schema)
+            except Exception as e:
+                logger.error(f"Error in _get_tables: {str(e)}")
+
+        return list(schema.values())
+
+    @staticmethod
+    def _add_schema_column(schema, table_name, column_name, column_type, comment):
+        if table_name not in schema:
+            schema[table_name] = {"name": table_name, "columns": [], "comment": [], "types": []}
+
+        schema[table_name]["columns"].append(column_name)
+        schema[table_name]["comment"].append(comment or "")
+        schema[table_name]["types"].append(column_type)
+
+    def _get_tables_from_information_schema(self, schema):
+        query = """
+        SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, COLUMN_COMMENT
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = %s
+        ORDER BY TABLE_NAME, ORDINAL_POSITION
         """
+
+        rows = self._fetch_all(query, (self.configuration["db"],))
+
+        for table_name, column_name, column_type, comment in rows:
+            self._add_schema_column(schema, table_name, column_name, column_type, comment)
+
+        return len(rows) > 0
+
+    def _fetch_all(self, query, args=None):
+        connection = self._acquire_connection()
+        failed = True
         try:
-            connection = self._connection()
             cursor = connection.cursor()
+            cursor.execute(query, args)
+            rows = cursor.fetchall()
+            cursor.close()
+            failed = False
+        finally:
+            self._release_connection(connection, discard=failed)
+
+        return rows
+
+    def get_table_fingerprints(self):
+        # A checksum of every table's column definitions, computed server side.
+        query = """
+        SELECT TABLE_NAME,
+               COUNT(*),
+               SUM(CRC32(CONCAT_WS('|', ORDINAL_POSITION, COLUMN_NAME, COLUMN_TYPE, COLUMN_COMMENT)))
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = %s
+        GROUP BY TABLE_NAME
+        """
 
-            # Get list of tables
-            cursor.execute("SHOW TABLES")
-            tables = [row[0] for row in cursor.fetchall()]
+        try:
+            rows = self._fetch_all(query, (self.configuration["db"],))
+        except MySQLdb.Error as e:
+            logger.warning("Can't fingerprint tables: %s", str(e))
+            raise NotSupported()
+
+        if not rows:
+            # Either an empty database or no access to information_schema.
+            raise NotSupported()
+
+        return {table_name: "{}:{}".format(count, checksum) for table_name, count, checksum in rows}
 
-            # Get columns for each table
-            for table_name in tables:
-                if table_name not in schema:
-                    schema[table_name] = {"name": table_name, "columns": [], 'comment': []}
+    def get_tables_schema(self, table_names):
+        schema = {}
+        table_names = list(table_names)
 
+        for i in range(0, len(table_names), 500):
+            chunk = table_names[i:i + 500]
+            query = """
+            SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, COLUMN_COMMENT
+            FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = %s AND TABLE_NAME IN ({})
+            ORDER BY TABLE_NAME, ORDINAL_POSITION
+            """.format(", ".join(["%s"] * len(chunk)))
+
+            for table_name, column_name, column_type, comment in self._fetch_all(
+                query, [self.configuration["db"]] + chunk
+            ):
+                self._add_schema_column(schema, table_name, column_name, column_type, comment)
+
+        return list(schema.values())
+
+    def _get_table_columns(self, table_names):
+        columns = {}
+        connection = self._acquire_connection()
+        failed = True
+        try:
+            cursor = connection.cursor()
+            for table_name in table_names:
                 try:
-                    cursor.execute(f"SHOW COLUMNS FROM `{table_name}`")
-                    columns = [row[0] for row in cursor.fetchall()]
-
-                    for column in columns:
-                        schema[table_name]["columns"].append(column)
-                        # Since we can't easily get column comments with SHOW COLUMNS,
-                        # we'll just use empty strings
-                        schema[table_name]["comment"].append("")
-                except Exception as e:
+                    cursor.execute(f"SHOW FULL COLUMNS FROM `{table_name}`")
+                    # Field, Type, Collation, Null, Key, Default, Extra, Privileges, Comment
+                    columns[table_name] = [(row[0], row[1], row[8]) for row in cursor.fetchall()]
+                except MySQLdb.Error as e:
                     logger.error(f"Error getting columns for table {table_name}: {str(e)}")
+            cursor.close()
+            failed = False
+        finally:
+            self._release_connection(connection, discard=failed)
 
+        return columns
+
+    def _get_tables_by_table(self, schema):
+        connection = self._acquire_connection()
+        failed = True
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SHOW TABLES")
+            tables = [row[0] for row in cursor.fetchall()]
             cursor.close()
-            connection.close()
+            failed = False
+        finally:
+            self._release_connection(connection, discard=failed)
 
-        except Exception as e:
-            logger.error(f"Error in _get_tables: {str(e)}")
+        workers = max(1, min(settings.SCHEMA_FETCH_CONCURRENCY, len(tables)))
+        chunks = [tables[i::workers] for i in range(workers)]
 
-        return list(schema.values())
+        columns = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for chunk_columns in executor.map(self._get_table_columns, chunks):
+                columns.update(chunk_columns)
+
+        for table_name in tables:
+            if table_name not in schema:
+                schema[table_name] = {"name": table_name, "columns": [], "comment": [], "types": []}
 
+            for column_name, column_type, comment in columns.get(table_name, []):
+                self._add_schema_column(schema, table_name, column_name, column_type, comment)
 
     def run_query(self, query, user):
         ev = threading.Event()
@@ -172,7 +304,7 @@ class Mysql(BaseSQLQueryRunner):
         t = None
 
         try:
-            connection = self._connection()
+            connection = self._acquire_connection()
             thread_id = connection.thread_id()
             t = threading.Thread(
                 target=self._run_query, args=(query, user, connection, r, ev)
@@ -188,6 +320,8 @@ class Mysql(BaseSQLQueryRunner):
         return r.json_data, r.error
 
     def _run_query(self, query, user, connection, r, ev):
+        cursor = None
+        failed = True
         try:
             cursor = connection.cursor()
             logger.debug("MySQL running query: %s", query)
@@ -219,15 +353,15 @@ class Mysql(BaseSQLQueryRunner):
                 r.error = "No data was returned."
 
             cursor.close()
+            failed = False
         except MySQLdb.Error as e:
             if cursor:
                 cursor.close()
             r.json_data = None
             r.error = e.args[1]
         finally:
+            self._release_connection(connection, discard=failed)
             ev.set()
-            if connection:
-                connection.close()
 
     def _get_ssl_parameters(self):
         if not self.configuration.get("use_ssl"):
@@ -250,18 +384,18 @@ class Mysql(BaseSQLQueryRunner):
         error = None
 
         try:
-            connection = self._connection()
+            connection = self._acquire_connection()
             cursor = connection.cursor()
             query = "KILL %d" % (thread_id)
             logging.debug(query)
             cursor.execute(query)
+            cursor.close()
         except MySQLdb.Error as e:
             if cursor:
                 cursor.close()
             error = e.args[1]
         finally:
-            if connection:
-                connection.close()
+            self._release_connection(connection, discard=error is not None)
 
         return error
 
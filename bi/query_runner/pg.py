@@ -9,6 +9,8 @@ import psycopg2
 from psycopg2.extras import Range
 
 from bi.query_runner import *
+from bi.query_runner import NotSupported
+from bi.query_runner.pool import PooledConnectionMixin
 from bi.utils import JSONEncoder, json_dumps, json_loads
 
 logger = logging.getLogger(__name__)
@@ -76,6 +78,17 @@ def full_table_name(schema, name):
     return "{}.{}".format(schema, name)
 
 
+def full_table_names(rows):
+    return set(full_table_name(r["table_schema"], r["table_name"]) for r in rows)
+
+
+def schema_table_name(row, table_names):
+    """The name `build_schema` gives the table of `row`, given the `full_table_names` of all rows."""
+    if row["table_schema"] != "public" or row["table_name"] in table_names:
+        return full_table_name(row["table_schema"], row["table_name"])
+    return row["table_name"]
+
+
 def build_schema(query_result, schema):
     # By default we omit the public schema name from the table name. But there are
     # edge cases, where this might cause conflicts. For example:
@@ -84,21 +97,10 @@ def build_schema(query_result, schema):
     # (while this feels unlikely, this actually happened)
     # In this case if we omit the schema name for the public table, we will have
     # a conflict.
-    table_names = set(
-        map(
-            lambda r: full_table_name(r["table_schema"], r["table_name"]),
-            query_result["rows"],
-        )
-    )
+    table_names = full_table_names(query_result["rows"])
 
     for row in query_result["rows"]:
-        if row["table_schema"] != "public":
-            table_name = full_table_name(row["table_schema"], row["table_name"])
-        else:
-            if row["table_name"] in table_names:
-                table_name = full_table_name(row["table_schema"], row["table_name"])
-            else:
-                table_name = row["table_name"]
+        table_name = schema_table_name(row, table_names)
 
         if table_name not in schema:
             schema[table_name] = {"name": table_name, "columns": []}
@@ -136,8 +138,13 @@ def _get_ssl_config(configuration):
     return ssl_config
 
 
-class PostgreSQL(BaseSQLQueryRunner):
+class PostgreSQL(PooledConnectionMixin, BaseSQLQueryRunner):
     noop_query = "SELECT 1"
+    # Run (one by one, async connections are in autocommit mode) before a pooled
+    # connection is reused: end a transaction the query left open, then drop the
+    # session state (SET ROLE, search_path, settings, temp tables, prepared
+    # statements...) it may have changed.
+    reset_queries = ("ROLLBACK", "DISCARD ALL")
 
     @classmethod
     def configuration_schema(cls):
@@ -235,6 +242,32 @@ class PostgreSQL(BaseSQLQueryRunner):
 
         return list(schema.values())
 
+    def get_table_fingerprints(self):
+        query = """
+        SELECT s.nspname as table_schema,
+               c.relname as table_name,
+               md5(string_agg(a.attname || ':' || format_type(a.atttypid, a.atttypmod), ',' ORDER BY a.attnum)) as fingerprint
+        FROM pg_class c
+        JOIN pg_namespace s
+        ON c.relnamespace = s.oid
+        AND s.nspname NOT IN ('pg_catalog', 'information_schema')
+        JOIN pg_attribute a
+        ON a.attrelid = c.oid
+        AND a.attnum > 0
+        AND NOT a.attisdropped
+        WHERE c.relkind IN ('r', 'v', 'm', 'f', 'p')
+        GROUP BY 1, 2
+        """
+
+        results, error = self.run_query(query, None)
+        if error is not None:
+            raise NotSupported()
+
+        # Named like the tables of `_get_tables`.
+        rows = json_loads(results)["rows"]
+        table_names = full_table_names(rows)
+        return {schema_table_name(row, table_names): row["fingerprint"] for row in rows}
+
     def _get_connection(self):
         self.ssl_config = _get_ssl_config(self.configuration)
         connection = psycopg2.connect(
@@ -249,9 +282,34 @@ class PostgreSQL(BaseSQLQueryRunner):
 
         return connection
 
-    def run_query(self, query, user):
+    def _new_connection(self):
         connection = self._get_connection()
+        try:
+            _wait(connection, timeout=10)
+        finally:
+            # libpq has read the certificates once the connection is established.
+            _cleanup_ssl_certs(self.ssl_config)
+
+        return connection
+
+    def _ping_connection(self, connection):
+        cursor = connection.cursor()
+        cursor.execute(self.noop_query)
         _wait(connection, timeout=10)
+        cursor.close()
+
+    def _reset_connection(self, connection):
+        cursor = connection.cursor()
+        try:
+            for query in self.reset_queries:
+                cursor.execute(query)
+                _wait(connection, timeout=10)
+        finally:
+            cursor.close()
+
+    def run_query(self, query, user):
+        connection = self._acquire_connection()
+        failed = True
 
         cursor = connection.cursor()
 
@@ -274,6 +332,7 @@ class PostgreSQL(BaseSQLQueryRunner):
             else:
                 error = "Query completed but it returned no data."
                 json_data = None
+            failed = False
         except (select.error, OSError) as e:
             error = "Query interrupted. Please retry."
             json_data = None
@@ -284,13 +343,14 @@ class PostgreSQL(BaseSQLQueryRunner):
             connection.cancel()
             raise
         finally:
-            connection.close()
-            _cleanup_ssl_certs(self.ssl_config)
+            self._release_connection(connection, discard=failed)
 
         return json_data, error
 
 
 class Redshift(PostgreSQL):
+    # Redshift has no DISCARD
+    reset_queries = ("ROLLBACK", "RESET ALL")
     @classmethod
     def type(cls):
         return "redshift"
@@ -0,0 +1,196 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from bi import settings
+from bi.utils import json_dumps
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool(object):
+    """A small, thread safe pool of connections to a single data source.
+
+    Connections idle for longer than `max_idle` seconds are closed, and
+    connections idle for longer than `check_after` seconds are health checked
+    with `ping` before being handed out again. At most `max_size` idle
+    connections are kept; extra connections are closed when released.
+    """
+
+    def __init__(self, connect, ping=None, close=None, reset=None, max_size=5, max_idle=300, check_after=30):
+        self._connect = connect
+        self._ping = ping
+        self._close = close or (lambda connection: connection.close())
+        self._reset = reset
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _discard(self, connection):
+        try:
+            self._close(connection)
+        except Exception:
+            logger.debug("Failed closing pooled connection.", exc_info=True)
+
+    def _evict_expired(self, now):
+        expired = [c for c, released_at in self._idle if now - released_at > self.max_idle]
+        self._idle = [(c, released_at) for c, released_at in self._idle if now - released_at <= self.max_idle]
+        return expired
+
+    def acquire(self):
+        while True:
+            now = time.time()
+            with self._lock:
+                expired = self._evict_expired(now)
+                entry = self._idle.pop() if self._idle else None
+
+            for connection in expired:
+                self._discard(connection)
+
+            if entry is None:
+                return self._connect()
+
+            connection, released_at = entry
+            if self._ping is None or now - released_at < self.check_after:
+                return connection
+
+            try:
+                self._ping(connection)
+                return connection
+            except Exception:
+                logger.info("Dropping pooled connection that failed its health check.")
+                self._discard(connection)
+
+    def release(self, connection, discard=False):
+        if connection is None:
+            return
+
+        if not discard and self._reset is not None:
+            try:
+                self._reset(connection)
+            except Exception:
+                discard = True
+
+        if not discard:
+            with self._lock:
+                if len(self._idle) < self.max_size:
+                    self._idle.append((connection, time.time()))
+                    return
+
+        self._discard(connection)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+
+        for connection, _ in idle:
+            self._discard(connection)
+
+
+_pools = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+
+def _pool_key(query_runner):
+    configuration = query_runner.configuration
+    if hasattr(configuration, "to_json"):
+        configuration = configuration.to_json()
+    else:
+        configuration = json_dumps(configuration, sort_keys=True)
+
+    digest = hashlib.md5(configuration.encode("utf-8")).hexdigest()
+    return "{}:{}".format(query_runner.type(), digest)
+
+
+def get_connection_pool(query_runner, connect, **kwargs):
+    """Return the pool of this process for the runner's configuration.
+
+    Pools are keyed by runner type and the full configuration, so editing a
+    data source starts a new pool. Pools inherited from a parent process are
+    dropped (without closing the parent's sockets) after a fork.
+
+    RQ's default worker forks a work horse for every job, so there pooled
+    connections are only shared within a job and are closed when it ends
+    (see `close_connection_pools`). Start the worker with `--no-fork` to keep
+    them across jobs.
+    """
+    global _pools_pid
+
+    key = _pool_key(query_runner)
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(
+                connect,
+                max_size=settings.QUERY_RUNNER_POOL_SIZE,
+                max_idle=settings.QUERY_RUNNER_POOL_MAX_IDLE,
+                **kwargs
+            )
+            _pools[key] = pool
+
+    return pool
+
+
+def close_connection_pools():
+    """Close the idle connections of every pool of this process."""
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            return
+        pools = list(_pools.values())
+
+    for pool in pools:
+        pool.close()
+
+
+def pooling_enabled(query_runner):
+    return settings.QUERY_RUNNER_POOL_SIZE > 0 and query_runner.pool_connections
+
+
+class PooledConnectionMixin(object):
+    """Lets a query runner reuse connections from the worker's pool.
+
+    Runners implement `_new_connection` (and optionally `_ping_connection` and
+    `_reset_connection`) and use `_acquire_connection`/`_release_connection`
+    instead of opening and closing connections themselves.
+    """
+
+    def _new_connection(self):
+        raise NotImplementedError()
+
+    def _ping_connection(self, connection):
+        pass
+
+    def _reset_connection(self, connection):
+        pass
+
+    @property
+    def _connection_pool(self):
+        return get_connection_pool(
+            self,
+            self._new_connection,
+            ping=self._ping_connection,
+            reset=self._reset_connection,
+        )
+
+    def _acquire_connection(self):
+        if pooling_enabled(self):
+            return self._connection_pool.acquire()
+        return self._new_connection()
+
+    def _release_connection(self, connection, discard=False):
+        if connection is None:
+            return
+
+        if pooling_enabled(self):
+            self._connection_pool.release(connection, discard)
+        else:
+            connection.close()
@@ -13,6 +13,7 @@ from bi.query_runner import (
     JobTimeoutException,
     register,
 )
+from bi.query_runner.pool import PooledConnectionMixin
 from bi.settings import parse_boolean
 from bi.utils import json_dumps, json_loads
 
@@ -49,8 +50,11 @@ class Result(object):
         pass
 
 
-class StarRocks(BaseSQLQueryRunner):
+class StarRocks(PooledConnectionMixin, BaseSQLQueryRunner):
     noop_query = "SELECT 1"
+    # There's no reliable way to reset a StarRocks session for reuse, so session state
+    # (SET variables, `USE`, ...) of one query would leak into the next on a pooled connection.
+    pool_connections = False
 
     @classmethod
     def configuration_schema(cls):
@@ -125,14 +129,19 @@ class StarRocks(BaseSQLQueryRunner):
 
         return connection
 
+    def _new_connection(self):
+        return self._connection()
+
     def _get_tables(self, schema):
         query = """
         SELECT col.table_schema as table_schema,
                col.table_name as table_name,
                col.column_name as column_name,
+               col.column_type as column_type,
                col.column_comment as column_comment
         FROM `information_schema`.`columns` col
-        WHERE col.table_schema NOT IN ('information_schema', 'performance_schema', 'mysql', 'sys');
+        WHERE col.table_schema NOT IN ('information_schema', 'performance_schema', 'mysql', 'sys')
+        ORDER BY col.table_schema, col.table_name, col.ordinal_position;
         """
 
         results, error = self.run_query(query, None)
@@ -149,10 +158,11 @@ class StarRocks(BaseSQLQueryRunner):
                 table_name = row["table_name"]
 
             if table_name not in schema:
-                schema[table_name] = {"name": table_name, "columns": [], 'comment': []}
+                schema[table_name] = {"name": table_name, "columns": [], 'comment': [], "types": []}
 
             schema[table_name]["columns"].append(row["column_name"])
             schema[table_name]["comment"].append(row["column_comment"])
+            schema[table_name]["types"].append(row["column_type"])
 
         return list(schema.values())
 
@@ -164,7 +174,7 @@ class StarRocks(BaseSQLQueryRunner):
         t = None
 
         try:
-            connection = self._connection()
+            connection = self._acquire_connection()
             thread_id = connection.thread_id()
             t = threading.Thread(
                 target=self._run_query, args=(query, user, connection, r, ev)
@@ -180,6 +190,8 @@ class StarRocks(BaseSQLQueryRunner):
         return r.json_data, r.error
 
     def _run_query(self, query, user, connection, r, ev):
+        cursor = None
+        failed = True
         try:
             cursor = connection.cursor()
             logger.debug("Star Rocks running query: %s", query)
@@ -211,15 +223,15 @@ class StarRocks(BaseSQLQueryRunner):
                 r.error = "No data was returned."
 
             cursor.close()
+            failed = False
         except MySQLdb.Error as e:
             if cursor:
                 cursor.close()
             r.json_data = None
             r.error = e.args[1]
         finally:
+            self._release_connection(connection, discard=failed)
             ev.set()
-            if connection:
-                connection.close()
 
     def _get_ssl_parameters(self):
         if not self.configuration.get("use_ssl"):
@@ -242,18 +254,18 @@ class StarRocks(BaseSQLQueryRunner):
         error = None
 
         try:
-            connection = self._connection()
+            connection = self._acquire_connection()
             cursor = connection.cursor()
             query = "KILL %d" % (thread_id)
             logging.debug(query)
             cursor.execute(query)
+            cursor.close()
         except MySQLdb.Error as e:
             if cursor:
                 cursor.close()
             error = e.args[1]
         finally:
-            if connection:
-                connection.close()
+            self._release_connection(connection, discard=error is not None)
 
         return error
 
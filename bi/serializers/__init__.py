@@ -10,7 +10,7 @@ from rq.job import JobStatus
 from rq.timeouts import JobTimeoutException
 
 from bi import models
-from bi.permissions import has_access, view_only
+from bi.permissions import filter_accessible
 from bi.utils import json_loads
 from bi.models.parameterized_query import ParameterizedQuery
 
@@ -19,6 +19,8 @@ from .query_result import (
     serialize_query_result,
     serialize_query_result_to_dsv,
     serialize_query_result_to_xlsx,
+    stream_query_result_to_dsv,
+    stream_query_result_to_xlsx,
 )
 
 
@@ -215,16 +217,32 @@ def serialize_alert(alert, full=True):
     return d
 
 
-def serialize_dashboard(obj, with_widgets=False, user=None, with_favorite_state=True):
+def viewable_widget_ids(widgets, user):
+    """Ids of the `widgets` whose visualization `user` may see, with one access lookup for all."""
+    widgets = [w for w in widgets if w.visualization_id is not None]
+    queries = {w.visualization.query_rel.id: w.visualization.query_rel for w in widgets}
+    viewable_query_ids = {q.id for q in filter_accessible(queries.values(), user)}
+    return {w.id for w in widgets if w.visualization.query_rel.id in viewable_query_ids}
+
+
+def serialize_dashboard(
+    obj, with_widgets=False, user=None, with_favorite_state=True, dashboard_widgets=None
+):
+    """
+    Pass `dashboard_widgets` (see `Dashboard.widgets_with_queries`) to serialize
+    the widgets without loading them one by one.
+    """
     layout = json_loads(obj.layout)
 
     widgets = []
 
     if with_widgets:
-        for w in obj.widgets:
+        dashboard_widgets = list(obj.widgets if dashboard_widgets is None else dashboard_widgets)
+        viewable_ids = viewable_widget_ids(dashboard_widgets, user) if user else set()
+        for w in dashboard_widgets:
             if w.visualization_id is None:
                 widgets.append(serialize_widget(w))
-            elif user and has_access(w.visualization.query_rel, user, view_only):
+            elif w.id in viewable_ids:
                 widgets.append(serialize_widget(w))
             else:
                 widget = project(
@@ -1,5 +1,6 @@
 import io
 import csv
+import tempfile
 import xlsxwriter
 from funcy import rpartial, project
 from dateutil.parser import isoparse as parse_date
@@ -7,6 +8,10 @@ from bi.utils import json_loads, UnicodeWriter
 from bi.query_runner import TYPE_BOOLEAN, TYPE_DATE, TYPE_DATETIME
 from bi.authentication.org_resolving import current_org
 
+# Rows (CSV/TSV) and bytes (XLSX) per chunk of a streamed download.
+STREAM_CHUNK_ROWS = 1000
+STREAM_CHUNK_BYTES = 64 * 1024
+
 
 def _convert_format(fmt):
     return (
@@ -79,45 +84,106 @@ def serialize_query_result(query_result, is_api_user):
         return query_result.to_dict()
 
 
-def serialize_query_result_to_dsv(query_result, delimiter):
-    s = io.StringIO()
+def _result_columns(query_result):
+    """The column list of the result, read without decoding the rows of columnar results."""
+    if hasattr(query_result, "data_columns"):
+        return query_result.data_columns or []
+    return query_result.data["columns"] or []
 
-    query_data = query_result.data
 
-    fieldnames, special_columns = _get_column_lists(query_data["columns"] or [])
+def _iter_result_values(query_result, fieldnames):
+    """Yield every result row as a list of values ordered like `fieldnames`.
 
-    writer = csv.DictWriter(s, extrasaction="ignore", fieldnames=fieldnames, delimiter=delimiter)
-    writer.writeheader()
+    Results stored column-wise are zipped column by column, so no row
+    dictionaries get built for them.
+    """
+    if hasattr(query_result, "data_column") and fieldnames:
+        columns = [query_result.data_column(name) for name in fieldnames]
+        for values in zip(*columns):
+            yield list(values)
+        return
 
-    for row in query_data["rows"]:
-        for col_name, converter in special_columns.items():
-            if col_name in row:
-                row[col_name] = converter(row[col_name])
+    for row in query_result.data["rows"]:
+        yield [row.get(name) for name in fieldnames]
 
-        writer.writerow(row)
 
-    return s.getvalue()
+def stream_query_result_to_dsv(query_result, delimiter, chunk_size=STREAM_CHUNK_ROWS):
+    """Generate the delimiter separated export in chunks of `chunk_size` rows.
 
+    Column converters are resolved before the first chunk is produced, so this
+    must be called within the request (wrap the generator with
+    `stream_with_context` when streaming it).
+    """
+    fieldnames, special_columns = _get_column_lists(_result_columns(query_result))
+    converters = [special_columns.get(name) for name in fieldnames]
+    converted = [(i, c) for i, c in enumerate(converters) if c is not None]
 
-def serialize_query_result_to_xlsx(query_result):
-    output = io.BytesIO()
+    def generate():
+        s = io.StringIO()
+        writer = csv.writer(s, delimiter=delimiter)
+        writer.writerow(fieldnames)
+
+        for n, values in enumerate(_iter_result_values(query_result, fieldnames), 1):
+            for i, converter in converted:
+                values[i] = converter(values[i])
+            writer.writerow(values)
+
+            if n % chunk_size == 0:
+                yield s.getvalue()
+                s.seek(0)
+                s.truncate(0)
+
+        yield s.getvalue()
+
+    return generate()
+
+
+def serialize_query_result_to_dsv(query_result, delimiter):
+    return "".join(stream_query_result_to_dsv(query_result, delimiter))
 
-    query_data = query_result.data
+
+def _write_xlsx(query_result, output):
     book = xlsxwriter.Workbook(output, {"constant_memory": True})
     sheet = book.add_worksheet("result")
 
     column_names = []
-    for c, col in enumerate(query_data["columns"]):
+    for c, col in enumerate(_result_columns(query_result)):
         sheet.write(0, c, col["name"])
         column_names.append(col["name"])
 
-    for r, row in enumerate(query_data["rows"]):
-        for c, name in enumerate(column_names):
-            v = row.get(name)
+    for r, values in enumerate(_iter_result_values(query_result, column_names)):
+        for c, v in enumerate(values):
             if isinstance(v, (dict, list)):
                 v = str(v)
             sheet.write(r + 1, c, v)
 
     book.close()
 
+
+def stream_query_result_to_xlsx(query_result, chunk_size=STREAM_CHUNK_BYTES):
+    """Build the workbook in a temporary file and generate it in chunks.
+
+    xlsx is a zip archive that can only be finalized once all rows are
+    written, but with `constant_memory` the rows are flushed to disk as they
+    are written, so the worker never holds a full copy of the file.
+    """
+    output = tempfile.TemporaryFile()
+    try:
+        _write_xlsx(query_result, output)
+        output.seek(0)
+    except Exception:
+        output.close()
+        raise
+
+    def generate():
+        with output:
+            for chunk in iter(lambda: output.read(chunk_size), b""):
+                yield chunk
+
+    return generate()
+
+
+def serialize_query_result_to_xlsx(query_result):
+    output = io.BytesIO()
+    _write_xlsx(query_result, output)
     return output.getvalue()
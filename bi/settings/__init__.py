@@ -64,8 +64,46 @@ QUERY_RESULTS_CLEANUP_MAX_AGE = int(
     os.environ.get("DEEPBI_QUERY_RESULTS_CLEANUP_MAX_AGE", "7")
 )
 
+# How QueryResult data is stored: "json" (plain text) or "columnar" (compressed typed columns,
+# see bi.models.columnar). Results written in either format can always be read back. Columnar
+# results go to the query_results.data_columnar column; run `manage.py database create_tables`
+# to add it to an existing database before switching.
+QUERY_RESULTS_STORAGE = os.environ.get("DEEPBI_QUERY_RESULTS_STORAGE", "json")
+
+# Cache in front of QueryResult.get_latest: how long Redis remembers the newest result of a query
+# (seconds), and the per process budget of decoded results kept in memory (bytes of stored data,
+# 0 disables the in-memory tier).
+QUERY_RESULTS_INDEX_TTL = int(
+    os.environ.get("DEEPBI_QUERY_RESULTS_INDEX_TTL", 60 * 60 * 24 * 7)
+)
+QUERY_RESULTS_MEMORY_CACHE_BYTES = int(
+    os.environ.get("DEEPBI_QUERY_RESULTS_MEMORY_CACHE_BYTES", 64 * 1024 * 1024)
+)
+
+# Per process connection pools used by the MySQL and PostgreSQL query runners. They only outlive
+# a job in workers started with `rq worker --no-fork`; forked work horses close them when the job ends.
+# Set the pool size to 0 to open a new connection for every query.
+QUERY_RUNNER_POOL_SIZE = int(os.environ.get("DEEPBI_QUERY_RUNNER_POOL_SIZE", "5"))
+QUERY_RUNNER_POOL_MAX_IDLE = int(os.environ.get("DEEPBI_QUERY_RUNNER_POOL_MAX_IDLE", "300"))
+
+# MongoDB runner: documents fetched per round trip, and how many levels of nested documents are
+# flattened into dotted column names (both can be overridden per query with batchSize/flattenDepth).
+MONGODB_BATCH_SIZE = int(os.environ.get("DEEPBI_MONGODB_BATCH_SIZE", "1000"))
+MONGODB_FLATTEN_DEPTH = int(os.environ.get("DEEPBI_MONGODB_FLATTEN_DEPTH", "1"))
+
 SCHEMAS_REFRESH_SCHEDULE = int(os.environ.get("DEEPBI_SCHEMAS_REFRESH_SCHEDULE", 30))
 
+# Audit events are buffered in Redis and written to the database every EVENTS_FLUSH_INTERVAL seconds,
+# EVENTS_FLUSH_BATCH_SIZE events per INSERT.
+EVENTS_FLUSH_INTERVAL = int(os.environ.get("DEEPBI_EVENTS_FLUSH_INTERVAL", 10))
+EVENTS_FLUSH_BATCH_SIZE = int(os.environ.get("DEEPBI_EVENTS_FLUSH_BATCH_SIZE", 1000))
+
+# Scheduled queries are looked up in a Redis index of next due times; this is how often (in seconds)
+# the index is rebuilt from the database to pick up changes made outside of the application.
+SCHEDULE_INDEX_RECONCILE_INTERVAL = int(
+    os.environ.get("DEEPBI_SCHEDULE_INDEX_RECONCILE_INTERVAL", 60 * 60 * 24)
+)
+
 AUTH_TYPE = os.environ.get("DEEPBI_AUTH_TYPE", "api_key")
 INVITATION_TOKEN_MAX_AGE = int(
     os.environ.get("DEEPBI_INVITATION_TOKEN_MAX_AGE", 60 * 60 * 24 * 7)
@@ -461,6 +499,8 @@ ALLOW_PARAMETERS_IN_EMBEDS = parse_boolean(
 SCHEMA_RUN_TABLE_SIZE_CALCULATIONS = parse_boolean(
     os.environ.get("DEEPBI_SCHEMA_RUN_TABLE_SIZE_CALCULATIONS", "false")
 )
+# Connections used to read tables concurrently when a runner can't load its schema in one query.
+SCHEMA_FETCH_CONCURRENCY = int(os.environ.get("DEEPBI_SCHEMA_FETCH_CONCURRENCY", "4"))
 
 # kylin
 KYLIN_OFFSET = int(os.environ.get("DEEPBI_KYLIN_OFFSET", 0))
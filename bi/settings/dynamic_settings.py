@@ -26,6 +26,8 @@ def periodic_jobs():
 
 # This provides the ability to override the way we store QueryResult's data column.
 # Reference implementation: bi.models.DBPersistence
+# A compressed columnar implementation (bi.models.columnar.ColumnarPersistence) can be enabled
+# with DEEPBI_QUERY_RESULTS_STORAGE=columnar.
 QueryResultPersistence = None
 
 
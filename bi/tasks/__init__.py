@@ -1,10 +1,13 @@
 from .general import (
     record_event,
+    flush_events,
     send_mail,
     sync_user_details,
 )
 from .queries import (
     enqueue_query,
+    enqueue_queries,
+    EnqueueRequest,
     execute_query,
     refresh_queries,
     refresh_schemas,
@@ -14,7 +17,7 @@ from .queries import (
 )
 from .alerts import check_alerts_for_query
 from .failure_report import send_aggregated_errors
-from .worker import Worker, Queue, Job
+from .worker import Worker, SimpleWorker, Queue, Job
 from .schedule import rq_scheduler, schedule_periodic_jobs, periodic_job_definitions
 
 from bi import rq_redis_connection
@@ -13,8 +13,15 @@ logger = get_job_logger(__name__)
 
 @job("default")
 def record_event(raw_event):
-    event = models.Event.record(raw_event)
+    rows = models.Event.record_many([raw_event])
     models.db.session.commit()
+    models.recent_queries.record(rows)
+
+
+def flush_events():
+    flushed = models.events_buffer.flush()
+    if flushed:
+        logger.info("Recorded %d buffered events.", flushed)
 
 
 @job("emails")
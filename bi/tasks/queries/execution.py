@@ -7,7 +7,7 @@ from rq.job import JobStatus
 from rq.timeouts import JobTimeoutException
 from rq.exceptions import NoSuchJobError
 
-from bi import models, redis_connection, settings
+from bi import models, redis_connection, rq_redis_connection, settings
 from bi.query_runner import InterruptException
 from bi.tasks.worker import Queue, Job
 from bi.tasks.alerts import check_alerts_for_query
@@ -27,6 +27,40 @@ def _unlock(query_hash, data_source_id):
     redis_connection.delete(_job_lock_id(query_hash, data_source_id))
 
 
+def _job_options(data_source, user_id, is_api_key, scheduled_query, metadata):
+    if scheduled_query:
+        queue_name = data_source.scheduled_queue_name
+        scheduled_query_id = scheduled_query.id
+    else:
+        queue_name = data_source.queue_name
+        scheduled_query_id = None
+
+    time_limit = settings.dynamic_settings.query_time_limit(
+        scheduled_query, user_id, data_source.org_id
+    )
+    metadata["Queue"] = queue_name
+
+    enqueue_kwargs = {
+        "user_id": user_id,
+        "scheduled_query_id": scheduled_query_id,
+        "is_api_key": is_api_key,
+        "job_timeout": time_limit,
+        "failure_ttl": settings.JOB_DEFAULT_FAILURE_TTL,
+        "meta": {
+            "data_source_id": data_source.id,
+            "org_id": data_source.org_id,
+            "scheduled": scheduled_query_id is not None,
+            "query_id": metadata.get("query_id"),
+            "user_id": user_id,
+        },
+    }
+
+    if not scheduled_query:
+        enqueue_kwargs["result_ttl"] = settings.JOB_EXPIRY_TIME
+
+    return queue_name, enqueue_kwargs
+
+
 def enqueue_query(
     query, data_source, user_id, is_api_key=False, scheduled_query=None, metadata={}
 ):
@@ -72,37 +106,10 @@ def enqueue_query(
             if not job:
                 pipe.multi()
 
-                if scheduled_query:
-                    queue_name = data_source.scheduled_queue_name
-                    scheduled_query_id = scheduled_query.id
-                else:
-                    queue_name = data_source.queue_name
-                    scheduled_query_id = None
-
-                time_limit = settings.dynamic_settings.query_time_limit(
-                    scheduled_query, user_id, data_source.org_id
+                queue_name, enqueue_kwargs = _job_options(
+                    data_source, user_id, is_api_key, scheduled_query, metadata
                 )
-                metadata["Queue"] = queue_name
-
                 queue = Queue(queue_name)
-                enqueue_kwargs = {
-                    "user_id": user_id,
-                    "scheduled_query_id": scheduled_query_id,
-                    "is_api_key": is_api_key,
-                    "job_timeout": time_limit,
-                    "failure_ttl": settings.JOB_DEFAULT_FAILURE_TTL,
-                    "meta": {
-                        "data_source_id": data_source.id,
-                        "org_id": data_source.org_id,
-                        "scheduled": scheduled_query_id is not None,
-                        "query_id": metadata.get("query_id"),
-                        "user_id": user_id,
-                    },
-                }
-
-                if not scheduled_query:
-                    enqueue_kwargs["result_ttl"] = settings.JOB_EXPIRY_TIME
-
                 job = queue.enqueue(
                     execute_query, query, data_source.id, metadata, **enqueue_kwargs
                 )
@@ -125,6 +132,132 @@ def enqueue_query(
     return job
 
 
+class EnqueueRequest(object):
+    def __init__(
+        self, query, data_source, user_id, is_api_key=False, scheduled_query=None, metadata=None
+    ):
+        self.query = query
+        self.data_source = data_source
+        self.user_id = user_id
+        self.is_api_key = is_api_key
+        self.scheduled_query = scheduled_query
+        self.metadata = metadata if metadata is not None else {}
+        self.query_hash = gen_query_hash(query)
+        self.lock_id = _job_lock_id(self.query_hash, data_source.id)
+
+
+def _live_jobs(job_ids):
+    """Return the jobs of `job_ids` that are still pending, None for the others."""
+    jobs = Job.fetch_many(job_ids, connection=rq_redis_connection)
+
+    live = []
+    for job in jobs:
+        if job is not None and (
+            job.get_status(refresh=False) in [JobStatus.FINISHED, JobStatus.FAILED]
+            or job.is_cancelled
+        ):
+            job = None
+        live.append(job)
+    return live
+
+
+def enqueue_queries(requests):
+    """Bulk version of `enqueue_query` for a list of `EnqueueRequest`s.
+
+    The query locks of all requests are read with a single MGET and taken with
+    one pipeline of SET NX commands, and the new jobs are pushed to their queues
+    in one pipeline, so the number of Redis round trips doesn't grow with the
+    number of queries. Returns the jobs in the order of `requests` (None where
+    a job could not be enqueued).
+    """
+    if not requests:
+        return []
+
+    by_lock = {}
+    for request in requests:
+        by_lock.setdefault(request.lock_id, request)
+    lock_ids = list(by_lock.keys())
+
+    jobs = {}
+    locked_job_ids = redis_connection.mget(lock_ids)
+    existing = [(lock_id, job_id) for lock_id, job_id in zip(lock_ids, locked_job_ids) if job_id]
+
+    if existing:
+        live = _live_jobs([job_id for _, job_id in existing])
+        stale = []
+        for (lock_id, job_id), job in zip(existing, live):
+            if job is None:
+                stale.append(lock_id)
+            else:
+                logger.info("[%s] Found existing job: %s", by_lock[lock_id].query_hash, job_id)
+                jobs[lock_id] = job
+        if stale:
+            logger.info("Removing %d irrelevant query locks", len(stale))
+            redis_connection.delete(*stale)
+
+    pending = []
+    for lock_id in lock_ids:
+        if lock_id in jobs:
+            continue
+
+        request = by_lock[lock_id]
+        queue_name, enqueue_kwargs = _job_options(
+            request.data_source,
+            request.user_id,
+            request.is_api_key,
+            request.scheduled_query,
+            request.metadata,
+        )
+        queue = Queue(queue_name)
+        job = queue.create_job(
+            execute_query,
+            args=(request.query, request.data_source.id, request.metadata),
+            kwargs={
+                "user_id": enqueue_kwargs.pop("user_id"),
+                "scheduled_query_id": enqueue_kwargs.pop("scheduled_query_id"),
+                "is_api_key": enqueue_kwargs.pop("is_api_key"),
+            },
+            timeout=enqueue_kwargs.pop("job_timeout"),
+            **enqueue_kwargs
+        )
+        pending.append((lock_id, queue, job))
+
+    if pending:
+        pipe = redis_connection.pipeline()
+        for lock_id, _, job in pending:
+            pipe.set(lock_id, job.id, ex=settings.JOB_EXPIRY_TIME, nx=True)
+        acquired = pipe.execute()
+
+        # Locks we lost were taken by a concurrent enqueue; use its job instead.
+        raced = [lock_id for (lock_id, _, _), ok in zip(pending, acquired) if not ok]
+        pending = [entry for entry, ok in zip(pending, acquired) if ok]
+
+        try:
+            pipe = rq_redis_connection.pipeline()
+            for _, queue, job in pending:
+                queue.enqueue_job(job, pipeline=pipe)
+            pipe.execute()
+        except Exception:
+            redis_connection.delete(*[lock_id for lock_id, _, _ in pending])
+            raise
+
+        for lock_id, _, job in pending:
+            logger.info("[%s] Created new job: %s", by_lock[lock_id].query_hash, job.id)
+            jobs[lock_id] = job
+
+        if raced:
+            raced_job_ids = redis_connection.mget(raced)
+            found = [(lock_id, job_id) for lock_id, job_id in zip(raced, raced_job_ids) if job_id]
+            for (lock_id, _), job in zip(found, _live_jobs([job_id for _, job_id in found])):
+                jobs[lock_id] = job
+
+    for request in requests:
+        if jobs.get(request.lock_id) is None:
+            logger.error("[Manager][%s] Failed adding job for query.", request.query_hash)
+
+    return [jobs.get(request.lock_id) for request in requests]
+
+
 def signal_handler(*args):
     raise InterruptException
 
@@ -173,6 +306,7 @@ class QueryExecutor(object):
         if self.is_scheduled_query:
             # Load existing tracker or create a new one if the job was created before code update:
             models.scheduled_queries_executions.update(self.query_model.id)
+            models.scheduled_queries_index.touch(self.query_model.id)
 
     def run(self):
         signal.signal(signal.SIGINT, signal_handler)
@@ -239,6 +373,7 @@ class QueryExecutor(object):
             self._log_progress("finished")
 
             result = query_result.id
+            query_result.index_as_latest()
             models.db.session.commit()
             return result
 
@@ -12,7 +12,10 @@ from bi.utils import json_dumps, sentry
 from bi.worker import job, get_job_logger
 from bi.monitor import rq_job_ids
 
-from .execution import enqueue_query
+from .execution import EnqueueRequest, enqueue_queries
+
+# Number of scheduled queries whose jobs are enqueued per Redis round trip.
+ENQUEUE_BATCH_SIZE = 500
 
 logger = get_job_logger(__name__)
 
@@ -83,9 +86,16 @@ def _apply_auto_limit(query_text, query):
     )
 
 
+def _report_refresh_error(query, e):
+    message = "Could not enqueue query %d due to %s" % (query.id, repr(e))
+    logging.info(message)
+    error = RefreshQueriesError(message).with_traceback(e.__traceback__)
+    sentry.capture_exception(error)
+
+
 def refresh_queries():
     logger.info("Refreshing queries...")
-    enqueued = []
+    requests = []
     for query in models.Query.outdated_queries():
         if not _should_refresh_query(query):
             continue
@@ -93,19 +103,27 @@ def refresh_queries():
         try:
             query_text = _apply_default_parameters(query)
             query_text = _apply_auto_limit(query_text, query)
-            enqueue_query(
-                query_text,
-                query.data_source,
-                query.user_id,
-                scheduled_query=query,
-                metadata={"query_id": query.id, "Username": "Scheduled"},
+            requests.append(
+                EnqueueRequest(
+                    query_text,
+                    query.data_source,
+                    query.user_id,
+                    scheduled_query=query,
+                    metadata={"query_id": query.id, "Username": "Scheduled"},
+                )
             )
-            enqueued.append(query)
         except Exception as e:
-            message = "Could not enqueue query %d due to %s" % (query.id, repr(e))
-            logging.info(message)
-            error = RefreshQueriesError(message).with_traceback(e.__traceback__)
-            sentry.capture_exception(error)
+            _report_refresh_error(query, e)
+
+    enqueued = []
+    for offset in range(0, len(requests), ENQUEUE_BATCH_SIZE):
+        batch = requests[offset : offset + ENQUEUE_BATCH_SIZE]
+        try:
+            enqueue_queries(batch)
+            enqueued.extend(request.scheduled_query for request in batch)
+        except Exception as e:
+            for request in batch:
+                _report_refresh_error(request.scheduled_query, e)
 
     status = {
         "outdated_queries_count": len(enqueued),
@@ -168,7 +186,7 @@ def refresh_schema(data_source_id):
     logger.info(u"task=refresh_schema state=start ds_id=%s", ds.id)
     start_time = time.time()
     try:
-        ds.get_schema(refresh=True)
+        ds.refresh_schema()
         logger.info(
             u"task=refresh_schema state=finished ds_id=%s runtime=%.2f",
             ds.id,
@@ -10,6 +10,7 @@ from rq_scheduler import Scheduler
 from bi import settings, rq_redis_connection, statsd_client
 from bi.tasks import (
     sync_user_details,
+    flush_events,
     refresh_queries,
     remove_ghost_locks,
     empty_schedules,
@@ -76,6 +77,12 @@ def periodic_job_definitions():
             "interval": timedelta(minutes=1),
             "result_ttl": 600,
         },
+        {
+            "func": flush_events,
+            "timeout": 300,
+            "interval": settings.EVENTS_FLUSH_INTERVAL,
+            "result_ttl": 600,
+        },
         {
             "func": send_aggregated_errors,
             "interval": timedelta(minutes=settings.SEND_FAILURE_EMAIL_INTERVAL),
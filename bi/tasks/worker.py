@@ -3,8 +3,11 @@ import os
 import signal
 import time
 from bi import statsd_client
+from bi.query_runner.mongodb import close_mongo_clients
+from bi.query_runner.pool import close_connection_pools
 from rq import Queue as BaseQueue, get_current_job
 from rq.worker import HerokuWorker # HerokuWorker implements graceful shutdown on SIGTERM
+from rq.worker import SimpleWorker
 from rq.utils import utcnow
 from rq.timeouts import UnixSignalDeathPenalty, HorseMonitorTimeoutException
 from rq.job import Job as BaseJob, JobStatus
@@ -168,7 +171,30 @@ class HardLimitingWorker(HerokuWorker):
 class BiWorker(StatsdRecordingWorker, HardLimitingWorker):
     queue_class = BiQueue
 
+    def perform_job(self, *args, **kwargs):
+        try:
+            return super().perform_job(*args, **kwargs)
+        finally:
+            # The work horse exits after this job, so close its pooled connections cleanly.
+            close_connection_pools()
+            close_mongo_clients()
+
+
+class BiSimpleWorker(StatsdRecordingWorker, SimpleWorker):
+    """
+    Runs jobs in the worker process itself instead of a forked work horse, so
+    query runner connection pools (see bi.query_runner.pool) and cached MongoDB
+    clients are reused across jobs.
+
+    Without a work horse there is nothing for the parent to kill: jobs are only
+    stopped by the soft time limit, and cancelling a running job doesn't stop it.
+    """
+
+    queue_class = BiQueue
+    job_class = CancellableJob
+
 
 Job = CancellableJob
 Queue = BiQueue
 Worker = BiWorker
+SimpleWorker = BiSimpleWorker
@@ -0,0 +1,95 @@
+#!/bin/env python3
+"""Compare MongoDB result flattening against the previous implementation.
+
+Usage: python bin/benchmark_mongodb_parse_results.py [rows] [width]
+"""
+import random
+import sys
+import timeit
+
+from bi.query_runner.mongodb import TYPES_MAP, TYPE_STRING, parse_results
+
+
+def legacy_parse_results(results):
+    # The pre-registry implementation: a linear column lookup per key and a
+    # single level of flattening.
+    def get_column_by_name(columns, column_name):
+        for c in columns:
+            if "name" in c and c["name"] == column_name:
+                return c
+        return None
+
+    rows = []
+    columns = []
+
+    for row in results:
+        parsed_row = {}
+
+        for key in row:
+            if isinstance(row[key], dict):
+                for inner_key in row[key]:
+                    column_name = "{}.{}".format(key, inner_key)
+                    if get_column_by_name(columns, column_name) is None:
+                        columns.append(
+                            {
+                                "name": column_name,
+                                "friendly_name": column_name,
+                                "type": TYPES_MAP.get(type(row[key][inner_key]), TYPE_STRING),
+                            }
+                        )
+                    parsed_row[column_name] = row[key][inner_key]
+            else:
+                if get_column_by_name(columns, key) is None:
+                    columns.append(
+                        {
+                            "name": key,
+                            "friendly_name": key,
+                            "type": TYPES_MAP.get(type(row[key]), TYPE_STRING),
+                        }
+                    )
+                parsed_row[key] = row[key]
+
+        rows.append(parsed_row)
+
+    return rows, columns
+
+
+def wide_documents(count, width):
+    return [
+        {"field_{}".format(i): random.random() for i in range(width)}
+        for _ in range(count)
+    ]
+
+
+def nested_documents(count, width):
+    return [
+        {
+            "_id": n,
+            "event": {
+                "group_{}".format(g): {"value_{}".format(i): i for i in range(width // 10)}
+                for g in range(10)
+            },
+        }
+        for n in range(count)
+    ]
+
+
+def run(name, func, documents, repeat=3):
+    seconds = min(timeit.repeat(lambda: func(documents), number=1, repeat=repeat))
+    rows, columns = func(documents)
+    print("{:<34} {:>8.3f}s  {:>5} columns".format(name, seconds, len(columns)))
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    wide = wide_documents(count, width)
+    nested = nested_documents(count, width)
+
+    print("{} documents, {} fields each".format(count, width))
+    run("wide / legacy", legacy_parse_results, wide)
+    run("wide / indexed", parse_results, wide)
+    run("nested / legacy (depth 1)", legacy_parse_results, nested)
+    run("nested / indexed (depth 1)", lambda d: parse_results(d, 1), nested)
+    run("nested / indexed (depth 2)", lambda d: parse_results(d, 2), nested)
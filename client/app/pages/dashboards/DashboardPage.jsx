@@ -176,7 +176,11 @@ function DashboardPage({ dashboardSlug, dashboardId, onError,isShowReport }) {
   const handleError = useImmutableCallback(onError);
   
   useEffect(() => {
-    Dashboard.get({ id: dashboardId, slug: dashboardSlug })
+    // Dashboards opened by id load with their widgets' results in one request.
+    const loadDashboard = dashboardId
+      ? Dashboard.getBundle({ id: dashboardId })
+      : Dashboard.get({ id: dashboardId, slug: dashboardSlug });
+    loadDashboard
       .then(dashboardData => {
         recordEvent("view", "dashboard", dashboardData.id);
         setDashboard(dashboardData);
@@ -337,6 +337,8 @@ const handleSocketMessage = useCallback(() => {
       const data = JSON.parse(event.data);
 
       if (data.receiver === 'user') {
+        // Streamed frames carry the answer text so far; the answer is only complete with the regular frame after them.
+        const stream = data.data.stream;
         setState(prevState => ({
           ...prevState,
           messages: prevState.messages.map((message, i) =>
@@ -345,8 +347,13 @@ const handleSocketMessage = useCallback(() => {
               : message
           ),
         }));
-        setLoadingState(false);
+        if (!stream) {
+          setLoadingState(false);
+        }
         scrollToBottom();
+        if (stream) {
+          return;
+        }
       }
 
       if (data.state === 500) {
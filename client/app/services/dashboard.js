@@ -154,6 +154,18 @@ function transformResponse(data) {
   return data;
 }
 
+// The bundle also carries the latest results of the widgets' queries; hand them to the
+// widgets' queries so they don't each request their result again.
+function transformBundle({ dashboard, query_results: queryResults }) {
+  _.each(dashboard.widgets, widget => {
+    const query = _.get(widget, "visualization.query");
+    if (query && _.has(queryResults, query.latest_query_data_id)) {
+      query.latest_query_data = queryResults[query.latest_query_data_id];
+    }
+  });
+  return transformSingle(dashboard);
+}
+
 const saveOrCreateUrl = data => (data.id ? `api/dashboards/${data.id}` : "api/dashboards");
 const DashboardService = {
   get: ({ id, slug }) => {
@@ -163,6 +175,7 @@ const DashboardService = {
     }
     return axios.get(`api/dashboards/${id || slug}`, { params }).then(transformResponse);
   },
+  getBundle: ({ id }) => axios.get(`api/dashboards/${id}/bundle`).then(transformBundle),
   getByToken: ({ token }) => axios.get(`api/dashboards/public/${token}`).then(transformResponse),
   save: data => axios.post(saveOrCreateUrl(data), data).then(transformResponse),
   delete: ({ id }) => axios.delete(`api/dashboards/${id}`).then(transformResponse),
@@ -0,0 +1,33 @@
+import os
+from unittest import TestCase
+
+# The tests run against their own Redis database and a "tests" Postgres database
+# (see `make test_db`), which they wipe between tests.
+os.environ["DEEPBI_REDIS_URL"] = os.environ.get(
+    "DEEPBI_REDIS_URL", "redis://localhost:6379/0"
+).replace("/0", "/5")
+os.environ["RQ_REDIS_URL"] = os.environ["DEEPBI_REDIS_URL"]
+os.environ["DEEPBI_DATABASE_URL"] = os.environ.get(
+    "DEEPBI_DATABASE_URL", "postgresql://postgres@localhost/postgres"
+).replace("/postgres", "/tests")
+
+from bi import redis_connection  # noqa: E402
+from bi.app import create_app  # noqa: E402
+from bi.models import db  # noqa: E402
+
+
+class BaseTestCase(TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app_ctx = self.app.app_context()
+        self.app_ctx.push()
+        db.session.close()
+        db.drop_all()
+        db.create_all()
+        redis_connection.flushdb()
+
+    def tearDown(self):
+        db.session.remove()
+        db.get_engine(self.app).dispose()
+        self.app_ctx.pop()
+        redis_connection.flushdb()
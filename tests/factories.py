@@ -0,0 +1,72 @@
+from bi import models, utils
+from bi.utils.configuration import ConfigurationContainer
+
+
+def create_org(slug="default"):
+    org = models.Organization(name="Default", slug=slug, settings={})
+    models.db.session.add_all(
+        [
+            org,
+            models.Group(org=org, name="default", type=models.Group.BUILTIN_GROUP),
+            models.Group(
+                org=org, name="admin", type=models.Group.BUILTIN_GROUP, permissions=["admin"]
+            ),
+        ]
+    )
+    models.db.session.commit()
+    return org
+
+
+def create_user(org, **kwargs):
+    user = models.User(
+        org=org,
+        name=kwargs.pop("name", "John Doe"),
+        email=kwargs.pop("email", "john@example.com"),
+        group_ids=kwargs.pop("group_ids", [org.default_group.id]),
+        **kwargs
+    )
+    models.db.session.add(user)
+    models.db.session.commit()
+    return user
+
+
+def create_data_source(org, **kwargs):
+    data_source = models.DataSource.create_with_group(
+        org=org,
+        name=kwargs.pop("name", "Test"),
+        type=kwargs.pop("type", "pg"),
+        options=ConfigurationContainer({"dbname": "test"}),
+        **kwargs
+    )
+    models.db.session.commit()
+    return data_source
+
+
+def create_query(org, user, data_source, **kwargs):
+    query = models.Query(
+        org=org,
+        user=user,
+        data_source=data_source,
+        name=kwargs.pop("name", "Query"),
+        query_text=kwargs.pop("query_text", "SELECT 1"),
+        **kwargs
+    )
+    models.db.session.add(query)
+    models.db.session.commit()
+    return query
+
+
+def create_query_result(org, data_source, query_text="SELECT 1", **kwargs):
+    query_result = models.QueryResult(
+        org=org,
+        data_source=data_source,
+        query_text=query_text,
+        query_hash=utils.gen_query_hash(query_text),
+        data=kwargs.pop("data", '{"columns": [], "rows": []}'),
+        runtime=kwargs.pop("runtime", 1),
+        retrieved_at=kwargs.pop("retrieved_at", utils.utcnow()),
+        **kwargs
+    )
+    models.db.session.add(query_result)
+    models.db.session.commit()
+    return query_result
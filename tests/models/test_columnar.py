@@ -0,0 +1,134 @@
+from unittest import TestCase
+
+from bi.models import DBPersistence
+from bi.models.columnar import (
+    COLUMNAR_PREFIX,
+    ColumnarPersistence,
+    ColumnarReader,
+    encode_query_result_data,
+)
+from bi.utils import json_dumps
+
+
+class JSONResult(DBPersistence):
+    def __init__(self):
+        self._data = None
+        self._data_columnar = None
+
+
+class ColumnarResult(ColumnarPersistence):
+    def __init__(self):
+        self._data = None
+        self._data_columnar = None
+
+
+def make_data():
+    columns = [
+        {"name": "id", "type": "integer"},
+        {"name": "price", "type": "float"},
+        {"name": "active", "type": "boolean"},
+        {"name": "city", "type": "string"},
+        {"name": "mixed", "type": "string"},
+    ]
+    rows = [
+        {"id": 1, "price": 1.5, "active": True, "city": "北京", "mixed": 1},
+        {"id": None, "price": None, "active": None, "city": None, "mixed": "a"},
+        {"id": 2 ** 40, "price": -3.25, "active": False, "city": "上海", "mixed": None},
+        {"id": 3, "city": "北京"},
+    ]
+    return {"columns": columns, "rows": rows}
+
+
+class TestColumnarEncoding(TestCase):
+    def test_round_trip(self):
+        data = make_data()
+        reader = ColumnarReader(encode_query_result_data(data))
+
+        self.assertEqual(reader.row_count, 4)
+        self.assertEqual(reader.to_dict(), data)
+
+    def test_decodes_single_columns(self):
+        reader = ColumnarReader(encode_query_result_data(make_data()))
+
+        self.assertEqual(reader.column("id"), [1, None, 2 ** 40, 3])
+        self.assertEqual(reader.column("city"), ["北京", None, "上海", "北京"])
+        self.assertEqual(reader.column("active"), [True, None, False, None])
+
+    def test_round_trip_without_rows(self):
+        data = {"columns": [{"name": "a"}], "rows": []}
+        self.assertEqual(ColumnarReader(encode_query_result_data(data)).to_dict(), data)
+
+    def test_rejects_unexpected_shapes(self):
+        columns = [{"name": "a"}]
+        self.assertIsNone(encode_query_result_data({"columns": columns, "rows": [], "extra": 1}))
+        self.assertIsNone(encode_query_result_data({"columns": columns, "rows": [[1]]}))
+        self.assertIsNone(encode_query_result_data({"columns": columns, "rows": [{"b": 1}]}))
+        self.assertIsNone(encode_query_result_data({"columns": columns * 2, "rows": []}))
+
+    def test_compresses_repetitive_results(self):
+        data = {
+            "columns": [{"name": "n"}, {"name": "s"}],
+            "rows": [{"n": i % 7, "s": "value {}".format(i % 5)} for i in range(10000)],
+        }
+        self.assertLess(len(encode_query_result_data(data)), len(json_dumps(data)) / 10)
+
+
+class TestColumnarPersistence(TestCase):
+    def test_stores_binary_payload(self):
+        result = ColumnarResult()
+        result.data = json_dumps(make_data())
+
+        self.assertEqual(result._data, COLUMNAR_PREFIX)
+        self.assertIsInstance(result._data_columnar, bytes)
+        self.assertEqual(result.data, make_data())
+
+    def test_reads_columns_without_building_rows(self):
+        result = ColumnarResult()
+        result.data = make_data()
+
+        stored = ColumnarResult()
+        stored._data, stored._data_columnar = result._data, result._data_columnar
+
+        self.assertEqual(stored.data_row_count, 4)
+        self.assertEqual(stored.data_columns, make_data()["columns"])
+        self.assertEqual(stored.data_column("price"), [1.5, None, -3.25, None])
+        self.assertFalse(hasattr(stored, "_deserialized_data"))
+
+    def test_falls_back_to_json(self):
+        data = {"columns": [{"name": "a"}], "rows": [[1]]}
+        result = ColumnarResult()
+        result.data = json_dumps(data)
+
+        self.assertEqual(result._data, json_dumps(data))
+        self.assertIsNone(result._data_columnar)
+        self.assertEqual(result.data, data)
+
+    def test_reads_json_results(self):
+        result = ColumnarResult()
+        result._data = json_dumps(make_data())
+
+        self.assertEqual(result.data, make_data())
+        self.assertEqual(result.data_column("id"), [1, None, 2 ** 40, 3])
+        self.assertEqual(result.data_row_count, 4)
+
+
+class TestMixedPersistence(TestCase):
+    def test_json_persistence_reads_columnar_results(self):
+        columnar = ColumnarResult()
+        columnar.data = make_data()
+
+        result = JSONResult()
+        result._data, result._data_columnar = columnar._data, columnar._data_columnar
+
+        self.assertEqual(result.data, make_data())
+
+    def test_json_persistence_clears_columnar_payload(self):
+        columnar = ColumnarResult()
+        columnar.data = make_data()
+
+        result = JSONResult()
+        result._data, result._data_columnar = columnar._data, columnar._data_columnar
+        result.data = json_dumps({"columns": [], "rows": []})
+
+        self.assertIsNone(result._data_columnar)
+        self.assertEqual(result.data, {"columns": [], "rows": []})
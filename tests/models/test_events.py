@@ -0,0 +1,64 @@
+import time
+from unittest import mock
+
+from bi import models, redis_connection
+from bi.models import events_buffer
+from tests import BaseTestCase
+from tests.factories import create_org, create_user
+
+
+class TestEventsBuffer(BaseTestCase):
+    def setUp(self):
+        super(TestEventsBuffer, self).setUp()
+        self.org = create_org()
+        self.user = create_user(self.org)
+
+    def push(self, action="view", **kwargs):
+        event = {
+            "org_id": self.org.id,
+            "user_id": self.user.id,
+            "action": action,
+            "object_type": "dashboard",
+            "object_id": "1",
+            "timestamp": int(time.time()),
+        }
+        event.update(kwargs)
+        events_buffer.push(event)
+
+    def test_flushes_in_batches(self):
+        for _ in range(5):
+            self.push()
+
+        self.assertEqual(events_buffer.flush(batch_size=2), 5)
+
+        self.assertEqual(models.Event.query.count(), 5)
+        self.assertFalse(redis_connection.exists(events_buffer.KEY_NAME))
+        self.assertFalse(redis_connection.exists(events_buffer.FLUSHING_KEY_NAME))
+
+    def test_flush_without_events(self):
+        self.assertEqual(events_buffer.flush(), 0)
+
+    def test_failed_batch_is_retried(self):
+        for _ in range(3):
+            self.push()
+
+        with mock.patch.object(models.db.session, "commit", side_effect=Exception("down")):
+            with self.assertRaises(Exception):
+                events_buffer.flush(batch_size=2)
+        models.db.session.rollback()
+        self.push("edit")
+
+        self.assertEqual(events_buffer.flush(batch_size=2), 3)
+        self.assertEqual(events_buffer.flush(batch_size=2), 1)
+        self.assertEqual(models.Event.query.count(), 4)
+
+    def test_skips_while_another_flush_runs(self):
+        self.push()
+        lock = redis_connection.lock(events_buffer.LOCK_KEY_NAME, timeout=60)
+        lock.acquire()
+
+        self.assertEqual(events_buffer.flush(), 0)
+        self.assertEqual(models.Event.query.count(), 0)
+
+        lock.release()
+        self.assertEqual(events_buffer.flush(), 1)
@@ -0,0 +1,136 @@
+import datetime
+from unittest import TestCase
+
+from bi import models, utils
+from bi.models import result_cache
+from tests import BaseTestCase
+from tests.factories import create_data_source, create_org, create_query_result
+
+
+class TestQueryResultGetLatest(BaseTestCase):
+    def setUp(self):
+        super(TestQueryResultGetLatest, self).setUp()
+        result_cache.memory_cache.clear()
+        self.org = create_org()
+        self.data_source = create_data_source(self.org)
+
+    def test_indexes_result_found_in_database(self):
+        query_result = create_query_result(self.org, self.data_source)
+
+        found = models.QueryResult.get_latest(self.data_source, "SELECT 1", max_age=60)
+
+        self.assertEqual(found.id, query_result.id)
+        entry = result_cache.get_index_entry(self.data_source.id, query_result.query_hash)
+        self.assertEqual(entry.id, query_result.id)
+
+    def test_returns_none_without_fresh_result(self):
+        create_query_result(
+            self.org,
+            self.data_source,
+            retrieved_at=utils.utcnow() - datetime.timedelta(hours=1),
+        )
+
+        self.assertIsNone(models.QueryResult.get_latest(self.data_source, "SELECT 1", max_age=60))
+
+    def test_stale_index_entry_falls_through_to_database(self):
+        old = create_query_result(
+            self.org,
+            self.data_source,
+            retrieved_at=utils.utcnow() - datetime.timedelta(hours=1),
+        )
+        old.index_as_latest()
+        # Stored without going through the executor, so not indexed.
+        new = create_query_result(self.org, self.data_source)
+
+        found = models.QueryResult.get_latest(self.data_source, "SELECT 1", max_age=60)
+
+        self.assertEqual(found.id, new.id)
+        entry = result_cache.get_index_entry(self.data_source.id, new.query_hash)
+        self.assertEqual(entry.id, new.id)
+
+    def test_drops_entry_of_deleted_result(self):
+        query_result = create_query_result(self.org, self.data_source)
+        query_result.index_as_latest()
+        models.db.session.delete(query_result)
+        models.db.session.commit()
+
+        self.assertIsNone(models.QueryResult.get_latest(self.data_source, "SELECT 1", max_age=60))
+        self.assertIsNone(result_cache.get_index_entry(self.data_source.id, query_result.query_hash))
+
+    def test_index_keeps_newest_result(self):
+        new = create_query_result(self.org, self.data_source)
+        old = create_query_result(
+            self.org,
+            self.data_source,
+            retrieved_at=utils.utcnow() - datetime.timedelta(hours=1),
+        )
+        new.index_as_latest()
+        old.index_as_latest()
+
+        entry = result_cache.get_index_entry(self.data_source.id, new.query_hash)
+        self.assertEqual(entry.id, new.id)
+
+    def test_get_latest_cached_serves_from_memory(self):
+        query_result = create_query_result(
+            self.org, self.data_source, data='{"columns": [{"name": "a"}], "rows": [{"a": 1}]}'
+        )
+
+        cached = models.QueryResult.get_latest_cached(self.data_source, "SELECT 1", max_age=60)
+        self.assertEqual(cached.id, query_result.id)
+
+        models.db.session.delete(query_result)
+        models.db.session.commit()
+
+        cached = models.QueryResult.get_latest_cached(self.data_source, "SELECT 1", max_age=60)
+        self.assertEqual(cached.data["rows"], [{"a": 1}])
+
+    def test_iter_many_cached(self):
+        first = create_query_result(self.org, self.data_source, query_text="SELECT 1")
+        second = create_query_result(self.org, self.data_source, query_text="SELECT 2")
+
+        results = dict(models.QueryResult.iter_many_cached([first.id, second.id, first.id]))
+
+        self.assertEqual(set(results), {first.id, second.id})
+        self.assertIs(result_cache.memory_cache.get(first.id), results[first.id])
+
+    def test_iter_many_cached_keeps_results_until_max_age(self):
+        old = create_query_result(
+            self.org,
+            self.data_source,
+            retrieved_at=utils.utcnow() - datetime.timedelta(hours=1),
+        )
+
+        results = dict(models.QueryResult.iter_many_cached([old.id], max_age=60))
+
+        self.assertEqual(set(results), {old.id})
+        self.assertIsNone(result_cache.memory_cache.get(old.id))
+
+
+class TestResultMemoryCache(TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = result_cache.ResultMemoryCache(max_bytes=200)
+        cache.put(1, "one", 45, 60)
+        cache.put(2, "two", 45, 60)
+        cache.get(1)
+        cache.put(3, "three", 45, 60)
+        cache.put(4, "four", 45, 60)
+        cache.put(5, "five", 45, 60)
+
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(1), "one")
+        self.assertEqual(cache.get(5), "five")
+
+    def test_expires_entries(self):
+        cache = result_cache.ResultMemoryCache(max_bytes=100)
+        cache.put(1, "one", 10, -1)
+        cache.put(2, "two", 10, 0.001)
+        cache._entries[2] = (0, 10, "two")
+
+        self.assertIsNone(cache.get(1))
+        self.assertIsNone(cache.get(2))
+
+    def test_skips_big_results(self):
+        cache = result_cache.ResultMemoryCache(max_bytes=100)
+        cache.put(1, "one", 26, 60)
+
+        self.assertIsNone(cache.get(1))
@@ -0,0 +1,89 @@
+import datetime
+import time
+from unittest import mock
+
+from bi import models, redis_connection, utils
+from bi.models import events_buffer, recent_queries
+from tests import BaseTestCase
+from tests.factories import create_data_source, create_org, create_query, create_user
+
+
+class TestRecentQueries(BaseTestCase):
+    def setUp(self):
+        super(TestRecentQueries, self).setUp()
+        self.org = create_org()
+        self.user = create_user(self.org)
+        self.data_source = create_data_source(self.org)
+        self.group_ids = [self.org.default_group.id]
+
+    def push(self, query, action="execute", user=None):
+        events_buffer.push(
+            {
+                "org_id": self.org.id,
+                "user_id": (user or self.user).id,
+                "action": action,
+                "object_type": "query",
+                "object_id": str(query.id),
+                "timestamp": int(time.time()),
+            }
+        )
+
+    def test_counts_flushed_events(self):
+        first = create_query(self.org, self.user, self.data_source)
+        second = create_query(self.org, self.user, self.data_source, query_text="SELECT 2")
+        self.push(first)
+        self.push(second)
+        self.push(second, "edit")
+        self.push(first, "view")
+        events_buffer.flush()
+
+        self.assertEqual(models.Query.recent(self.group_ids), [second, first])
+        self.assertEqual(models.Query.recent(self.group_ids, self.user.id), [second, first])
+
+    def test_hides_archived_queries(self):
+        query = create_query(self.org, self.user, self.data_source)
+        self.push(query)
+        events_buffer.flush()
+
+        query.is_archived = True
+        models.db.session.commit()
+
+        self.assertEqual(models.Query.recent(self.group_ids), [])
+
+    def test_rebuilds_from_events_table(self):
+        query = create_query(self.org, self.user, self.data_source)
+        old = create_query(self.org, self.user, self.data_source, query_text="SELECT 2")
+        models.db.session.add_all(
+            [
+                models.Event(
+                    org=self.org,
+                    user=self.user,
+                    action="execute",
+                    object_type="query",
+                    object_id=str(query.id),
+                    created_at=utils.utcnow(),
+                ),
+                models.Event(
+                    org=self.org,
+                    user=self.user,
+                    action="execute",
+                    object_type="query",
+                    object_id=str(old.id),
+                    created_at=utils.utcnow() - datetime.timedelta(days=30),
+                ),
+            ]
+        )
+        models.db.session.commit()
+
+        self.assertEqual(models.Query.recent(self.group_ids, self.user.id), [query])
+        self.assertTrue(redis_connection.exists(recent_queries.BUILT_KEY_NAME))
+
+    def test_flush_keeps_events_when_counting_fails(self):
+        query = create_query(self.org, self.user, self.data_source)
+        self.push(query)
+
+        with mock.patch.object(recent_queries, "record", side_effect=Exception("down")):
+            self.assertEqual(events_buffer.flush(), 1)
+
+        self.assertEqual(events_buffer.flush(), 0)
+        self.assertEqual(models.Event.query.count(), 1)
@@ -0,0 +1,92 @@
+import datetime
+
+from bi import models, redis_connection, utils
+from bi.models import scheduled_queries_index
+from tests import BaseTestCase
+from tests.factories import (
+    create_data_source,
+    create_org,
+    create_query,
+    create_query_result,
+    create_user,
+)
+
+
+def schedule(interval=600, **kwargs):
+    return dict({"interval": interval, "time": None, "day_of_week": None, "until": None}, **kwargs)
+
+
+class TestScheduledQueriesIndex(BaseTestCase):
+    def setUp(self):
+        super(TestScheduledQueriesIndex, self).setUp()
+        self.org = create_org()
+        self.user = create_user(self.org)
+        self.data_source = create_data_source(self.org)
+        # Pretend the index was rebuilt, so `due` doesn't reconcile it from the database.
+        redis_connection.set(scheduled_queries_index.RECONCILED_KEY_NAME, 1)
+
+    def score(self, query):
+        return redis_connection.zscore(scheduled_queries_index.KEY_NAME, query.id)
+
+    def test_touches_query_on_commit(self):
+        query = models.Query(
+            org=self.org,
+            user=self.user,
+            data_source=self.data_source,
+            name="Query",
+            query_text="SELECT 1",
+            schedule=schedule(),
+        )
+        models.db.session.add(query)
+        models.db.session.flush()
+        self.assertIsNone(self.score(query))
+
+        models.db.session.commit()
+        self.assertEqual(self.score(query), 0)
+
+    def test_rollback_leaves_index_alone(self):
+        query = create_query(self.org, self.user, self.data_source)
+
+        query.schedule = schedule()
+        models.db.session.flush()
+        models.db.session.rollback()
+        models.db.session.commit()
+
+        self.assertIsNone(self.score(query))
+
+    def test_outdated_queries(self):
+        retrieved_at = utils.utcnow() - datetime.timedelta(hours=1)
+        due = create_query(self.org, self.user, self.data_source, schedule=schedule())
+        due.latest_query_data = create_query_result(
+            self.org, self.data_source, retrieved_at=retrieved_at
+        )
+        later = create_query(
+            self.org, self.user, self.data_source, query_text="SELECT 2", schedule=schedule(7200)
+        )
+        later.latest_query_data = create_query_result(
+            self.org, self.data_source, query_text="SELECT 2", retrieved_at=retrieved_at
+        )
+        disabled = create_query(
+            self.org,
+            self.user,
+            self.data_source,
+            query_text="SELECT 3",
+            schedule=schedule(disabled=True),
+        )
+        models.db.session.commit()
+
+        self.assertEqual(models.Query.outdated_queries(), [due])
+        self.assertEqual(self.score(due), 0)
+        self.assertAlmostEqual(
+            self.score(later), (retrieved_at + datetime.timedelta(hours=2)).timestamp(), places=0
+        )
+        self.assertIsNone(self.score(disabled))
+
+    def test_due_reconciles_missing_index(self):
+        query = create_query(self.org, self.user, self.data_source, schedule=schedule())
+        redis_connection.delete(
+            scheduled_queries_index.KEY_NAME, scheduled_queries_index.RECONCILED_KEY_NAME
+        )
+
+        self.assertEqual(scheduled_queries_index.due(utils.utcnow()), [query.id])
+        self.assertTrue(redis_connection.exists(scheduled_queries_index.RECONCILED_KEY_NAME))
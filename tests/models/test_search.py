@@ -0,0 +1,84 @@
+from unittest import TestCase
+
+from sqlalchemy.dialects import postgresql
+
+from bi import models
+from bi.models.base import search_bigrams, substring_match
+from tests import BaseTestCase
+from tests.factories import create_data_source, create_org, create_query, create_user
+
+
+class TestSearchBigrams(TestCase):
+    def test_characters_and_pairs(self):
+        self.assertEqual(search_bigrams("销售额"), ["售", "售额", "销", "销售", "额"])
+
+    def test_lower_cases_and_skips_whitespace(self):
+        self.assertEqual(search_bigrams("A b", None), ["a", "b"])
+
+
+class TestMultiByteSearch(BaseTestCase):
+    def setUp(self):
+        super(TestMultiByteSearch, self).setUp()
+        self.org = create_org()
+        self.user = create_user(self.org)
+        self.data_source = create_data_source(self.org)
+        self.group_ids = [self.org.default_group.id]
+
+    def search_queries(self, term):
+        return list(
+            models.Query.search(
+                term, self.group_ids, self.user.id, include_drafts=True, multi_byte_search=True
+            )
+        )
+
+    def create_dashboard(self, name):
+        dashboard = models.Dashboard(
+            org=self.org, user=self.user, name=name, layout="[]", version=1, is_draft=False
+        )
+        models.db.session.add(dashboard)
+        models.db.session.commit()
+        return dashboard
+
+    def test_finds_queries_by_short_terms(self):
+        sales = create_query(self.org, self.user, self.data_source, name="月度销售报表")
+        stock = create_query(
+            self.org, self.user, self.data_source, name="Stock", description="库存明细"
+        )
+
+        self.assertEqual(self.search_queries("销售"), [sales])
+        self.assertEqual(self.search_queries("存"), [stock])
+        self.assertEqual(self.search_queries("报表"), [sales])
+
+    def test_finds_queries_by_long_terms(self):
+        sales = create_query(
+            self.org, self.user, self.data_source, name="Sales", query_text="SELECT 销售额 FROM t"
+        )
+
+        self.assertEqual(self.search_queries("销售额"), [sales])
+
+    def test_keeps_bigrams_up_to_date(self):
+        query = create_query(self.org, self.user, self.data_source, name="销售")
+        query.name = "库存"
+        models.db.session.commit()
+
+        self.assertEqual(self.search_queries("销售"), [])
+        self.assertEqual(self.search_queries("库存"), [query])
+
+    def test_finds_dashboards_by_short_terms(self):
+        sales = self.create_dashboard("销售看板")
+        self.create_dashboard("库存")
+
+        found = models.Dashboard.search(self.org, self.group_ids, self.user.id, "看板")
+        self.assertEqual(list(found), [sales])
+
+    def test_short_term_can_use_bigram_index(self):
+        query = models.Query.query.filter(
+            substring_match("销售", [models.Query.name], models.Query.search_bigrams)
+        )
+        statement = query.statement.compile(dialect=postgresql.dialect())
+
+        connection = models.db.session.connection()
+        connection.execute("SET LOCAL enable_seqscan = off")
+        plan = "\n".join(row[0] for row in connection.execute("EXPLAIN " + str(statement), statement.params))
+
+        self.assertIn("queries_search_bigrams", plan)